@@ -0,0 +1,240 @@
+"""
+Process-wide cache of the images used to draw the game, packed into shared atlas surfaces.
+
+Example:
+    assets = get_asset_manager()
+    player_img = assets.get_square([0, 188, 212], 100)
+    crosshair_img = assets.get_crosshair([0, 188, 212])
+
+Source images are loaded (and converted to the screen's pixel format, if a video mode is set) once per process, and
+every sprite (e.g. a crosshair tinted with a player's color) is drawn once, into an atlas page. The sprites handed out
+are subsurfaces of the atlas, shared by every player and game that asks for the same one: blit them, but do not draw
+on them.
+"""
+import os
+
+
+# Size of the atlas pages. Sprites are packed into rows (shelves) from the top left of the current page, and a new page
+# is started when one does not fit
+ATLAS_SIZE = (1024, 1024)
+
+# File of the crosshair image, in the directory of this module, and the size of the crosshair sprites
+CROSSHAIR_FILENAME = 'crosshair.bmp'
+CROSSHAIR_SIZE = (70, 70)
+
+# Color of the source images that is replaced by the tint of the sprites, and color drawn as transparent
+TINTED_COLOR = 255
+TRANSPARENT_COLOR = (0, 0, 0)
+
+
+class _AtlasPage:
+    """
+    A surface that sprites are packed into, and where the next sprite goes.
+    """
+
+    def __init__(self, surface, converted):
+        self.surface = surface
+        self.converted = converted
+        self.x = 0
+        self.y = 0
+        self.shelf_height = 0
+
+    def allocate(self, width, height):
+        """
+        Returns where a sprite of the given size fits, or None if the page is full.
+        """
+        page_width, page_height = self.surface.get_size()
+        if self.x + width > page_width:
+            self.x, self.y, self.shelf_height = 0, self.y + self.shelf_height, 0
+        if self.x + width > page_width or self.y + height > page_height:
+            return None
+        position = (self.x, self.y)
+        self.x += width
+        self.shelf_height = max(self.shelf_height, height)
+        return position
+
+
+class AssetManager:
+    """
+    Class for loading, tinting and caching the images of the game.
+
+    Use get_asset_manager() to get the instance shared by the whole process.
+
+    Attributes:
+        - image_dir: Directory of the source images. String.
+        - pages: Atlas pages, in the order they were created. List of Surface objects.
+        - n_sprites: Number of sprites drawn into the atlas so far. Number.
+    """
+
+    def __init__(self, image_dir=None):
+        """
+        Initializes an empty cache. Imports pygame, which must have been initialized (see load_pygame()).
+
+        :param image_dir: Directory of the source images. Default value is the directory of this module.
+        :type image_dir: String.
+        """
+        import pygame
+        self.__pygame = pygame
+
+        self.image_dir = os.path.dirname(os.path.abspath(__file__)) if image_dir is None else image_dir
+        self.pages = []
+        self.n_sprites = 0
+        self.__page = None
+        self.__images = {}
+        self.__sprites = {}
+
+    def clear(self):
+        """
+        Forgets all images and sprites. Sprites already handed out stay valid.
+        """
+        self.pages = []
+        self.n_sprites = 0
+        self.__page = None
+        self.__images.clear()
+        self.__sprites.clear()
+
+    def load_image(self, filename):
+        """
+        Loads a source image, converted to the screen's pixel format if a video mode is set.
+
+        :param filename: Name of the file, in `image_dir`.
+        :type filename: String.
+        :return: The image, or None if the file is missing, cannot be read, or has no pixels other than black.
+        :rtype: Surface.
+        """
+        pygame = self.__pygame
+        converted = pygame.display.get_surface() is not None
+        key = (filename, converted)
+        if key not in self.__images:
+            try:
+                image = pygame.image.load(os.path.join(self.image_dir, filename))
+            except (pygame.error, OSError):
+                image = None
+            if image is not None and converted:
+                image = image.convert()
+            if image is not None and (0 in image.get_size() or not pygame.surfarray.array3d(image).any()):
+                image = None
+            self.__images[key] = image
+        return self.__images[key]
+
+    def get_square(self, color, size):
+        """
+        Returns a square filled with a color (e.g. the image of a player or a bullet).
+
+        :param color: RGB color.
+        :type color: Array with three values.
+        :param size: Length of the side of the square.
+        :type size: Number.
+        :return: The shared sprite.
+        :rtype: Surface.
+        """
+        key = ('square', tuple(color[:3]), size, self.__pygame.display.get_surface() is not None)
+        sprite = self.__sprites.get(key)
+        if sprite is None:
+            sprite = self.__add_sprite(key, (size, size))
+            sprite.fill(color)
+        return sprite
+
+    def get_crosshair(self, color):
+        """
+        Returns the crosshair image (CROSSHAIR_FILENAME) scaled to CROSSHAIR_SIZE, with its white pixels tinted with a
+        color, and black as the transparent color. If the image cannot be used, a crosshair is drawn instead (see
+        draw_crosshair()).
+
+        :param color: RGB color.
+        :type color: Array with three values.
+        :return: The shared sprite.
+        :rtype: Surface.
+        """
+        pygame = self.__pygame
+        key = ('crosshair', tuple(color[:3]), pygame.display.get_surface() is not None)
+        sprite = self.__sprites.get(key)
+        if sprite is None:
+            image = self.load_image(CROSSHAIR_FILENAME)
+            if image is not None:
+                crosshair = pygame.transform.scale(image, CROSSHAIR_SIZE)
+            else:
+                crosshair = pygame.Surface(CROSSHAIR_SIZE, 0, 32)
+                draw_crosshair(crosshair)
+
+            # Color the crosshair image, and copy its colors to the atlas (transparency is given by the color key)
+            arr = pygame.surfarray.array3d(crosshair)
+            for channel in range(3):
+                channel_values = arr[:, :, channel]
+                channel_values[channel_values == TINTED_COLOR] = color[channel]
+            sprite = self.__add_sprite(key, CROSSHAIR_SIZE)
+            pygame.surfarray.blit_array(sprite, arr)
+            sprite.set_colorkey(TRANSPARENT_COLOR)
+        return sprite
+
+    def __get_page(self, width, height):
+        """
+        Returns the atlas page where a sprite of the given size goes, and its position in it. A new page is started if
+        the current one is full, or if a video mode was set after it was created (so that sprites are always in the
+        screen's pixel format).
+        """
+        pygame = self.__pygame
+        display = pygame.display.get_surface()
+        page = self.__page
+        position = None
+        if page is not None and page.converted == (display is not None):
+            position = page.allocate(width, height)
+        if position is None:
+            size = (max(ATLAS_SIZE[0], width), max(ATLAS_SIZE[1], height))
+            surface = pygame.Surface(size, 0, display) if display is not None else pygame.Surface(size, 0, 32)
+            page = self.__page = _AtlasPage(surface, display is not None)
+            self.pages.append(surface)
+            position = page.allocate(width, height)
+        return page, position
+
+    def __add_sprite(self, key, size):
+        """
+        Reserves the space of a new sprite in the atlas, and caches it.
+        """
+        page, position = self.__get_page(*size)
+        sprite = page.surface.subsurface(self.__pygame.Rect(position, size))
+        self.__sprites[key] = sprite
+        self.n_sprites += 1
+        return sprite
+
+
+def draw_crosshair(surface, color=(255, 255, 255)):
+    """
+    Draws a crosshair (a ring with four ticks pointing at its center) on the whole surface, over a black background.
+
+    :param surface: Where to draw.
+    :type surface: Surface.
+    :param color: Color of the crosshair. Default value is white, the color tinted by the AssetManager.
+    :type color: Array with three values.
+    """
+    import pygame
+
+    width, height = surface.get_size()
+    center = (width // 2, height // 2)
+    radius = min(width, height) // 2 - 2
+    thickness = max(1, radius // 8)
+    surface.fill(TRANSPARENT_COLOR)
+    pygame.draw.circle(surface, color, center, radius, thickness)
+    tick = radius // 2
+    pygame.draw.line(surface, color, (center[0], center[1] - radius), (center[0], center[1] - radius + tick), thickness)
+    pygame.draw.line(surface, color, (center[0], center[1] + radius), (center[0], center[1] + radius - tick), thickness)
+    pygame.draw.line(surface, color, (center[0] - radius, center[1]), (center[0] - radius + tick, center[1]), thickness)
+    pygame.draw.line(surface, color, (center[0] + radius, center[1]), (center[0] + radius - tick, center[1]), thickness)
+
+
+# Instance shared by the whole process, created when first needed
+_asset_manager = None
+
+
+def get_asset_manager():
+    """
+    Returns the AssetManager shared by the whole process, creating it if needed. Only call it once pygame is
+    initialized (see load_pygame()).
+
+    :return: The asset manager.
+    :rtype: AssetManager.
+    """
+    global _asset_manager
+    if _asset_manager is None:
+        _asset_manager = AssetManager()
+    return _asset_manager
@@ -0,0 +1,246 @@
+"""
+AI policies evaluated for many games at once, with vectorized operations.
+
+Example:
+    vec_game = VecGame(1024)
+    policy = BatchedInterceptPolicy(vec_game.n_games)
+    for _ in range(1000):
+        vec_game.update_physics(policy(vec_game))
+
+Each policy keeps the last actions of every player of every game, and chooses the actions of all of them in one call,
+from arrays with the state of the games (see get_game_states() to build them from scalar Game instances). They play
+like the action generators of move_n_shoot (random, simple and not so simple AI), and draw their random numbers from
+their own generator instead of one by one from numpy's global one, so they match them statistically, but not draw for
+draw.
+"""
+import numpy as np
+
+from move_n_shoot import ACTION_CH_DOWN
+from move_n_shoot import ACTION_CH_LEFT
+from move_n_shoot import ACTION_CH_RIGHT
+from move_n_shoot import ACTION_CH_UP
+from move_n_shoot import ACTION_NAMES
+from move_n_shoot import AI_FLIPPED_ACTIONS
+
+
+def get_game_states(games):
+    """
+    Stacks the state of several scalar games with the same number of players, as expected by the batched policies.
+
+    :param games: The games.
+    :type games: List of Game.
+    :return: Position, velocity and crosshair of every player, each with shape (n_games, n_players, 2), and whether
+        every player is an opponent of every other one (taken from the first game, see Player.is_opponent()), with
+        shape (n_players, n_players).
+    :rtype: Tuple with four arrays.
+    """
+    players = games[0].players
+    state = np.array([[[player.position[:2], player.velocity[:2], player.crosshair[:2]] for player in game.players]
+                      for game in games], dtype=float)
+    opponents = np.array([[player.is_opponent(other) for other in players] for player in players])
+    return state[:, :, 0], state[:, :, 1], state[:, :, 2], opponents
+
+
+def get_nearest_opponents(position, opponents=None):
+    """
+    Returns the index of the opponent closest to every player of every game, like get_nearest_opponent() does for a
+    single player. In two-player games, this is always the other player.
+
+    :param position: Position of every player.
+    :type position: Array with shape (n_games, n_players, 2).
+    :param opponents: Element [i, j] is True if player j is an opponent of player i. Default value is every other
+        player.
+    :type opponents: Boolean array with shape (n_players, n_players).
+    :return: Index of the nearest opponent of every player, or of the player itself if it has no opponents.
+    :rtype: Integer array with shape (n_games, n_players).
+    """
+    n_games, n_players = position.shape[:2]
+    if n_players == 2:
+        return np.broadcast_to(np.array([1, 0]), (n_games, 2))
+    if opponents is None:
+        opponents = ~np.eye(n_players, dtype=bool)
+
+    # Element [g, i, j] is the squared distance from player i to player j in game g
+    dx = position[:, None, :, 0] - position[:, :, None, 0]
+    dy = position[:, None, :, 1] - position[:, :, None, 1]
+    distance = dx*dx + dy*dy
+    distance[:, ~opponents] = np.inf
+    nearest = distance.argmin(axis=2)
+    has_opponents = opponents.any(axis=1)
+    return np.where(has_opponents, nearest, np.arange(n_players))
+
+
+def get_aim_actions(target, crosshair):
+    """
+    Returns the crosshair actions that move every crosshair towards a target.
+
+    :param target: Target of every crosshair.
+    :type target: Array with shape (..., 2).
+    :param crosshair: Position of every crosshair.
+    :type crosshair: Array with shape (..., 2).
+    :return: Encoded crosshair actions (see encode_actions()).
+    :rtype: Integer array with shape (...).
+    """
+    return ((target[..., 0] < crosshair[..., 0]) * ACTION_CH_LEFT |
+            (target[..., 0] > crosshair[..., 0]) * ACTION_CH_RIGHT |
+            (target[..., 1] < crosshair[..., 1]) * ACTION_CH_UP |
+            (target[..., 1] > crosshair[..., 1]) * ACTION_CH_DOWN)
+
+
+class BatchedRandomPolicy:
+    """
+    Class for representing random players in many games, like the ones of create_random_player_action_generator().
+
+    Every time actions are chosen, each action (but 'ch_mouse', since the mouse is not used) of every player takes the
+    opposite value it had the last time with probability `prob_action`.
+
+    Attributes:
+        - n_games: Number of games. Number.
+        - n_players: Number of players in each game. Number.
+        - prob_action: Probability that an action takes the opposite value it had the last time. Number.
+        - rng: Random number generator used to flip actions.
+        - old_actions: Last encoded actions of every player. Integer array with shape (n_games, n_players).
+    """
+
+    # Bits that are flipped at random, and actions kept from the last time
+    N_FLIPPED_BITS = len(ACTION_NAMES) - 1
+    KEPT_ACTIONS = (1 << N_FLIPPED_BITS) - 1
+
+    def __init__(self, n_games, n_players=2, prob_action=0.05, rng=None):
+        """
+        Initializes the policy. All actions are False in every game, like the first time an action generator is called.
+
+        :param n_games: Number of games.
+        :type n_games: Number.
+        :param n_players: Number of players in each game. Default value is 2.
+        :type n_players: Number.
+        :param prob_action: Probability that an action takes the opposite value it had the last time. Default value is
+            0.05.
+        :type prob_action: Number.
+        :param rng: Random number generator. Default value is a new RandomState.
+        :type rng: RandomState or module.
+        """
+        self.n_games = n_games
+        self.n_players = n_players
+        self.prob_action = prob_action
+        self.rng = np.random.RandomState() if rng is None else rng
+        self.old_actions = np.zeros((n_games, n_players), dtype=np.int64)
+
+        # Value of each bit that can be flipped
+        self._bits = 1 << np.arange(self.N_FLIPPED_BITS, dtype=np.int64)
+
+    def reset(self, games=None):
+        """
+        Sets all actions to False, in some games.
+
+        :param games: Indices or boolean mask of the games to reset. Default value is all games.
+        :type games: Array, or None.
+        """
+        if games is None:
+            games = slice(None)
+        self.old_actions[games] = 0
+
+    def __call__(self, game):
+        """
+        Chooses the actions of every player of a VecGame (see act()).
+
+        :param game: The games.
+        :type game: VecGame.
+        :return: Encoded actions.
+        :rtype: Integer array with shape (n_games, n_players).
+        """
+        return self.act(game.position, game.velocity, game.crosshair)
+
+    def act(self, position, velocity, crosshair, opponents=None):
+        """
+        Chooses the actions of every player of every game.
+
+        :param position: Position of every player.
+        :type position: Array with shape (n_games, n_players, 2).
+        :param velocity: Velocity of every player.
+        :type velocity: Array with shape (n_games, n_players, 2).
+        :param crosshair: Position of every player's crosshair.
+        :type crosshair: Array with shape (n_games, n_players, 2).
+        :param opponents: Element [i, j] is True if player j is an opponent of player i. Default value is every other
+            player.
+        :type opponents: Boolean array with shape (n_players, n_players).
+        :return: Encoded actions (see encode_actions()).
+        :rtype: Integer array with shape (n_games, n_players).
+        """
+        flips = self.rng.rand(self.n_games, self.n_players, self.N_FLIPPED_BITS) < self.prob_action
+        actions = (self.old_actions & self.KEPT_ACTIONS) ^ (flips @ self._bits)
+        actions |= self.aim(position, velocity, crosshair, opponents)
+        self.old_actions = actions
+        return actions
+
+    def aim(self, position, velocity, crosshair, opponents):
+        """
+        Returns the crosshair actions of every player. Random players choose them at random, so they are all False.
+        """
+        return 0
+
+
+class BatchedSimplePolicy(BatchedRandomPolicy):
+    """
+    Class for representing simple AI players in many games, like the ones of create_simple_ai_action_generator().
+
+    Movement and shooting are random, like in BatchedRandomPolicy, but the crosshair always moves towards the nearest
+    opponent.
+    """
+
+    N_FLIPPED_BITS = 5
+    KEPT_ACTIONS = AI_FLIPPED_ACTIONS
+
+    def aim(self, position, velocity, crosshair, opponents):
+        """
+        Returns the crosshair actions that move every crosshair towards the nearest opponent.
+        """
+        nearest = get_nearest_opponents(position, opponents)
+        target = np.take_along_axis(position, nearest[..., None], axis=1)
+        return get_aim_actions(target, crosshair)
+
+
+class BatchedInterceptPolicy(BatchedSimplePolicy):
+    """
+    Class for representing not so simple AI players in many games, like the ones of
+    create_not_so_simple_ai_action_generator().
+
+    Movement and shooting are random, like in BatchedRandomPolicy, but the crosshair moves towards the point where a
+    bullet shot now would intercept the nearest opponent, assuming it keeps its velocity. If the bullet can never reach
+    it, the crosshair moves towards the opponent itself.
+
+    Attributes:
+        - bullet_speed: Speed of the bullets. Number.
+    """
+
+    def __init__(self, n_games, n_players=2, prob_action=0.05, rng=None, bullet_speed=3000):
+        """
+        Initializes the policy (see BatchedRandomPolicy).
+
+        :param bullet_speed: Speed of the bullets. Default value is 3000, like Player.SHOOTING_SPEED.
+        :type bullet_speed: Number.
+        """
+        super().__init__(n_games, n_players, prob_action, rng)
+        self.bullet_speed = bullet_speed
+
+    def aim(self, position, velocity, crosshair, opponents):
+        """
+        Returns the crosshair actions that move every crosshair towards the predicted point of impact.
+        """
+        nearest = get_nearest_opponents(position, opponents)[..., None]
+        x1 = position
+        x2 = np.take_along_axis(position, nearest, axis=1)
+        v2 = np.take_along_axis(velocity, nearest, axis=1)
+
+        # Solve |x2 + v2*t - x1| = bullet_speed*t for the time of impact t, with the same operations as the scalar AI
+        def dot(a, b):
+            return a[..., 0]*b[..., 0] + a[..., 1]*b[..., 1]
+
+        alphasq = self.bullet_speed**2
+        a = dot(v2, v2) - alphasq
+        gamma = 4*(dot(v2, x2)-dot(v2, x1))**2-4*a*(dot(x1, x1)+dot(x2, x2)-2*dot(x1, x2))
+        reachable = (gamma >= 0) & (a != 0)
+        delta_t = (2*(dot(v2, x1)-dot(v2, x2)) - np.sqrt(np.maximum(gamma, 0))) / np.where(reachable, 2*a, 1)
+        delta_t[~reachable] = 0
+
+        return get_aim_actions(x2 + v2*delta_t[..., None], crosshair)
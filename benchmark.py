@@ -0,0 +1,548 @@
+"""
+Benchmarks for move n' shoot.
+
+Usage:
+    python benchmark.py startup [--path DIR] [--repeat N]
+    python benchmark.py suite [--only NAME [NAME ...]] [--repeat N] [--output FILE] [--baseline FILE] [--threshold T]
+    python benchmark.py compare BASELINE RESULTS [--threshold T]
+    python benchmark.py allocations [--ticks N]
+
+The startup benchmark measures, in fresh interpreter processes, how long it takes to import the move_n_shoot module
+and to create a headless two-player game. Use --path to benchmark another checkout of the repository (e.g. an older
+revision exported with `git worktree add`), to compare startup times before and after a change.
+
+The suite measures the hot paths of the game (see BENCHMARKS), and writes the results as JSON. Given a baseline (the
+JSON output of an earlier run, e.g. on the main branch), it compares every result against it, and exits with status 1
+if any of them got worse by more than the threshold (10% by default). Results are only comparable between runs on the
+same machine.
+
+The allocations check runs headless games in every physics mode, and exits with status 1 if, once the game is in a
+steady state, a time step allocates any list or other container (see count_container_allocations()), or keeps any
+memory allocated (see measure_retained_allocations()).
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+
+
+# Code run in each fresh interpreter. It prints the elapsed times as JSON, so that only the work done by the game is
+# measured (and not the start of the interpreter itself)
+STARTUP_CODE = '''
+import json, sys, time
+t0 = time.perf_counter()
+import move_n_shoot
+t1 = time.perf_counter()
+game = move_n_shoot.Game(video_mode=False)
+game.add_player([100, 100])
+game.add_player([game.screen_width, game.screen_height])
+t2 = time.perf_counter()
+print(json.dumps({'import': t1 - t0, 'construction': t2 - t1, 'pygame_imported': 'pygame' in sys.modules}))
+'''
+
+
+def benchmark_startup(path, repeat):
+    """
+    Measures the import and construction time of a headless game, each in a fresh interpreter process.
+
+    :param path: Directory containing the move_n_shoot module to benchmark.
+    :type path: String.
+    :param repeat: How many processes to start.
+    :type repeat: Number.
+    :return: Median times (in seconds) for the import, the construction and their total, and whether pygame was
+        imported.
+    :rtype: Dictionary.
+    """
+    env = dict(os.environ, PYTHONPATH=path, PYGAME_HIDE_SUPPORT_PROMPT='1')
+    runs = []
+    for _ in range(repeat):
+        output = subprocess.run([sys.executable, '-c', STARTUP_CODE], env=env, cwd=path, check=True,
+                                stdout=subprocess.PIPE, universal_newlines=True).stdout
+        runs.append(json.loads(output.splitlines()[-1]))
+
+    results = {}
+    for key in ['import', 'construction']:
+        results[key] = statistics.median(run[key] for run in runs)
+    results['total'] = statistics.median(run['import'] + run['construction'] for run in runs)
+    results['pygame_imported'] = runs[-1]['pygame_imported']
+    return results
+
+
+def time_per_call(function, n_calls, repeat, setup=None):
+    """
+    Measures how long a function takes per call, as the best over `repeat` rounds of `n_calls` calls each. The best
+    round is the one least disturbed by other processes, so it is the most repeatable measure.
+
+    :param function: Function to time, called without arguments.
+    :type function: Callable.
+    :param n_calls: Number of calls per round.
+    :type n_calls: Number.
+    :param repeat: Number of rounds.
+    :type repeat: Number.
+    :param setup: Function called without arguments before each call of `function`, whose time is not measured (each
+        call is then timed on its own). Default value is None.
+    :type setup: Callable.
+    :return: Best time per call, in seconds.
+    :rtype: Number.
+    """
+    times = []
+    for _ in range(repeat):
+        if setup is None:
+            start = time.perf_counter()
+            for _ in range(n_calls):
+                function()
+            elapsed = time.perf_counter() - start
+        else:
+            elapsed = 0.0
+            for _ in range(n_calls):
+                setup()
+                start = time.perf_counter()
+                function()
+                elapsed += time.perf_counter() - start
+        times.append(elapsed / n_calls)
+    return min(times)
+
+
+def make_two_player_game(**kwargs):
+    """
+    Creates a two-player game in a fixed state, with numpy's global random number generator seeded.
+    """
+    import numpy as np
+    from move_n_shoot import Game
+
+    np.random.seed(0)
+    game = Game(**kwargs)
+    game.add_player([100, 100])
+    game.add_player([game.screen_width, game.screen_height])
+    return game
+
+
+def benchmark_physics(repeat):
+    """
+    Headless Game.update_physics() time steps per second, in a two-player game with random actions.
+    """
+    import numpy as np
+
+    game = make_two_player_game(video_mode=False)
+    actions = np.random.randint(0, 1 << 9, (4096, 2)).tolist()
+    step = iter(range(1 << 62))
+
+    def run():
+        game.update_physics(actions[next(step) % len(actions)])
+
+    return {'value': 1 / time_per_call(run, 5000, repeat), 'unit': 'steps/s', 'higher_is_better': True}
+
+
+def benchmark_step_repeat(repeat_ticks, repeat):
+    """
+    Headless Game.step() time steps per second, with actions repeated for `repeat_ticks` time steps, in a two-player
+    game with random actions.
+    """
+    import numpy as np
+
+    game = make_two_player_game(video_mode=False)
+    actions = np.random.randint(0, 1 << 9, (4096, 2)).tolist()
+    step = iter(range(1 << 62))
+
+    def run():
+        game.step(actions[next(step) % len(actions)], repeat=repeat_ticks, stop_on_hit=False)
+
+    return {'value': repeat_ticks / time_per_call(run, 5000 // repeat_ticks, repeat), 'unit': 'steps/s',
+            'higher_is_better': True}
+
+
+def benchmark_obstacle_map(scale, repeat, **game_kwargs):
+    """
+    Headless Game.update_physics() time steps per second, in a two-player game with random actions, on a world `scale`
+    times the size of the screen on each side, with the same density of obstacles (30 per screen) whatever its size.
+    Other arguments of the game (e.g. fire_interval) are given by `game_kwargs`.
+    """
+    import numpy as np
+
+    # Multiples of the default screen size
+    width, height = 1600 * scale, 800 * scale
+    rng = np.random.RandomState(0)
+    obstacles = [(int(rng.randint(0, width - 200)), int(rng.randint(0, height - 200)), int(rng.randint(20, 200)),
+                  int(rng.randint(20, 200))) for _ in range(30 * scale * scale)]
+    game = make_two_player_game(video_mode=False, world_sz=(width, height), obstacles=obstacles, **game_kwargs)
+    actions = np.random.randint(0, 1 << 9, (4096, 2)).tolist()
+    step = iter(range(1 << 62))
+
+    def run():
+        game.update_physics(actions[next(step) % len(actions)])
+
+    return {'value': 1 / time_per_call(run, 5000, repeat), 'unit': 'steps/s', 'higher_is_better': True}
+
+
+def measure_retained_allocations(n_ticks=5000, **game_kwargs):
+    """
+    Memory kept allocated by Game.update_physics() time steps in a two-player headless game with random actions, once
+    in a steady state, measured with tracemalloc.
+
+    The game first runs `n_ticks` time steps to warm up. The memory allocated by the code of this repository is then
+    measured before and after `n_ticks` more. Numbers created by a time step may replace others in the state of the
+    game, so the result is not always exactly 0, but anything kept by every time step (such as a new list or hit)
+    makes it at least its size in bytes. Objects that a time step allocates and frees again (e.g. a list that replaces
+    another) are not seen: see count_container_allocations().
+
+    :param n_ticks: Number of time steps measured. Default value is 5000.
+    :type n_ticks: Number.
+    :param game_kwargs: Arguments of the game (e.g. fire_interval).
+    :return: Bytes kept allocated per time step.
+    :rtype: Number.
+    """
+    import numpy as np
+
+    game = make_two_player_game(video_mode=False, **game_kwargs)
+    actions = np.random.randint(0, 1 << 9, (4096, 2)).tolist()
+    repo_filter = [tracemalloc.Filter(True, os.path.join(os.path.dirname(os.path.abspath(__file__)), '*'))]
+
+    was_tracing = tracemalloc.is_tracing()
+    if not was_tracing:
+        tracemalloc.start()
+    try:
+        for k in range(n_ticks):
+            game.update_physics(actions[k % len(actions)])
+        before = tracemalloc.take_snapshot().filter_traces(repo_filter)
+        for k in range(n_ticks):
+            game.update_physics(actions[k % len(actions)])
+        after = tracemalloc.take_snapshot().filter_traces(repo_filter)
+    finally:
+        if not was_tracing:
+            tracemalloc.stop()
+    return sum(stat.size_diff for stat in after.compare_to(before, 'lineno')) / n_ticks
+
+
+def count_container_allocations(n_ticks=5000, **game_kwargs):
+    """
+    Lists (and other objects tracked by the garbage collector, such as dictionaries) allocated by Game.update_physics()
+    time steps in a two-player headless game with random actions, once in a steady state.
+
+    CPython keeps freed lists in a free list and takes new lists from it without telling the garbage collector, so a
+    list that replaces another on every time step changes neither gc.get_count() nor the memory traced by tracemalloc.
+    The free list is therefore emptied before every time step, by holding on to more lists than it keeps: the first
+    list the time step creates is then a new object, counted by gc.get_count() (and so is every list made by calling
+    list(), which never uses the free list). Objects freed during the time step are subtracted from the count, but a
+    steady state frees as many objects as it creates.
+
+    :param n_ticks: Number of time steps measured (after as many to warm up). Default value is 5000.
+    :type n_ticks: Number.
+    :param game_kwargs: Arguments of the game (e.g. fire_interval).
+    :return: Containers allocated per time step. 0 if no time step allocated any list.
+    :rtype: Number.
+    """
+    import numpy as np
+
+    game = make_two_player_game(video_mode=False, **game_kwargs)
+    actions = np.random.randint(0, 1 << 9, (4096, 2)).tolist()
+    for k in range(n_ticks):
+        game.update_physics(actions[k % len(actions)])
+
+    was_enabled = gc.isenabled()
+    gc.disable()
+    n_allocated = 0
+    try:
+        for k in range(n_ticks):
+            held = [[] for _ in range(256)]
+            count = gc.get_count()[0]
+            game.update_physics(actions[k % len(actions)])
+            n_allocated += gc.get_count()[0] - count
+            del held
+    finally:
+        if was_enabled:
+            gc.enable()
+    return n_allocated / n_ticks
+
+
+def benchmark_ai(factory, n_calls, repeat):
+    """
+    Time per call of an action generator, playing the first player of a headless two-player game whose state is
+    advanced (with no actions, and without being timed) in between calls.
+    """
+    game = make_two_player_game(video_mode=False)
+    generator = factory()
+    return {'value': time_per_call(lambda: generator(0, game), n_calls, repeat,
+                                   setup=lambda: game.update_physics([0, 0])) * 1e6,
+            'unit': 'us/call', 'higher_is_better': False}
+
+
+def benchmark_batched_ai(policy_class, n_games, repeat):
+    """
+    Time per game of a batched AI policy choosing the actions of both players of `n_games` headless two-player games,
+    whose state is advanced (with no actions, and without being timed) in between calls.
+    """
+    from vec_game import VecGame
+
+    vec_game = VecGame.from_game(make_two_player_game(video_mode=False), n_games)
+    vec_game.velocity[:, 0] = [700, 300]
+    policy = policy_class(n_games)
+    no_actions = [[0, 0]] * n_games
+    return {'value': time_per_call(lambda: policy(vec_game), 200, repeat,
+                                   setup=lambda: vec_game.update_physics(no_actions)) / n_games * 1e6,
+            'unit': 'us/game', 'higher_is_better': False}
+
+
+def benchmark_state_encoding(repeat):
+    """
+    Time per delta-encoded state of a headless two-player game (see StateEncoder), with the players moving and every
+    state acknowledged (the physics are not timed).
+    """
+    from serialization import StateEncoder
+
+    game = make_two_player_game(video_mode=False)
+    game.players[0].velocity[:] = [700, 300]
+    game.players[1].velocity[:] = [-500, -400]
+    encoder = StateEncoder(game)
+    tick = iter(range(1, 1 << 62))
+
+    def run():
+        t = next(tick)
+        encoder.acknowledge(t - 1)
+        encoder.encode(t)
+
+    return {'value': time_per_call(run, 2000, repeat, setup=lambda: game.update_physics([0, 0])) * 1e6,
+            'unit': 'us/state', 'higher_is_better': False}
+
+
+def benchmark_draw_frame(repeat):
+    """
+    Time per Game.draw_frame() call in an offscreen game, with the players moving (the physics are not timed).
+    """
+    game = make_two_player_game(offscreen=True)
+    game.players[0].velocity[:] = [700, 300]
+    game.players[1].velocity[:] = [-500, -400]
+
+    return {'value': time_per_call(game.draw_frame, 200, repeat, setup=lambda: game.update_physics([0, 0])) * 1e3,
+            'unit': 'ms/frame', 'higher_is_better': False}
+
+
+def benchmark_player_construction(video_mode, repeat):
+    """
+    Time to construct a Player, with or without video.
+    """
+    from move_n_shoot import Player
+
+    return {'value': time_per_call(lambda: Player(video_mode=video_mode), 500, repeat) * 1e6, 'unit': 'us/player',
+            'higher_is_better': False}
+
+
+def benchmark_scaling(n_games, vectorized, repeat):
+    """
+    Total time steps per second (summed over all games) when advancing `n_games` headless two-player games with random
+    actions, either one Game at a time or all at once with a VecGame.
+    """
+    import numpy as np
+    from vec_game import VecGame
+
+    np.random.seed(0)
+    actions = np.random.randint(0, 1 << 9, (16, n_games, 2))
+    step = iter(range(1 << 62))
+    if vectorized:
+        vec_game = VecGame.from_game(make_two_player_game(video_mode=False), n_games)
+
+        def run():
+            vec_game.update_physics(actions[next(step) % len(actions)])
+    else:
+        games = [make_two_player_game(video_mode=False) for _ in range(n_games)]
+        action_lists = actions.tolist()
+
+        def run():
+            for game, game_actions in zip(games, action_lists[next(step) % len(actions)]):
+                game.update_physics(game_actions)
+
+    n_calls = max(10, 2000 // n_games) if not vectorized else 200
+    return {'value': n_games / time_per_call(run, n_calls, repeat), 'unit': 'steps/s', 'higher_is_better': True}
+
+
+def get_benchmarks():
+    """
+    Returns all benchmarks of the suite.
+
+    :return: Function of each benchmark, by name. Every function is called with the number of rounds to time, and
+        returns a dictionary with the measured 'value', its 'unit', and whether higher values are better.
+    :rtype: Dictionary.
+    """
+    from batch_ai import BatchedInterceptPolicy
+    from batch_ai import BatchedRandomPolicy
+    from batch_ai import BatchedSimplePolicy
+    from move_n_shoot import create_not_so_simple_ai_action_generator
+    from move_n_shoot import create_random_player_action_generator
+    from move_n_shoot import create_simple_ai_action_generator
+    from planning import create_lookahead_ai_action_generator
+
+    benchmarks = {
+        'physics_2p': benchmark_physics,
+        'physics_2p_repeat_8': lambda repeat: benchmark_step_repeat(8, repeat),
+        'physics_2p_retained_bytes': lambda repeat: {'value': max(measure_retained_allocations(), 0.0),
+                                                     'unit': 'bytes/step', 'higher_is_better': False},
+        'physics_2p_allocated_containers': lambda repeat: {'value': max(count_container_allocations(), 0.0),
+                                                           'unit': 'objects/step', 'higher_is_better': False},
+        'physics_2p_map_1x': lambda repeat: benchmark_obstacle_map(1, repeat),
+        'physics_2p_map_8x': lambda repeat: benchmark_obstacle_map(8, repeat),
+        'physics_2p_map_8x_pool': lambda repeat: benchmark_obstacle_map(8, repeat, fire_interval=0.01),
+        'physics_2p_map_8x_pool_swept': lambda repeat: benchmark_obstacle_map(8, repeat, fire_interval=0.01,
+                                                                              swept_bullets=True),
+        'ai_random': lambda repeat: benchmark_ai(create_random_player_action_generator, 2000, repeat),
+        'ai_simple': lambda repeat: benchmark_ai(create_simple_ai_action_generator, 2000, repeat),
+        'ai_not_so_simple': lambda repeat: benchmark_ai(create_not_so_simple_ai_action_generator, 2000, repeat),
+        'ai_lookahead': lambda repeat: benchmark_ai(create_lookahead_ai_action_generator, 40, repeat),
+        'ai_batched_random_256': lambda repeat: benchmark_batched_ai(BatchedRandomPolicy, 256, repeat),
+        'ai_batched_simple_256': lambda repeat: benchmark_batched_ai(BatchedSimplePolicy, 256, repeat),
+        'ai_batched_intercept_256': lambda repeat: benchmark_batched_ai(BatchedInterceptPolicy, 256, repeat),
+        'draw_frame_offscreen': benchmark_draw_frame,
+        'state_encoding_2p': benchmark_state_encoding,
+        'player_construction_headless': lambda repeat: benchmark_player_construction(False, repeat),
+        'player_construction_video': lambda repeat: benchmark_player_construction(True, repeat),
+    }
+    for n_games in (1, 16, 256):
+        benchmarks['scaling_games_{}'.format(n_games)] = \
+            lambda repeat, n_games=n_games: benchmark_scaling(n_games, False, repeat)
+        benchmarks['scaling_vec_game_{}'.format(n_games)] = \
+            lambda repeat, n_games=n_games: benchmark_scaling(n_games, True, repeat)
+    return benchmarks
+
+
+def run_suite(names=None, repeat=5):
+    """
+    Runs benchmarks of the suite.
+
+    :param names: Names of the benchmarks to run. Default value is None (all of them).
+    :type names: List of strings.
+    :param repeat: Number of rounds timed by each benchmark. Default value is 5.
+    :type repeat: Number.
+    :return: Results of every benchmark (by name, under 'benchmarks'), and a description of the environment.
+    :rtype: Dictionary.
+    """
+    os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+    import numpy as np
+
+    benchmarks = get_benchmarks()
+    results = {}
+    for name in names if names is not None else benchmarks:
+        results[name] = benchmarks[name](repeat)
+
+    return {'benchmarks': results,
+            'environment': {'python': platform.python_version(), 'numpy': np.__version__,
+                            'machine': platform.machine(), 'processor': platform.processor(),
+                            'system': platform.platform()}}
+
+
+def compare_results(baseline, results, threshold=0.1):
+    """
+    Compares the results of the suite against a baseline.
+
+    :param baseline: Results of an earlier run (see run_suite()).
+    :type baseline: Dictionary.
+    :param results: Results to compare.
+    :type results: Dictionary.
+    :param threshold: Largest relative loss of performance that is not a regression. Default value is 0.1 (10%).
+    :type threshold: Number.
+    :return: For every benchmark in both results: its name, the baseline and new values, the relative change of
+        performance (positive if it got better), and whether it is a regression.
+    :rtype: List of tuples.
+    """
+    comparison = []
+    for name, result in results['benchmarks'].items():
+        old = baseline['benchmarks'].get(name)
+        if old is None:
+            continue
+        if result['higher_is_better']:
+            change = result['value'] / old['value'] - 1 if old['value'] else 0.0
+        else:
+            change = old['value'] / result['value'] - 1 if result['value'] else 0.0
+        comparison.append((name, old['value'], result['value'], change, change < -threshold))
+    return comparison
+
+
+def print_comparison(comparison, results):
+    """
+    Prints the output of compare_results() as a table.
+    """
+    print('{:32} {:>14} {:>14} {:>9}'.format('benchmark', 'baseline', 'current', 'change'))
+    for name, old, new, change, regression in comparison:
+        print('{:32} {:>14.4g} {:>14.4g} {:>+8.1%}{} {}'.format(name, old, new, change, ' REGRESSION' if regression else '',
+                                                              results['benchmarks'][name]['unit']))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks for move n' shoot.")
+    subparsers = parser.add_subparsers(dest='benchmark')
+    startup_parser = subparsers.add_parser('startup', help='import and construction time of a headless game')
+    startup_parser.add_argument('--path', default=os.path.dirname(os.path.abspath(__file__)),
+                                help='directory containing the move_n_shoot module to benchmark')
+    startup_parser.add_argument('--repeat', type=int, default=10, help='number of fresh processes to time')
+    suite_parser = subparsers.add_parser('suite', help='hot paths of the game, with regression tracking')
+    suite_parser.add_argument('--only', nargs='+', default=None, metavar='NAME', help='benchmarks to run')
+    suite_parser.add_argument('--repeat', type=int, default=5, help='timed rounds per benchmark')
+    suite_parser.add_argument('--output', default=None, help='file where the results are written as JSON')
+    suite_parser.add_argument('--baseline', default=None, help='JSON results to compare against')
+    suite_parser.add_argument('--threshold', type=float, default=0.1, help='relative loss counted as a regression')
+    compare_parser = subparsers.add_parser('compare', help='compare two JSON results of the suite')
+    compare_parser.add_argument('baseline', help='JSON results to compare against')
+    compare_parser.add_argument('results', help='JSON results to compare')
+    compare_parser.add_argument('--threshold', type=float, default=0.1, help='relative loss counted as a regression')
+    allocations_parser = subparsers.add_parser('allocations',
+                                               help='check that time steps allocate no lists and keep no memory')
+    allocations_parser.add_argument('--ticks', type=int, default=5000, help='number of time steps measured')
+    args = parser.parse_args()
+
+    if args.benchmark == 'startup':
+        results = benchmark_startup(args.path, args.repeat)
+        print('Startup of a headless game ({}):'.format(args.path))
+        print('  import:        {:8.1f} ms'.format(results['import'] * 1000))
+        print('  construction:  {:8.1f} ms'.format(results['construction'] * 1000))
+        print('  total:         {:8.1f} ms'.format(results['total'] * 1000))
+        print('  pygame imported: {}'.format(results['pygame_imported']))
+    elif args.benchmark in ('suite', 'compare'):
+        if args.benchmark == 'suite':
+            if args.only is not None:
+                unknown = set(args.only) - set(get_benchmarks())
+                if unknown:
+                    parser.error('unknown benchmarks: {}'.format(', '.join(sorted(unknown))))
+            results = run_suite(args.only, args.repeat)
+            output = json.dumps(results, indent=2, sort_keys=True)
+            if args.output is not None:
+                with open(args.output, 'w') as f:
+                    f.write(output + '\n')
+            else:
+                print(output)
+            baseline_path = args.baseline
+        else:
+            with open(args.results) as f:
+                results = json.load(f)
+            baseline_path = args.baseline
+
+        if baseline_path is not None:
+            with open(baseline_path) as f:
+                baseline = json.load(f)
+            comparison = compare_results(baseline, results, args.threshold)
+            print_comparison(comparison, results)
+            if any(regression for *_, regression in comparison):
+                sys.exit(1)
+    elif args.benchmark == 'allocations':
+        # Time steps must not allocate any list. A single object kept by every time step takes at least 16 bytes, so
+        # anything below 1 byte per time step is numbers replacing each other in the state of the game
+        failed = False
+        for mode, game_kwargs in (('classic', {}), ('swept bullets', {'swept_bullets': True}),
+                                  ('bullet pool', {'fire_interval': 0.1, 'bullet_lifetime': 1.0}),
+                                  ('metrics', {'metrics': True})):
+            allocated = count_container_allocations(args.ticks, **game_kwargs)
+            retained = measure_retained_allocations(args.ticks, **game_kwargs)
+            ok = allocated == 0 and retained < 1
+            print('{:16} {:8.3f} containers/step {:8.3f} bytes/step kept {}'.format(mode, allocated, retained,
+                                                                                     'OK' if ok else 'FAIL'))
+            failed = failed or not ok
+        if failed:
+            sys.exit(1)
+    else:
+        parser.print_help()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,250 @@
+"""
+Pool of bullets stored in preallocated arrays, for game modes with many bullets in flight.
+"""
+import numpy as np
+
+from collision import round_half_away
+from collision import sweep_segments_boxes
+
+
+class BulletPool:
+    """
+    Class for representing all the bullets of a game, as a structure of arrays with a fixed capacity.
+
+    Slots of dead bullets are kept in a free list, so spawning and killing bullets never allocates memory. Moving,
+    culling and hit testing are done on all bullets at once with array operations, so their cost barely depends on the
+    number of bullets in flight. Dead bullets are kept outside of the screen with zero velocity, so they can be moved
+    along with the live ones.
+
+    Bullets are squares of side `size`, whose rectangles follow the same rounding as the bullets of the Game (see
+    Bullet.get_rect()).
+
+    Attributes:
+        - capacity: Maximum number of bullets in flight. Number.
+        - size: Length of the side of the bullets' squares. Number.
+        - position: Position of every bullet. Array with shape (capacity, 2).
+        - velocity: Velocity of every bullet. Array with shape (capacity, 2).
+        - age: Time (in seconds) since every bullet was spawned. Array with shape (capacity,).
+        - lifetime: Time (in seconds) after which every bullet disappears. Array with shape (capacity,).
+        - owner: Index of the player that shot every bullet, or -1 for dead bullets. Integer array with shape
+            (capacity,).
+        - alive: Whether every bullet is in flight. Boolean array with shape (capacity,).
+    """
+
+    def __init__(self, capacity=256, size=20):
+        """
+        Initializes a pool with no bullets in flight.
+
+        :param capacity: Maximum number of bullets in flight. Default value is 256.
+        :type capacity: Number.
+        :param size: Length of the side of the bullets' squares. Default value is 20, like the Bullet.
+        :type size: Number.
+        """
+        self.capacity = capacity
+        self.size = size
+        self.position = np.full((capacity, 2), -100.0)
+        self.velocity = np.zeros((capacity, 2))
+        self.age = np.zeros(capacity)
+        self.lifetime = np.full(capacity, np.inf)
+        self.owner = np.full(capacity, -1, dtype=np.int64)
+        self.alive = np.zeros(capacity, dtype=bool)
+
+        # Stack of free slots (the first `__n_free` elements), with the lowest indices on top, and the buffer used to
+        # move the bullets
+        self.__free = np.arange(capacity - 1, -1, -1)
+        self.__n_free = capacity
+        self.__displacement = np.zeros((capacity, 2))
+
+    def __len__(self):
+        return self.capacity - self.__n_free
+
+    def spawn(self, owner, position, velocity, lifetime=np.inf):
+        """
+        Puts a new bullet in flight, unless the pool is full.
+
+        :param owner: Index of the player that shot the bullet.
+        :type owner: Number.
+        :param position: Initial position of the bullet.
+        :type position: Array with two elements.
+        :param velocity: Velocity of the bullet.
+        :type velocity: Array with two elements.
+        :param lifetime: Time (in seconds) after which the bullet disappears. Default value is infinity.
+        :type lifetime: Number.
+        :return: Slot of the new bullet, or None if the pool was full.
+        :rtype: Number.
+        """
+        if self.__n_free == 0:
+            return None
+
+        self.__n_free -= 1
+        index = self.__free[self.__n_free]
+        self.position[index] = position
+        self.velocity[index] = velocity
+        self.age[index] = 0.0
+        self.lifetime[index] = lifetime
+        self.owner[index] = owner
+        self.alive[index] = True
+        return index
+
+    def kill(self, indices):
+        """
+        Removes bullets from flight, and returns their slots to the free list.
+
+        :param indices: Slots of the bullets to remove. Slots of dead bullets are ignored.
+        :type indices: Array of integers.
+        """
+        indices = np.asarray(indices)
+        if len(indices) == 0:
+            return
+        indices = indices[self.alive[indices]]
+        self.position[indices] = -100.0
+        self.velocity[indices] = 0.0
+        self.owner[indices] = -1
+        self.alive[indices] = False
+        self.__free[self.__n_free:self.__n_free + len(indices)] = indices
+        self.__n_free += len(indices)
+
+    def clear(self):
+        """
+        Removes all bullets from flight.
+        """
+        self.kill(np.flatnonzero(self.alive))
+
+    def get_state_size(self):
+        """
+        Returns the number of values written by write_state().
+        """
+        return 8 * self.capacity
+
+    def write_state(self, out):
+        """
+        Writes the state of every bullet (position, velocity, age, lifetime, owner and alive) to a flat array.
+
+        :param out: Where to write the state.
+        :type out: Array of float64 with get_state_size() elements.
+        """
+        n = self.capacity
+        out[0:2 * n] = self.position.ravel()
+        out[2 * n:4 * n] = self.velocity.ravel()
+        out[4 * n:5 * n] = self.age
+        out[5 * n:6 * n] = self.lifetime
+        out[6 * n:7 * n] = self.owner
+        out[7 * n:8 * n] = self.alive
+
+    def read_state(self, state):
+        """
+        Sets the state of every bullet from an array written by write_state(), and rebuilds the free list.
+
+        :param state: The state.
+        :type state: Array of float64 with get_state_size() elements.
+        """
+        n = self.capacity
+        self.position.ravel()[:] = state[0:2 * n]
+        self.velocity.ravel()[:] = state[2 * n:4 * n]
+        self.age[:] = state[4 * n:5 * n]
+        self.lifetime[:] = state[5 * n:6 * n]
+        self.owner[:] = state[6 * n:7 * n]
+        self.alive[:] = state[7 * n:8 * n]
+        free = np.flatnonzero(~self.alive)[::-1]
+        self.__n_free = len(free)
+        self.__free[:self.__n_free] = free
+
+    def live_indices(self):
+        """
+        Returns the slots of the bullets in flight.
+
+        :return: Slots of the bullets in flight, in increasing order.
+        :rtype: Array of integers.
+        """
+        return np.flatnonzero(self.alive)
+
+    def update(self, delta_t):
+        """
+        Moves all bullets with constant velocity, and makes them older.
+
+        :param delta_t: Duration of the time step, in seconds.
+        :type delta_t: Number.
+        """
+        np.multiply(self.velocity, delta_t, out=self.__displacement)
+        self.position += self.__displacement
+        self.age += delta_t
+
+    def get_rects(self, indices):
+        """
+        Returns the bounds of the rectangles of some bullets.
+
+        :param indices: Slots of the bullets.
+        :type indices: Array of integers.
+        :return: Left, top, right and bottom bounds of every bullet's rectangle.
+        :rtype: Tuple with four arrays.
+        """
+        left, top = (round_half_away(self.position[indices]) - self.size // 2).T
+        return left, top, left + self.size, top + self.size
+
+    def cull(self, screen_width, screen_height):
+        """
+        Removes the bullets that are completely outside of the screen (like the Game does with its bullets), or that
+        lived longer than their lifetime.
+
+        :param screen_width: Width of the screen.
+        :type screen_width: Number.
+        :param screen_height: Height of the screen.
+        :type screen_height: Number.
+        :return: Slots of the removed bullets.
+        :rtype: Array of integers.
+        """
+        live = self.live_indices()
+        left, top, right, bottom = self.get_rects(live)
+        dead = (right < 0) | (bottom < 0) | (left > screen_width) | (top > screen_height) | \
+               (self.age[live] >= self.lifetime[live])
+        dead = live[dead]
+        self.kill(dead)
+        return dead
+
+    def find_hits(self, centers, sizes, opponents, delta_t=None):
+        """
+        Finds the player hit by each bullet in flight. Each bullet hits at most one player: the first one in the order
+        of `centers` whose rectangle its own rectangle overlaps or, if `delta_t` is given, the one its path during the
+        last time step entered first (see Game.update_physics() with swept_bullets).
+
+        :param centers: Position of every player.
+        :type centers: Array with shape (n_players, 2).
+        :param sizes: Length of the side of every player's square.
+        :type sizes: Array with shape (n_players,).
+        :param opponents: Element [i, j] is True if bullets of player i can hit player j.
+        :type opponents: Boolean array with shape (n_players, n_players).
+        :param delta_t: Duration of the last time step, to test the path travelled by the bullets during it. Default
+            value is None (only test the current positions).
+        :type delta_t: Number.
+        :return: Slots of the bullets that hit a player, index of the player each of them hit, and the fraction of the
+            time step at which it was hit (1 if `delta_t` is None).
+        :rtype: Tuple with three arrays.
+        """
+        live = self.live_indices()
+        centers = np.asarray(centers, dtype=float)
+        sizes = np.asarray(sizes)
+        if len(live) == 0 or len(centers) == 0:
+            no_hits = np.zeros(0, dtype=np.int64)
+            return no_hits, no_hits, np.ones(0)
+
+        # Overlap between the rectangle of every bullet (rows) and every player (columns)
+        b_left, b_top, b_right, b_bottom = (bound[:, None] for bound in self.get_rects(live))
+        p_left, p_top = (round_half_away(centers) - (sizes // 2)[:, None]).T
+        overlap = (b_left < p_left + sizes) & (b_top < p_top + sizes) & (p_left < b_right) & (p_top < b_bottom)
+        overlap &= opponents[self.owner[live]]
+
+        if delta_t is None:
+            hit = overlap.any(axis=1)
+            targets = overlap.argmax(axis=1)[hit]
+            return live[hit], targets, np.ones(len(targets))
+
+        displacement = self.velocity[live] * delta_t
+        start = self.position[live] - displacement
+        grown_half = ((sizes + self.size) / 2)[:, None]
+        times = sweep_segments_boxes(start[:, None], displacement[:, None], centers - grown_half, centers + grown_half)
+        times[np.isinf(times) & overlap] = 1.0
+        times[~opponents[self.owner[live]]] = np.inf
+        targets = times.argmin(axis=1)
+        times = times[np.arange(len(live)), targets]
+        hit = np.isfinite(times)
+        return live[hit], targets[hit], times[hit]
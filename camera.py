@@ -0,0 +1,106 @@
+"""
+View of a game world that is larger than the screen.
+
+Example:
+    game = Game(world_sz=(6400, 3200), obstacles=[(800, 400, 200, 600)])
+    game.camera.target = 0       # Follow the first player
+
+The camera is used by Game.draw_frame() to decide which part of the world is drawn, and which objects can be skipped
+because they are outside of it, and by Game.update_physics() to convert the mouse position to world coordinates.
+"""
+
+
+class Camera:
+    """
+    Class for representing the part of the world shown on the screen.
+
+    The view is a rectangle of the size of the screen, whose top left corner is at integer world coordinates (so that
+    objects do not shimmer as it moves) and which never leaves the world, unless the world is smaller than the screen.
+
+    Attributes:
+        - width: Width of the view. Number.
+        - height: Height of the view. Number.
+        - world_width: Width of the world. Number.
+        - world_height: Height of the world. Number.
+        - target: Index of the player the view is centered on, or None for a view that only moves with move_to().
+            Number.
+        - left: World x coordinate of the left side of the view. Integer.
+        - top: World y coordinate of the top side of the view. Integer.
+    """
+
+    def __init__(self, view_sz, world_sz, target=None):
+        """
+        Initializes a camera showing the top left corner of the world.
+
+        :param view_sz: Width and height of the view (the screen).
+        :type view_sz: Tuple with two elements.
+        :param world_sz: Width and height of the world.
+        :type world_sz: Tuple with two elements.
+        :param target: Index of the player to follow. Default value is None (do not follow any player).
+        :type target: Number.
+        """
+        self.width, self.height = view_sz
+        self.world_width, self.world_height = world_sz
+        self.target = target
+        self.left = 0
+        self.top = 0
+
+    def get_offset(self):
+        """
+        Returns the world coordinates of the top left corner of the view, which are subtracted from world coordinates to
+        get screen coordinates.
+
+        :return: Left and top of the view.
+        :rtype: Tuple with two integers.
+        """
+        return self.left, self.top
+
+    def move_to(self, center):
+        """
+        Centers the view on a point, as far as the borders of the world allow.
+
+        :param center: World coordinates of the point.
+        :type center: Array with two elements.
+        """
+        self.left = self.__clamp(int(center[0]) - self.width // 2, self.world_width - self.width)
+        self.top = self.__clamp(int(center[1]) - self.height // 2, self.world_height - self.height)
+
+    def to_world(self, point):
+        """
+        Converts screen coordinates (e.g. of the mouse) to world coordinates.
+
+        :param point: Screen coordinates.
+        :type point: Array with two elements.
+        :return: World coordinates.
+        :rtype: Tuple with two elements.
+        """
+        return point[0] + self.left, point[1] + self.top
+
+    def to_screen(self, point):
+        """
+        Converts world coordinates to screen coordinates.
+
+        :param point: World coordinates.
+        :type point: Array with two elements.
+        :return: Screen coordinates.
+        :rtype: Tuple with two elements.
+        """
+        return point[0] - self.left, point[1] - self.top
+
+    def is_visible(self, left, top, right, bottom):
+        """
+        Returns whether a rectangle (in world coordinates, with exclusive right and bottom bounds) overlaps the view.
+        The bounds can also be arrays, to test many rectangles at once (e.g. the bullets of a pool).
+
+        :return: Whether the rectangle overlaps the view, or whether each rectangle does.
+        :rtype: Boolean, or boolean array.
+        """
+        return (left < self.left + self.width) & (top < self.top + self.height) & (self.left < right) & \
+            (self.top < bottom)
+
+    @staticmethod
+    def __clamp(value, largest):
+        """
+        Limits a coordinate of the view to [0, largest], or to 0 if the world is smaller than the view.
+        """
+        return max(0, min(value, largest))
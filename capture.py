@@ -0,0 +1,343 @@
+"""
+Recording of the frames drawn by a game to a PNG sequence or a video stream, encoded and written by a background
+thread.
+
+Example:
+    game = Game(offscreen=True)
+    game.capture = FrameCapture('highlights.y4m', fps=60)
+    ...                                     # Every frame drawn by game.draw_frame() is recorded
+    game.capture.close()
+    print(game.capture.n_written, game.capture.n_dropped)
+
+Game.draw_frame() only copies the raw pixels of the screen into one of `n_buffers` buffers, allocated when the first
+frame arrives, and queues it. The writer thread converts, encodes and writes the queued frames, and then hands their
+buffers back. When every buffer is still waiting to be written, the frame is dropped instead of waiting for the writer
+('drop' policy), and with the 'throttle' policy only one frame in every few is captured until the writer catches up, so
+that the game loop never stalls on encoding or disk I/O. The 'wait' policy waits for the writer instead, for offline
+rendering (e.g. of replays) where no frame should be lost.
+
+Formats:
+    - 'png': one PNG file per frame, named by formatting a pattern with the index of the frame (e.g.
+      'frames/{:06d}.png'). The files of the frames that were not captured are missing.
+    - 'y4m': YUV4MPEG2 video with full chroma (4:4:4), read by ffmpeg and most video players.
+    - 'raw': RGB24 frames, one after the other (e.g. read with `ffmpeg -f rawvideo -pix_fmt rgb24 -s 1600x800 -r 60
+      -i FILE`).
+In videos, the last frame written is repeated in place of the frames that were not captured (up to the last frame
+given to the capture, when it is closed), so that they keep the pace of the game.
+"""
+import os
+import queue
+import threading
+import time
+from fractions import Fraction
+
+import numpy as np
+
+from metrics import RollingHistogram
+from move_n_shoot import get_channel_bytes
+
+
+# Formats of the output, and what to do when the writer falls behind
+FORMATS = ('png', 'y4m', 'raw')
+POLICIES = ('drop', 'throttle', 'wait')
+
+# Largest number of frames in between two captured frames, with the 'throttle' policy
+MAX_THROTTLE_INTERVAL = 16
+
+# Conversion of RGB to the Y, Cb and Cr planes of y4m videos (ITU-R BT.601, with the video range of 16 to 235)
+_YCBCR_MATRIX = np.array([[0.257, 0.504, 0.098], [-0.148, -0.291, 0.439], [0.439, -0.368, -0.071]], dtype=np.float32)
+_YCBCR_OFFSETS = np.array([16.5, 128.5, 128.5], dtype=np.float32)
+
+
+class FrameCapture:
+    """
+    Class for recording frames to a file, through a bounded queue of reusable buffers and a writer thread.
+
+    Attributes:
+        - output: Pattern of the names of the PNG files, or path or binary file object of the video. String or file
+            object.
+        - format: Format of the output (see FORMATS). String.
+        - fps: Frame-rate written in y4m videos. Number.
+        - n_buffers: Number of frames that can wait to be written. Number.
+        - policy: What to do when every buffer is waiting to be written (see POLICIES). String.
+        - size: Width and height of the frames, or None until the first frame is captured. Tuple with two elements.
+        - interval: Only one frame in every `interval` is captured. Above 1 only with the 'throttle' policy, while the
+            writer is behind. Number.
+        - n_frames: Number of frames given to add_frame(). Number.
+        - n_captured: Number of frames copied and queued. Number.
+        - n_written: Number of frames written by the writer thread. Number.
+        - n_dropped: Number of frames dropped because no buffer was free. Number.
+        - n_skipped: Number of frames skipped by throttling. Number.
+        - n_repeated: Number of times a frame was written again in a video, in place of frames that were not captured.
+            Number.
+        - copy_times: Time (in seconds) taken by add_frame() to copy every captured frame. RollingHistogram object.
+        - write_times: Time (in seconds) taken by the writer thread to convert, encode and write every frame.
+            RollingHistogram object.
+        - error: Exception raised by the writer thread, or None. Frames are no longer captured once it is set.
+    """
+
+    def __init__(self, output, format=None, fps=60, n_buffers=8, policy='drop'):
+        """
+        Opens the output, and starts the writer thread. Close the capture (see close()) to write the queued frames and
+        close the output.
+
+        :param output: Pattern of the names of the PNG files, formatted with the index of each frame (a '_{:06d}'
+            suffix is added to the name if it has no replacement field), or path of the video, or a binary file object
+            where the video is written (e.g. the input of an ffmpeg process).
+        :type output: String or file object.
+        :param format: Format of the output (see FORMATS). Default value is given by the extension of the path: 'png'
+            for '.png', 'y4m' for '.y4m', and 'raw' otherwise.
+        :type format: String.
+        :param fps: Frame-rate written in y4m videos. Default value is 60.
+        :type fps: Number.
+        :param n_buffers: Number of frames that can wait to be written. Default value is 8.
+        :type n_buffers: Number.
+        :param policy: What to do when every buffer is waiting to be written: drop the frame ('drop'), drop it and
+            capture fewer frames until the writer catches up ('throttle'), or wait for a free buffer ('wait'). Default
+            value is 'drop'.
+        :type policy: String.
+        """
+        if format is None:
+            if not isinstance(output, str):
+                raise ValueError('The format must be given when the output is a file object')
+            extension = os.path.splitext(output)[1].lower()
+            format = {'.png': 'png', '.y4m': 'y4m'}.get(extension, 'raw')
+        if format not in FORMATS:
+            raise ValueError('Unknown capture format {!r}, expected one of {}'.format(format, FORMATS))
+        if policy not in POLICIES:
+            raise ValueError('Unknown capture policy {!r}, expected one of {}'.format(policy, POLICIES))
+        if format == 'png' and not isinstance(output, str):
+            raise ValueError('PNG sequences need a pattern of file names')
+
+        self.format = format
+        self.fps = fps
+        self.n_buffers = n_buffers
+        self.policy = policy
+        self.size = None
+        self.interval = 1
+        self.n_frames = 0
+        self.n_captured = 0
+        self.n_written = 0
+        self.n_dropped = 0
+        self.n_skipped = 0
+        self.n_repeated = 0
+        self.copy_times = RollingHistogram()
+        self.write_times = RollingHistogram()
+        self.error = None
+
+        # Open the output. PNG patterns without a replacement field get one, and their directory is created
+        self.__file = None
+        self.__owns_file = False
+        if format == 'png':
+            if '{' not in output:
+                root, extension = os.path.splitext(output)
+                output = root + '_{:06d}' + extension
+            directory = os.path.dirname(output)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+        elif isinstance(output, str):
+            self.__file = open(output, 'wb')
+            self.__owns_file = True
+        else:
+            self.__file = output
+        self.output = output
+
+        # Buffers of the raw frames (allocated with the first frame), indices of the free ones, and the queue of the
+        # frames to write: index of their buffer and of the frame
+        self.__buffers = []
+        self.__free = queue.Queue()
+        self.__queue = queue.Queue()
+        self.__closed = False
+        self.__header_written = False
+
+        self.__thread = threading.Thread(target=self.__write_frames, name='FrameCapture', daemon=True)
+        self.__thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def add_frame(self, surface):
+        """
+        Copies a frame, and queues it for the writer thread. Never waits for the writer, unless the policy is 'wait'.
+
+        :param surface: The frame (e.g. the screen of a game). All frames must have the same size and pixel format.
+        :type surface: Surface.
+        :return: Whether the frame was captured.
+        :rtype: Boolean.
+        """
+        index = self.n_frames
+        self.n_frames += 1
+        if self.__closed or self.error is not None:
+            return False
+        if index % self.interval:
+            self.n_skipped += 1
+            return False
+
+        if self.size is None:
+            self.__allocate_buffers(surface)
+        elif surface.get_size() != self.size or surface.get_pitch() != self.__pitch:
+            raise ValueError('Frames of size {} cannot be added to a capture of size {}'.format(surface.get_size(),
+                                                                                              self.size))
+
+        try:
+            slot = self.__free.get() if self.policy == 'wait' else self.__free.get_nowait()
+        except queue.Empty:
+            self.n_dropped += 1
+            if self.policy == 'throttle':
+                self.interval = min(self.interval * 2, MAX_THROTTLE_INTERVAL)
+            return False
+
+        # Capture fewer frames while the writer is behind (no buffer left), and more once it has caught up (no frame
+        # waiting)
+        if self.policy == 'throttle':
+            n_free = self.__free.qsize()
+            if n_free == 0:
+                self.interval = min(self.interval * 2, MAX_THROTTLE_INTERVAL)
+            elif n_free == self.n_buffers - 1 and self.interval > 1:
+                self.interval //= 2
+
+        # Copy the raw pixels. The view is released right after, since a surface cannot be drawn on while it is
+        # referenced
+        start = time.perf_counter()
+        pixels = surface.get_view('0')
+        np.copyto(self.__buffers[slot], np.asarray(pixels))
+        del pixels
+
+        self.n_captured += 1
+        self.__queue.put((slot, index))
+        self.copy_times.add(time.perf_counter() - start)
+        return True
+
+    def close(self):
+        """
+        Waits for the writer thread to write the queued frames, and closes the output (unless it is a file object that
+        was given). Videos are padded with the last frame written up to the last frame given to add_frame(). Raises a
+        RuntimeError if the writer failed.
+        """
+        if not self.__closed:
+            self.__closed = True
+            self.__queue.put((None, self.n_frames))
+            self.__thread.join()
+            if self.__owns_file:
+                self.__file.close()
+        if self.error is not None:
+            raise RuntimeError('Writing frames to {!r} failed: {}'.format(self.output, self.error)) from self.error
+
+    def __allocate_buffers(self, surface):
+        """
+        Allocates the buffers of the raw frames and of their conversion, for frames like a surface.
+        """
+        width, height = self.size = surface.get_size()
+        self.__pitch = surface.get_pitch()
+        self.__bytes_per_pixel = surface.get_bytesize()
+        self.__channel_bytes = get_channel_bytes(surface)
+        for slot in range(self.n_buffers):
+            self.__buffers.append(np.empty(height * self.__pitch, dtype=np.uint8))
+            self.__free.put(slot)
+        self.__rgb = np.empty((height, width, 3), dtype=np.uint8)
+        if self.format == 'y4m':
+            self.__ycbcr = np.empty((height, width, 3), dtype=np.float32)
+            self.__planes = np.empty((3, height, width), dtype=np.uint8)
+
+    def __write_frames(self):
+        """
+        Main loop of the writer thread: writes the queued frames until close() is called, or until writing fails.
+        """
+        last_index = None
+        while True:
+            slot, index = self.__queue.get()
+
+            # close() queues the number of frames given to add_frame(), which ends the video
+            if slot is None:
+                if self.error is None:
+                    try:
+                        self.__repeat_last_frame(last_index, index)
+                    except Exception as error:
+                        self.error = error
+                break
+
+            if self.error is not None:
+                self.__free.put(slot)
+                continue
+            start = time.perf_counter()
+            try:
+                self.__repeat_last_frame(last_index, index)
+                self.__convert(self.__buffers[slot])
+            except Exception as error:
+                self.error = error
+                continue
+            finally:
+                # The raw frame is no longer needed once it is converted
+                self.__free.put(slot)
+
+            try:
+                if self.format == 'png':
+                    self.__write_png(index)
+                else:
+                    if self.format == 'y4m':
+                        self.__to_ycbcr_planes()
+                    self.__write_video_frame()
+            except Exception as error:
+                self.error = error
+                continue
+            last_index = index
+            self.n_written += 1
+            self.write_times.add(time.perf_counter() - start)
+
+    def __repeat_last_frame(self, last_index, index):
+        """
+        Repeats the last frame written to a video in place of the frames that were not captured, from the one after
+        `last_index` to the one before `index`. Does nothing for PNG sequences, or if no frame was written yet.
+        """
+        if last_index is None or self.format == 'png':
+            return
+        for _ in range(index - last_index - 1):
+            self.__write_video_frame()
+            self.n_repeated += 1
+
+    def __convert(self, buffer):
+        """
+        Converts a raw frame to RGB.
+        """
+        width, height = self.size
+        pixels = buffer.reshape(height, self.__pitch)[:, :width * self.__bytes_per_pixel]
+        pixels = pixels.reshape(height, width, self.__bytes_per_pixel)
+        for channel, byte in enumerate(self.__channel_bytes):
+            np.copyto(self.__rgb[:, :, channel], pixels[:, :, byte])
+
+    def __to_ycbcr_planes(self):
+        """
+        Converts the RGB frame to the Y, Cb and Cr planes of a y4m frame.
+        """
+        np.matmul(self.__rgb, _YCBCR_MATRIX.T, out=self.__ycbcr)
+        self.__ycbcr += _YCBCR_OFFSETS
+        np.copyto(self.__planes, self.__ycbcr.transpose(2, 0, 1), casting='unsafe')
+
+    def __write_video_frame(self):
+        """
+        Writes the last converted frame to the video, after the header of the stream if it is the first one.
+        """
+        if self.format == 'y4m':
+            if not self.__header_written:
+                self.__header_written = True
+                width, height = self.size
+                fps = Fraction(self.fps).limit_denominator(1001)
+                self.__file.write('YUV4MPEG2 W{} H{} F{}:{} Ip A1:1 C444\n'.format(
+                    width, height, fps.numerator, fps.denominator).encode('ascii'))
+            self.__file.write(b'FRAME\n')
+            self.__file.write(self.__planes)
+        else:
+            self.__file.write(self.__rgb)
+
+    def __write_png(self, index):
+        """
+        Writes the last converted frame to its PNG file.
+        """
+        import pygame
+
+        width, height = self.size
+        image = pygame.image.frombuffer(self.__rgb, (width, height), 'RGB')
+        pygame.image.save(image, self.output.format(index))
@@ -0,0 +1,480 @@
+"""
+Collision detection helpers for the game's physics.
+"""
+import math
+
+import numpy as np
+
+
+def round_half_away(x):
+    """
+    Round to the nearest integer, with halves rounded away from zero. This is the rounding pygame applies when a Rect's
+    center is set from floats, so rectangles computed with it are identical to the ones of the scalar Game.
+
+    :param x: Values to round.
+    :type x: Numpy array.
+    :return: Rounded values (still as floats).
+    :rtype: Numpy array.
+    """
+    t = np.trunc(x)
+    return np.where(np.abs(x - t) >= 0.5, t + np.sign(x), t)
+
+
+def sweep_segment_box(start, displacement, box_min, box_max):
+    """
+    Computes when a point moving along a segment first enters an open axis-aligned box.
+
+    A moving rectangle hits a static one exactly when its center enters the static rectangle grown by the moving
+    rectangle's half size on every side, so this also gives the time of impact of two rectangles (e.g. a bullet and a
+    player) in between two time steps, however far the moving one travels. Points on the border of the box are not
+    inside it, like rectangles that only share an edge do not overlap.
+
+    :param start: Position of the point at the start of the segment.
+    :type start: Array with two elements.
+    :param displacement: Displacement of the point along the segment.
+    :type displacement: Array with two elements.
+    :param box_min: Smallest coordinates of the box.
+    :type box_min: Array with two elements.
+    :param box_max: Largest coordinates of the box.
+    :type box_max: Array with two elements.
+    :return: Fraction of the segment (between 0 and 1) travelled when the point enters the box, 0 if it starts inside
+        it, or None if the point never is inside the box.
+    :rtype: Number.
+    """
+    enter = -math.inf
+    leave = math.inf
+    for axis in range(2):
+        s = start[axis]
+        d = displacement[axis]
+        if d == 0:
+            if not box_min[axis] < s < box_max[axis]:
+                return None
+            continue
+        t_1 = (box_min[axis] - s) / d
+        t_2 = (box_max[axis] - s) / d
+        if t_1 > t_2:
+            t_1, t_2 = t_2, t_1
+        if t_1 > enter:
+            enter = t_1
+        if t_2 < leave:
+            leave = t_2
+
+    if enter < leave and enter < 1 and leave > 0:
+        return enter if enter > 0 else 0.0
+    return None
+
+
+def sweep_segments_boxes(starts, displacements, box_mins, box_maxs):
+    """
+    Vectorized version of sweep_segment_box(), for many segments and boxes at once. All arguments are broadcast against
+    each other, with the coordinates in the last axis (e.g. starts with shape (n, 1, 2) and boxes with shape (m, 2) test
+    every segment against every box). Gives exactly the same times as sweep_segment_box().
+
+    :param starts: Positions of the points at the start of the segments.
+    :type starts: Array with shape (..., 2).
+    :param displacements: Displacements of the points along the segments.
+    :type displacements: Array with shape (..., 2).
+    :param box_mins: Smallest coordinates of the boxes.
+    :type box_mins: Array with shape (..., 2).
+    :param box_maxs: Largest coordinates of the boxes.
+    :type box_maxs: Array with shape (..., 2).
+    :return: Fraction of each segment travelled when its point enters the box, or infinity for misses.
+    :rtype: Array of floats, with the broadcast shape of the arguments without the last axis.
+    """
+    starts = np.asarray(starts, dtype=float)
+    displacements = np.asarray(displacements, dtype=float)
+    box_mins = np.asarray(box_mins, dtype=float)
+    box_maxs = np.asarray(box_maxs, dtype=float)
+
+    # Axes along which the point does not move either are always inside the slab of the box, or never are
+    still = displacements == 0
+    inside = (box_mins < starts) & (starts < box_maxs)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        t_1 = (box_mins - starts) / displacements
+        t_2 = (box_maxs - starts) / displacements
+    enter = np.where(still, np.where(inside, -np.inf, np.inf), np.minimum(t_1, t_2)).max(axis=-1)
+    leave = np.where(still, np.where(inside, np.inf, -np.inf), np.maximum(t_1, t_2)).min(axis=-1)
+
+    hit = (enter < leave) & (enter < 1) & (leave > 0)
+    return np.where(hit, np.maximum(enter, 0.0), np.inf)
+
+
+class SpatialHash:
+    """
+    Class for representing a broadphase index of axis-aligned rectangles, based on a uniform grid (spatial hash).
+
+    Every rectangle is stored in all the grid cells it overlaps, so that finding the rectangles that might overlap a
+    given area only requires looking at the cells around it, instead of at every rectangle. Rectangles follow the
+    convention of pygame's Rect: `right` and `bottom` are exclusive, and rectangles that only share an edge do not
+    overlap.
+
+    Updating a rectangle is cheap when it stays within the same cells, which is the common case when the cell size is
+    similar to the size of the rectangles.
+
+    Attributes:
+        - cell_size: Side length of the grid cells. Number.
+        - cells: Keys of the rectangles in each non-empty cell, by cell coordinates. Dictionary of sets.
+        - cell_ranges: Range of cells (first column, first row, last column, last row) of each rectangle, by key.
+            Dictionary.
+    """
+
+    def __init__(self, cell_size):
+        """
+        Initializes an empty spatial hash.
+
+        :param cell_size: Side length of the grid cells. A good value is the size of the largest rectangles.
+        :type cell_size: Number.
+        """
+        self.cell_size = cell_size
+        self.cells = {}
+        self.cell_ranges = {}
+
+    def __len__(self):
+        return len(self.cell_ranges)
+
+    def __contains__(self, key):
+        return key in self.cell_ranges
+
+    def get_cell_range(self, left, top, right, bottom):
+        """
+        Returns the range of cells overlapped by a rectangle.
+
+        :return: First column, first row, last column and last row (inclusive).
+        :rtype: Tuple with four integers.
+        """
+        s = self.cell_size
+        return int(left // s), int(top // s), int((right - 1) // s), int((bottom - 1) // s)
+
+    def update(self, key, left, top, right, bottom):
+        """
+        Inserts a rectangle in the index, or moves it if its key is already present.
+
+        :param key: Identifier of the rectangle (e.g. the index of a player).
+        :type key: Hashable.
+        """
+        cell_range = self.get_cell_range(left, top, right, bottom)
+        old_range = self.cell_ranges.get(key)
+        if old_range == cell_range:
+            return
+
+        if old_range is not None:
+            self.__remove_from_cells(key, old_range)
+
+        self.cell_ranges[key] = cell_range
+        col_0, row_0, col_1, row_1 = cell_range
+        for col in range(col_0, col_1 + 1):
+            for row in range(row_0, row_1 + 1):
+                cell = self.cells.get((col, row))
+                if cell is None:
+                    self.cells[(col, row)] = {key}
+                else:
+                    cell.add(key)
+
+    def query(self, left, top, right, bottom):
+        """
+        Returns the keys of all rectangles that share a cell with the given area. This is a superset of the
+        rectangles that overlap it, so the overlap still has to be tested exactly.
+
+        :return: Keys of the candidate rectangles.
+        :rtype: Set.
+        """
+        col_0, row_0, col_1, row_1 = self.get_cell_range(left, top, right, bottom)
+        if col_0 == col_1 and row_0 == row_1:
+            return set(self.cells.get((col_0, row_0), ()))
+
+        keys = set()
+        for col in range(col_0, col_1 + 1):
+            for row in range(row_0, row_1 + 1):
+                cell = self.cells.get((col, row))
+                if cell is not None:
+                    keys.update(cell)
+        return keys
+
+    def __remove_from_cells(self, key, cell_range):
+        col_0, row_0, col_1, row_1 = cell_range
+        for col in range(col_0, col_1 + 1):
+            for row in range(row_0, row_1 + 1):
+                cell = self.cells[(col, row)]
+                cell.discard(key)
+                if not cell:
+                    del self.cells[(col, row)]
+
+
+class StaticGrid:
+    """
+    Class for representing a fixed set of axis-aligned rectangles (e.g. the obstacles of a map), indexed in a uniform
+    grid that is computed once.
+
+    Every rectangle is stored in all the grid cells it overlaps once grown by `padding` on every side, so the cell of a
+    point holds every rectangle that a square of half size up to `padding` centered at the point may overlap. Queries
+    only look at the cells around the area or the segment they test, so their cost depends on how many rectangles
+    are around, and not on the size of the map. Rectangles follow the convention of pygame's Rect, like SpatialHash.
+
+    Attributes:
+        - cell_size: Side length of the grid cells. Number.
+        - padding: Distance by which the rectangles are grown when they are put in the cells. Number.
+        - rects: Left, top, right and bottom bounds of every rectangle. Integer array with shape (n, 4).
+        - cells: Indices of the rectangles in each non-empty cell, in increasing order, by cell coordinates. Dictionary
+            of tuples.
+
+    The cells are also stored in a table (an array over the area spanned by the non-empty cells), so that raycast_many()
+    and overlaps_any() test many segments or areas at once with vectorized operations.
+    """
+
+    def __init__(self, rects, cell_size=100, padding=0):
+        """
+        Indexes a set of rectangles.
+
+        :param rects: Left, top, width and height of every rectangle.
+        :type rects: Sequence of sequences with four integers.
+        :param cell_size: Side length of the grid cells. Default value is 100.
+        :type cell_size: Number.
+        :param padding: Largest half size of the squares whose overlaps are found with a single cell (see raycast()).
+            Default value is 0.
+        :type padding: Number.
+        """
+        self.cell_size = cell_size
+        self.padding = padding
+        self.rects = np.zeros((len(rects), 4), dtype=np.int64)
+        cells = {}
+        for k, (left, top, width, height) in enumerate(rects):
+            self.rects[k] = (left, top, left + width, top + height)
+            col_0, row_0, col_1, row_1 = self.get_cell_range(left - padding, top - padding, left + width + padding,
+                                                             top + height + padding)
+            for col in range(col_0, col_1 + 1):
+                for row in range(row_0, row_1 + 1):
+                    cells.setdefault((col, row), []).append(k)
+        self.cells = {cell: tuple(indices) for cell, indices in cells.items()}
+        self.__bounds = self.rects.tolist()
+
+        # Table of the cells, in row-major order from the first column and row with rectangles: row c holds the indices
+        # of the rectangles of cell c, padded with -1, and the last row stands for every cell out of the table
+        if cells:
+            self.__first_cell = (min(col for col, _ in cells), min(row for _, row in cells))
+            self.__n_cols = max(col for col, _ in cells) - self.__first_cell[0] + 1
+            self.__n_rows = max(row for _, row in cells) - self.__first_cell[1] + 1
+        else:
+            self.__first_cell = (0, 0)
+            self.__n_cols = self.__n_rows = 0
+        self.__cell_table = np.full((self.__n_cols * self.__n_rows + 1, max(map(len, cells.values()), default=0)), -1,
+                                    dtype=np.int64)
+        for (col, row), indices in self.cells.items():
+            cell = (row - self.__first_cell[1]) * self.__n_cols + col - self.__first_cell[0]
+            self.__cell_table[cell, :len(indices)] = indices
+
+    def __len__(self):
+        return len(self.rects)
+
+    def get_cell_range(self, left, top, right, bottom):
+        """
+        Returns the range of cells overlapped by a rectangle.
+
+        :return: First column, first row, last column and last row (inclusive).
+        :rtype: Tuple with four integers.
+        """
+        s = self.cell_size
+        return int(left // s), int(top // s), int((right - 1) // s), int((bottom - 1) // s)
+
+    def query(self, left, top, right, bottom):
+        """
+        Returns the indices of all rectangles that share a cell with the given area. This is a superset of the
+        rectangles that overlap it, so the overlap still has to be tested exactly (see overlapping()).
+
+        :return: Indices of the candidate rectangles, in increasing order.
+        :rtype: Tuple or list.
+        """
+        col_0, row_0, col_1, row_1 = self.get_cell_range(left, top, right, bottom)
+        if col_0 == col_1 and row_0 == row_1:
+            return self.cells.get((col_0, row_0), ())
+
+        indices = set()
+        for col in range(col_0, col_1 + 1):
+            for row in range(row_0, row_1 + 1):
+                cell = self.cells.get((col, row))
+                if cell is not None:
+                    indices.update(cell)
+        return sorted(indices)
+
+    def overlapping(self, left, top, right, bottom):
+        """
+        Returns the indices of the rectangles that overlap the given area.
+
+        :return: Indices of the rectangles, in increasing order.
+        :rtype: List.
+        """
+        bounds = self.__bounds
+        return [k for k in self.query(left, top, right, bottom)
+                if bounds[k][0] < right and bounds[k][1] < bottom and left < bounds[k][2] and top < bounds[k][3]]
+
+    def get_bounds(self, k):
+        """
+        Returns the bounds of a rectangle.
+
+        :param k: Index of the rectangle.
+        :type k: Number.
+        :return: Left, top, right and bottom bounds.
+        :rtype: List with four integers.
+        """
+        return self.__bounds[k]
+
+    def raycast(self, start, displacement, half_size=0):
+        """
+        Finds the first rectangle hit by a square moving along a segment (or by a point, if `half_size` is 0). Only the
+        cells crossed by the segment are visited, in order, and the search stops at the first cell past the first hit.
+
+        :param start: Position of the center of the square at the start of the segment.
+        :type start: Array with two elements.
+        :param displacement: Displacement of the center along the segment.
+        :type displacement: Array with two elements.
+        :param half_size: Half the side length of the square. At most `padding`. Default value is 0.
+        :type half_size: Number.
+        :return: Index of the rectangle hit first (the first in index order, in case of a tie) and the fraction of the
+            segment travelled when it was hit (see sweep_segment_box()), or None if no rectangle is hit.
+        :rtype: Tuple with two elements, or None.
+        """
+        if half_size > self.padding:
+            raise ValueError('half_size ({}) is larger than the padding of the grid ({})'.format(half_size,
+                                                                                                self.padding))
+        s = self.cell_size
+        x, y = start
+        dx, dy = displacement
+        col, row = int(x // s), int(y // s)
+        end_col, end_row = int((x + dx) // s), int((y + dy) // s)
+        step_col = 1 if dx > 0 else -1
+        step_row = 1 if dy > 0 else -1
+        next_col_time = ((col + (dx > 0)) * s - x) / dx if dx != 0 else math.inf
+        next_row_time = ((row + (dy > 0)) * s - y) / dy if dy != 0 else math.inf
+        col_time_step = s / abs(dx) if dx != 0 else math.inf
+        row_time_step = s / abs(dy) if dy != 0 else math.inf
+
+        bounds = self.__bounds
+        tested = set()
+        first = None
+        while True:
+            for k in self.cells.get((col, row), ()):
+                if k in tested:
+                    continue
+                tested.add(k)
+                left, top, right, bottom = bounds[k]
+                time = sweep_segment_box(start, displacement, (left - half_size, top - half_size),
+                                         (right + half_size, bottom + half_size))
+                if time is not None and (first is None or (time, k) < (first[1], first[0])):
+                    first = (k, time)
+
+            # Cells are visited in the order the segment enters them, and a rectangle is hit at a point that lies in
+            # one of its cells, so no cell entered after the first hit can hold an earlier one
+            next_time = min(next_col_time, next_row_time)
+            if (col == end_col and row == end_row) or next_time > 1 or (first is not None and first[1] < next_time):
+                return first
+            if next_col_time < next_row_time:
+                next_col_time += col_time_step
+                col += step_col
+            else:
+                next_row_time += row_time_step
+                row += step_row
+
+    def raycast_many(self, starts, displacements, half_size=0):
+        """
+        Vectorized version of raycast(), for many segments at once. The rectangles in the cells around each segment are
+        all tested together (see sweep_segments_boxes()), instead of visiting the cells one after the other. Gives
+        exactly the same hits as raycast().
+
+        :param starts: Position of the center of each square at the start of its segment.
+        :type starts: Array with shape (n, 2).
+        :param displacements: Displacement of each center along its segment.
+        :type displacements: Array with shape (n, 2).
+        :param half_size: Half the side length of the squares. At most `padding`. Default value is 0.
+        :type half_size: Number.
+        :return: Index of the rectangle hit first by each square (the first in index order, in case of a tie), or -1 if
+            it hits none, and the fraction of its segment travelled when it was hit, or infinity.
+        :rtype: Tuple with an array of integers and an array of floats, both with shape (n,).
+        """
+        if half_size > self.padding:
+            raise ValueError('half_size ({}) is larger than the padding of the grid ({})'.format(half_size,
+                                                                                                self.padding))
+        starts = np.asarray(starts, dtype=float)
+        displacements = np.asarray(displacements, dtype=float)
+        hits = np.full(len(starts), -1, dtype=np.int64)
+        times = np.full(len(starts), np.inf)
+
+        # The cells crossed by a segment are within the range of cells of its two ends
+        ends = starts + displacements
+        first_cells = (np.minimum(starts, ends) // self.cell_size).astype(np.int64)
+        last_cells = (np.maximum(starts, ends) // self.cell_size).astype(np.int64)
+        segments, rects = self.__get_candidates(first_cells[:, 0], first_cells[:, 1], last_cells[:, 0],
+                                                last_cells[:, 1])
+        if len(segments) == 0:
+            return hits, times
+        pair_times = sweep_segments_boxes(starts[segments], displacements[segments], self.rects[rects, :2] - half_size,
+                                          self.rects[rects, 2:] + half_size)
+
+        # Keep the earliest hit of each segment (the first rectangle in index order, in case of a tie)
+        hit = np.isfinite(pair_times)
+        if not hit.any():
+            return hits, times
+        segments, rects, pair_times = segments[hit], rects[hit], pair_times[hit]
+        order = np.lexsort((rects, pair_times, segments))
+        segments, rects, pair_times = segments[order], rects[order], pair_times[order]
+        first = np.ones(len(segments), dtype=bool)
+        np.not_equal(segments[1:], segments[:-1], out=first[1:])
+        hits[segments[first]] = rects[first]
+        times[segments[first]] = pair_times[first]
+        return hits, times
+
+    def overlaps_any(self, lefts, tops, rights, bottoms):
+        """
+        Vectorized test of whether each of many areas overlaps any rectangle (see overlapping()).
+
+        :param lefts: Left bound of every area.
+        :type lefts: Array with shape (n,).
+        :param tops: Top bound of every area.
+        :type tops: Array with shape (n,).
+        :param rights: Right bound of every area.
+        :type rights: Array with shape (n,).
+        :param bottoms: Bottom bound of every area.
+        :type bottoms: Array with shape (n,).
+        :return: Whether each area overlaps at least one rectangle.
+        :rtype: Boolean array with shape (n,).
+        """
+        lefts, tops, rights, bottoms = (np.asarray(bound) for bound in (lefts, tops, rights, bottoms))
+        s = self.cell_size
+        col_0, row_0 = (lefts // s).astype(np.int64), (tops // s).astype(np.int64)
+        col_1, row_1 = ((rights - 1) // s).astype(np.int64), ((bottoms - 1) // s).astype(np.int64)
+        areas, rects = self.__get_candidates(col_0, row_0, col_1, row_1)
+        result = np.zeros(len(lefts), dtype=bool)
+        if len(areas) == 0:
+            return result
+        bounds = self.rects[rects]
+        overlap = ((bounds[:, 0] < rights[areas]) & (bounds[:, 1] < bottoms[areas]) & (lefts[areas] < bounds[:, 2]) &
+                   (tops[areas] < bounds[:, 3]))
+        result[areas[overlap]] = True
+        return result
+
+    def __get_candidates(self, col_0, row_0, col_1, row_1):
+        """
+        Lists the rectangles in every cell of many ranges of cells, as pairs of the index of the range and the index
+        of a rectangle. A rectangle in several cells of the same range is listed more than once.
+
+        :return: Index of the range and of the rectangle of every pair, sorted by range.
+        :rtype: Tuple with two arrays of integers.
+        """
+        # Ranges of cells relative to the table, clipped to it
+        first_col, first_row = self.__first_cell
+        col_0 = np.maximum(col_0 - first_col, 0)
+        row_0 = np.maximum(row_0 - first_row, 0)
+        n_cols = np.minimum(col_1 - first_col, self.__n_cols - 1) - col_0 + 1
+        n_rows = np.minimum(row_1 - first_row, self.__n_rows - 1) - row_0 + 1
+        width = n_cols.max(initial=0)
+        height = n_rows.max(initial=0)
+        if width <= 0 or height <= 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+
+        # Every cell of every range (padded to the largest range with the empty last row of the table), and then every
+        # rectangle of every cell
+        d_col = np.arange(width)
+        d_row = np.arange(height)[:, None]
+        in_range = (d_col < n_cols[:, None, None]) & (d_row < n_rows[:, None, None])
+        cells = np.where(in_range, (row_0[:, None, None] + d_row) * self.__n_cols + col_0[:, None, None] + d_col, -1)
+        rects = self.__cell_table[cells]
+        found = rects >= 0
+        return np.nonzero(found)[0], rects[found]
@@ -23,6 +23,8 @@ for n in range(n_games):
     while (myGame.players[0].score < max_score) and (myGame.players[1].score < max_score):
 
         myGame.handle_events()
+        if myGame.quit_requested:
+            break
 
         a1 = get_human_player_action(myGame)
         a2 = get_not_so_simple_ai_action(1, myGame)
@@ -30,6 +32,9 @@ for n in range(n_games):
         myGame.update_physics([a1, a2])
         myGame.draw_frame()
 
+    if myGame.quit_requested:
+        break
+
     # Print results
     print('Final score for game', n+1)
     print('Player 1:', myGame.players[0].score)
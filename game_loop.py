@@ -0,0 +1,213 @@
+"""
+Game loop driver with a fixed physics time step, decoupled from the rendering frame-rate.
+
+Example:
+    game = Game()
+    game.add_player([100, 100], teal_color)
+    game.add_player([game.screen_width, game.screen_height], yellowish_color)
+    loop = GameLoop(game, [lambda i, g: get_human_player_action(g), create_not_so_simple_ai_action_generator()])
+    loop.run(max_score=3)
+
+Every action generator is called with the signature `generator(player_index, game_instance)`, once per physics step.
+In real-time mode, the game's input pipeline (if it has one) is sliced along with the physics: each step only sees the
+key presses polled in the span of real time it simulates.
+"""
+import time
+
+
+class GameLoop:
+    """
+    Class for representing the main loop of a game.
+
+    In real-time mode, the loop measures how much real time passed since the last frame, adds it to an accumulator,
+    and runs as many physics steps of `game.delta_t` seconds as fit in it, before drawing a frame. The simulation
+    therefore advances at the same speed regardless of the frame-rate, and frames are drawn in between the last two
+    physics states (interpolated by the time left in the accumulator), so that motion stays smooth even when the
+    frame-rate is not a multiple of the physics rate.
+
+    In unthrottled mode, real time is ignored: every frame runs `steps_per_frame` physics steps, and drawing (if the
+    game has video) is not rate-limited, so the game runs as fast as possible.
+
+    Attributes:
+        - game: The game being run. Game object.
+        - action_generators: Action generator of each player. List of callables.
+        - realtime: Whether the simulation follows real time. Boolean.
+        - max_substeps: Maximum number of physics steps per frame in real-time mode. Number.
+        - max_frame_time: Maximum real time (in seconds) accounted for in a single frame in real-time mode. Number.
+        - steps_per_frame: Number of physics steps per frame in unthrottled mode. Number.
+        - interpolate: Whether frames are drawn in between physics states in real-time mode. Boolean.
+        - n_frames: Number of frames run so far. Number.
+        - n_steps: Number of physics steps run so far. Number.
+    """
+
+    def __init__(self, game, action_generators, realtime=True, max_substeps=8, max_frame_time=0.25,
+                 steps_per_frame=1, interpolate=True):
+        """
+        Initializes a game loop. The physics time step is the game's `delta_t`, and the rendering frame-rate cap is its
+        `max_fps` (in unthrottled mode, the frame-rate is never capped).
+
+        :param game: The game to run.
+        :type game: Game.
+        :param action_generators: Action generator of each player, in the order of the game's players.
+        :type action_generators: List of callables.
+        :param realtime: Whether the simulation follows real time. If False, the loop runs unthrottled. Default value
+            is True.
+        :type realtime: Boolean.
+        :param max_substeps: Maximum number of physics steps per frame in real-time mode. If the computer cannot keep
+            up, the simulation slows down instead of spending ever more time catching up. Default value is 8.
+        :type max_substeps: Number.
+        :param max_frame_time: Maximum real time (in seconds) accounted for in a single frame in real-time mode, so
+            that long pauses (e.g. dragging the window) do not have to be caught up. Default value is 0.25.
+        :type max_frame_time: Number.
+        :param steps_per_frame: Number of physics steps per frame in unthrottled mode. Default value is 1.
+        :type steps_per_frame: Number.
+        :param interpolate: Whether frames are drawn in between physics states in real-time mode. Default value is
+            True.
+        :type interpolate: Boolean.
+        """
+        self.game = game
+        self.action_generators = action_generators
+        self.realtime = realtime
+        self.max_substeps = max_substeps
+        self.max_frame_time = max_frame_time
+        self.steps_per_frame = steps_per_frame
+        self.interpolate = interpolate
+        self.n_frames = 0
+        self.n_steps = 0
+
+        self.__accumulator = 0.0
+        self.__last_time = None
+        self.__previous_state = None
+
+        if not realtime:
+            game.max_fps = 0
+
+    def step(self):
+        """
+        Runs a single physics step, with the actions chosen by every player's action generator. If the game's metrics
+        are enabled, the time taken by the generators is recorded as the 'ai' phase.
+        """
+        metrics = self.game.metrics
+        start = time.perf_counter() if metrics.enabled else None
+        actions = [generator(i, self.game) for i, generator in enumerate(self.action_generators)]
+        if start is not None:
+            metrics.add_time('ai', time.perf_counter() - start)
+        self.game.update_physics(actions)
+        self.n_steps += 1
+
+    def run_frame(self):
+        """
+        Runs one frame of the loop: handles events, runs the physics steps that are due, and draws the game.
+
+        :return: Number of physics steps that were run.
+        :rtype: Number.
+        """
+        self.game.handle_events()
+
+        n_substeps = 0
+        if self.realtime:
+            now = time.perf_counter()
+            if self.__last_time is not None:
+                self.__accumulator += min(now - self.__last_time, self.max_frame_time)
+            self.__last_time = now
+
+            # The simulation lags real time by the time left in the accumulator, so each step simulates the span of
+            # real time that ends `accumulator - delta_t` seconds before now
+            delta_t = self.game.delta_t
+            pipeline = self.game.input
+            while self.__accumulator >= delta_t and n_substeps < self.max_substeps:
+                if self.interpolate:
+                    self.__previous_state = self.__save_state()
+                if pipeline is not None:
+                    pipeline.step_end_time = now - (self.__accumulator - delta_t)
+                self.step()
+                self.__accumulator -= delta_t
+                n_substeps += 1
+            if pipeline is not None:
+                pipeline.step_end_time = None
+
+            # Drop the time that could not be simulated in this frame, instead of carrying it over forever
+            if n_substeps == self.max_substeps:
+                self.__accumulator = min(self.__accumulator, delta_t)
+
+            if self.interpolate and self.__previous_state is not None:
+                self.__draw_interpolated(min(self.__accumulator / delta_t, 1.0))
+            else:
+                self.game.draw_frame()
+        else:
+            for _ in range(self.steps_per_frame):
+                self.step()
+                n_substeps += 1
+            self.game.draw_frame()
+
+        self.n_frames += 1
+        return n_substeps
+
+    def run(self, max_score=None, max_frames=None, is_over=None):
+        """
+        Runs frames until the game is over, or the user closes the window (see Game.quit_requested).
+
+        :param max_score: The game is over when a player reaches this score. Default value is None (no limit).
+        :type max_score: Number.
+        :param max_frames: The game is over after this many frames. Default value is None (no limit).
+        :type max_frames: Number.
+        :param is_over: Callable that receives the game, and returns True when it is over. Default value is None.
+        :type is_over: Callable.
+        """
+        n_frames = 0
+        while True:
+            if self.game.quit_requested:
+                return
+            if max_score is not None and any(player.score >= max_score for player in self.game.players):
+                return
+            if max_frames is not None and n_frames >= max_frames:
+                return
+            if is_over is not None and is_over(self.game):
+                return
+            self.run_frame()
+            n_frames += 1
+
+    def __save_state(self):
+        """
+        Returns the positions that are interpolated when drawing: of every player, crosshair and bullet in flight.
+        """
+        state = []
+        for player in self.game.players:
+            bullet = player.bullet
+            state.append((player.position[0], player.position[1], player.crosshair[0], player.crosshair[1],
+                          bullet.position[0] if bullet.was_shot else None,
+                          bullet.position[1] if bullet.was_shot else None))
+        return state
+
+    def __draw_interpolated(self, alpha):
+        """
+        Draws the game with every position interpolated between the previous and the current physics states.
+
+        The players' positions are overwritten (in place) only for the duration of the drawing, and restored afterwards.
+
+        :param alpha: Weight of the current state (0 draws the previous state, 1 the current one).
+        :type alpha: Number.
+        """
+        def lerp(previous, current):
+            return previous + (current - previous) * alpha
+
+        saved = self.__save_state()
+        try:
+            for player, previous in zip(self.game.players, self.__previous_state):
+                bullet = player.bullet
+                player.position[0] = lerp(previous[0], player.position[0])
+                player.position[1] = lerp(previous[1], player.position[1])
+                player.crosshair[0] = lerp(previous[2], player.crosshair[0])
+                player.crosshair[1] = lerp(previous[3], player.crosshair[1])
+
+                # Bullets that were just shot or reset are drawn where they are now
+                if bullet.was_shot and previous[4] is not None:
+                    bullet.position[0] = lerp(previous[4], bullet.position[0])
+                    bullet.position[1] = lerp(previous[5], bullet.position[1])
+
+            self.game.draw_frame()
+        finally:
+            for player, current in zip(self.game.players, saved):
+                player.position[0], player.position[1], player.crosshair[0], player.crosshair[1] = current[:4]
+                if current[4] is not None:
+                    player.bullet.position[0], player.bullet.position[1] = current[4:6]
@@ -0,0 +1,224 @@
+"""
+Timestamped keyboard and mouse input, sliced into the time steps of the physics.
+
+Example:
+    pipeline = InputPipeline([pygame.K_UP, pygame.K_DOWN, 'mouse_click'])
+    pipeline.poll()                     # As often as possible, e.g. while waiting for the next frame
+    state = pipeline.consume()          # Once per physics step: bit i is set if keys[i] was down during the step
+    pygame.display.flip()
+    pipeline.frame_presented()          # Records the latency of the inputs consumed since the last frame
+
+Pygame does not tell when events happened, so they are timestamped when they are polled: the more often poll() is
+called, the more precise the timestamps. Presses and releases (edges) are kept in a ring buffer until a physics step
+consumes them, so a key that was pressed and released in between two steps still counts as down during the next one.
+"""
+import time
+
+import numpy as np
+
+from metrics import RollingHistogram
+
+
+# Index of the mouse motion edges, in place of a key index
+_MOUSE_MOTION = -1
+
+# Names of the pygame events read by the pipeline, and of the frequent events of devices it does not read (touch
+# screens, joysticks and game controllers), which are blocked while it is open
+_READ_EVENT_NAMES = ('QUIT', 'KEYDOWN', 'KEYUP', 'MOUSEBUTTONDOWN', 'MOUSEBUTTONUP', 'MOUSEMOTION')
+_BLOCKED_EVENT_NAMES = ('FINGERMOTION', 'MULTIGESTURE', 'JOYAXISMOTION', 'JOYBALLMOTION', 'JOYHATMOTION',
+                        'CONTROLLERAXISMOTION', 'CONTROLLERTOUCHPADMOTION', 'CONTROLLERSENSORUPDATE')
+
+
+class InputPipeline:
+    """
+    Class for representing the input of a window: key and mouse button edges with the time they were polled, and the
+    mouse position.
+
+    Polling reads every event of pygame's event queue, and ignores those that the pipeline does not use. The frequent
+    motion events of touch screens, joysticks and game controllers are blocked (see pygame.event.set_blocked()) so
+    that polling does not have to skip them, and the events the pipeline uses (quitting, keys, mouse buttons and
+    motion) are allowed. Since blocking is global to pygame, close() restores the blocked state of these events as it
+    was before the pipeline was created. Other events (e.g. window, focus or text input events) are left as they are.
+
+    Attributes:
+        - keys: Keys tracked. Bit i of the states returned by consume() is set if keys[i] was down. List of pygame key
+            codes, or 'mouse_click' for the left mouse button.
+        - capacity: Maximum number of edges kept before they are consumed. Number.
+        - held: Whether every key is down, as of the last poll. List of booleans.
+        - mouse_position: Position of the mouse at the end of the last time slice consumed. Tuple with two elements.
+        - quit_requested: Whether the user asked to close the window. Boolean.
+        - step_end_time: End of the time slice of the next consume() call (in time.perf_counter() seconds), or None for
+            the current time. Set by the GameLoop before each physics step. Number.
+        - latencies: Time (in seconds) from every press or release to the first frame presented after a physics step
+            consumed it (input-to-photon latency). RollingHistogram object.
+        - n_edges: Number of edges polled so far. Number.
+        - n_dropped: Number of edges overwritten in the ring buffer before they were consumed. Number.
+    """
+
+    def __init__(self, keys, capacity=1024):
+        """
+        Initializes the pipeline, and filters the events of pygame's event queue. The video subsystem must be
+        initialized (see load_pygame()).
+
+        :param keys: Keys tracked (pygame key codes, or 'mouse_click' for the left mouse button).
+        :type keys: List.
+        :param capacity: Maximum number of edges kept before they are consumed. Default value is 1024.
+        :type capacity: Number.
+        """
+        import pygame
+        self.__pygame = pygame
+
+        self.keys = list(keys)
+        self.capacity = capacity
+        self.held = [False] * len(self.keys)
+        self.mouse_position = pygame.mouse.get_pos()
+        self.quit_requested = False
+        self.step_end_time = None
+        self.latencies = RollingHistogram()
+        self.n_edges = 0
+        self.n_dropped = 0
+
+        # Ring buffer of edges: time, index of the key (or _MOUSE_MOTION), whether it was pressed, and mouse position
+        self.__times = np.zeros(capacity)
+        self.__codes = np.zeros(capacity, dtype=np.int16)
+        self.__pressed = np.zeros(capacity, dtype=bool)
+        self.__positions = np.zeros((capacity, 2), dtype=np.int32)
+
+        # Number of edges consumed and presented, and the keys down at the end of the last slice consumed
+        self.__n_consumed = 0
+        self.__n_presented = 0
+        self.__state = 0
+
+        self.__key_indices = {key: i for i, key in enumerate(self.keys)}
+
+        # Allow the events read and block the others, remembering which ones were changed (events missing from older
+        # versions of pygame are skipped)
+        read_events = [getattr(pygame, name) for name in _READ_EVENT_NAMES]
+        blocked_events = [getattr(pygame, name) for name in _BLOCKED_EVENT_NAMES if hasattr(pygame, name)]
+        self.__unblocked = [event_type for event_type in read_events if pygame.event.get_blocked(event_type)]
+        self.__blocked = [event_type for event_type in blocked_events if not pygame.event.get_blocked(event_type)]
+        if self.__unblocked:
+            pygame.event.set_allowed(self.__unblocked)
+        if self.__blocked:
+            pygame.event.set_blocked(self.__blocked)
+        self.__closed = False
+
+    def close(self):
+        """
+        Restores the blocked state of the events changed when the pipeline was created. The pipeline should not be
+        polled afterwards.
+        """
+        if self.__closed:
+            return
+        self.__closed = True
+        pygame = self.__pygame
+        if self.__blocked:
+            pygame.event.set_allowed(self.__blocked)
+        if self.__unblocked:
+            pygame.event.set_blocked(self.__unblocked)
+
+    def poll(self):
+        """
+        Reads the pending events, and timestamps their edges with the current time.
+        """
+        pygame = self.__pygame
+        now = time.perf_counter()
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                self.quit_requested = True
+            elif event.type in (pygame.KEYDOWN, pygame.KEYUP):
+                self.__add_edge(now, self.__key_indices.get(event.key), event.type == pygame.KEYDOWN)
+            elif event.type in (pygame.MOUSEBUTTONDOWN, pygame.MOUSEBUTTONUP) and event.button == 1:
+                self.__add_edge(now, self.__key_indices.get('mouse_click'), event.type == pygame.MOUSEBUTTONDOWN)
+            elif event.type == pygame.MOUSEMOTION:
+                self.__add_edge(now, _MOUSE_MOTION, False, event.pos)
+
+    def poll_until(self, deadline, interval=0.001):
+        """
+        Polls every `interval` seconds until a given time (e.g. while waiting for the next frame).
+
+        :param deadline: Time to return at, in time.perf_counter() seconds.
+        :type deadline: Number.
+        :param interval: Time in between two polls, in seconds. Default value is 0.001.
+        :type interval: Number.
+        """
+        while True:
+            self.poll()
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                return
+            time.sleep(min(interval, remaining))
+
+    def consume(self, end_time=None):
+        """
+        Returns the state of the keys during the time slice from the end of the last slice consumed to `end_time`. A
+        key counts as down during the slice if it was down when the slice started, or was pressed at any time in it.
+        Also updates `mouse_position` to the position at the end of the slice.
+
+        :param end_time: End of the slice, in time.perf_counter() seconds. Default value is `step_end_time`, or the
+            current time if it is None.
+        :type end_time: Number.
+        :return: Bit i is set if keys[i] was down during the slice.
+        :rtype: Number.
+        """
+        if end_time is None:
+            end_time = self.step_end_time if self.step_end_time is not None else time.perf_counter()
+
+        # Skip the edges lost in the ring buffer
+        if self.n_edges - self.__n_consumed > self.capacity:
+            self.n_dropped += self.n_edges - self.capacity - self.__n_consumed
+            self.__n_consumed = self.n_edges - self.capacity
+
+        state = self.__state
+        pressed_in_slice = 0
+        while self.__n_consumed < self.n_edges:
+            slot = self.__n_consumed % self.capacity
+            if self.__times[slot] > end_time:
+                break
+            code = self.__codes[slot]
+            if code == _MOUSE_MOTION:
+                self.mouse_position = tuple(self.__positions[slot].tolist())
+            elif self.__pressed[slot]:
+                state |= 1 << code
+                pressed_in_slice |= 1 << code
+            else:
+                state &= ~(1 << code)
+            self.__n_consumed += 1
+
+        slice_state = self.__state | pressed_in_slice
+        self.__state = state
+        return slice_state
+
+    def frame_presented(self, present_time=None):
+        """
+        Records the latency of every press and release consumed since the last frame presented.
+
+        :param present_time: Time the frame was presented, in time.perf_counter() seconds. Default value is the current
+            time.
+        :type present_time: Number.
+        """
+        if present_time is None:
+            present_time = time.perf_counter()
+        first = max(self.__n_presented, self.n_edges - self.capacity)
+        for i in range(first, self.__n_consumed):
+            slot = i % self.capacity
+            if self.__codes[slot] != _MOUSE_MOTION:
+                self.latencies.add(present_time - self.__times[slot])
+        self.__n_presented = self.__n_consumed
+
+    def __add_edge(self, timestamp, code, pressed, position=(0, 0)):
+        """
+        Adds an edge to the ring buffer. Edges of keys that are not tracked are ignored.
+        """
+        if code is None:
+            return
+        if code != _MOUSE_MOTION:
+            if self.held[code] == pressed:
+                return
+            self.held[code] = pressed
+        slot = self.n_edges % self.capacity
+        self.__times[slot] = timestamp
+        self.__codes[slot] = code
+        self.__pressed[slot] = pressed
+        self.__positions[slot] = position
+        self.n_edges += 1
@@ -0,0 +1,282 @@
+"""
+Lightweight instrumentation of the game: phase timers, counters, rolling latency histograms, and a periodic exporter.
+
+Example:
+    game = Game(metrics=True)
+    game.metrics.exporter = MetricsExporter('metrics.jsonl', interval=1.0)
+    ...
+    print(game.metrics.summary()['phases']['physics']['p99'])
+
+The game records the time of each phase of a tick or frame (see PHASES) and counts events (see COUNTERS), only if its
+metrics are enabled. When they are not, the instrumented code only checks a flag.
+"""
+import csv
+import json
+import time
+
+import numpy as np
+
+
+# Phases timed by the game and the game loop. 'player_update' is the time spent in Player.update() during a call of
+# Game.update_physics(), 'checks' the time of the crosshair, wall and bullet checks (and of the bullet pool), and
+# 'physics' the time of the whole call
+PHASES = ('handle_events', 'ai', 'player_update', 'checks', 'player_collisions', 'physics', 'draw', 'clock_tick')
+
+# Events counted by the game: collisions between players, bullets shot and bullets that hit a player
+COUNTERS = ('collisions', 'shots', 'hits')
+
+# Percentiles included in the summary of every phase
+SUMMARY_PERCENTILES = (50, 90, 99)
+
+
+class RollingHistogram:
+    """
+    Class for representing the distribution of the last values of a measure (e.g. the duration of a phase).
+
+    Values are kept in a preallocated ring buffer, so adding one is cheap and never allocates memory. Statistics are
+    computed over the values in the buffer, when they are asked for.
+
+    Attributes:
+        - window: Maximum number of values kept. Number.
+        - values: Ring buffer of the last values. Array of float64 with `window` elements.
+        - n_values: Number of values added since the histogram was created or cleared. Number.
+    """
+
+    def __init__(self, window=1024):
+        """
+        Initializes an empty histogram.
+
+        :param window: Maximum number of values kept. Default value is 1024.
+        :type window: Number.
+        """
+        self.window = window
+        self.values = np.zeros(window)
+        self.n_values = 0
+
+    def __len__(self):
+        return min(self.n_values, self.window)
+
+    def add(self, value):
+        """
+        Adds a value, replacing the oldest one if the buffer is full.
+
+        :param value: The value.
+        :type value: Number.
+        """
+        self.values[self.n_values % self.window] = value
+        self.n_values += 1
+
+    def clear(self):
+        """
+        Removes all values.
+        """
+        self.n_values = 0
+
+    def get_values(self):
+        """
+        Returns the values in the buffer (not in the order they were added).
+
+        :return: The values.
+        :rtype: Array of float64.
+        """
+        return self.values[:len(self)]
+
+    def histogram(self, bins=10):
+        """
+        Returns the histogram of the values in the buffer.
+
+        :param bins: Number of bins, or their edges (see numpy.histogram()). Default value is 10.
+        :type bins: Number, or array.
+        :return: Number of values in each bin, and the edges of the bins.
+        :rtype: Tuple with two arrays.
+        """
+        return np.histogram(self.get_values(), bins)
+
+    def summary(self):
+        """
+        Returns statistics of the values in the buffer.
+
+        :return: Number of values added in total ('count'), and the mean, maximum and percentiles (e.g. 'p99') of the
+            values in the buffer (None if it is empty).
+        :rtype: Dictionary.
+        """
+        values = self.get_values()
+        summary = {'count': self.n_values}
+        empty = len(values) == 0
+        summary['mean'] = None if empty else float(values.mean())
+        summary['max'] = None if empty else float(values.max())
+        percentiles = [None] * len(SUMMARY_PERCENTILES) if empty else np.percentile(values, SUMMARY_PERCENTILES)
+        for q, value in zip(SUMMARY_PERCENTILES, percentiles):
+            summary['p{}'.format(q)] = None if value is None else float(value)
+        return summary
+
+
+class Metrics:
+    """
+    Class for representing the metrics of a game: durations of phases, counters of events, and ticks.
+
+    Durations are recorded in seconds, one value per call of the phase, into a RollingHistogram per phase. Counters
+    hold totals since the metrics were created or reset. Every call of end_tick() counts a tick, and gives the
+    exporter (if any) a chance to write the metrics.
+
+    Attributes:
+        - enabled: Whether the game records metrics. Boolean.
+        - window: Number of values kept by the histogram of each phase. Number.
+        - phases: Histogram of the durations of each phase, by name. Dictionary of RollingHistogram.
+        - counters: Total of each counter, by name. Dictionary.
+        - n_ticks: Number of ticks ended so far. Number.
+        - exporter: Called with these metrics at the end of every tick, or None. MetricsExporter object.
+    """
+
+    def __init__(self, enabled=True, window=1024, exporter=None):
+        """
+        Initializes empty metrics.
+
+        :param enabled: Whether the game records metrics. Default value is True.
+        :type enabled: Boolean.
+        :param window: Number of values kept by the histogram of each phase. Default value is 1024.
+        :type window: Number.
+        :param exporter: Exporter called at the end of every tick. Default value is None.
+        :type exporter: MetricsExporter.
+        """
+        self.enabled = enabled
+        self.window = window
+        self.exporter = exporter
+        self.phases = {}
+        self.counters = {}
+        self.n_ticks = 0
+        self.reset()
+
+    def reset(self):
+        """
+        Removes all recorded values, and sets all counters to zero.
+        """
+        self.phases = {name: RollingHistogram(self.window) for name in PHASES}
+        self.counters = {name: 0 for name in COUNTERS}
+        self.n_ticks = 0
+
+    def add_time(self, phase, seconds):
+        """
+        Records the duration of a call of a phase.
+
+        :param phase: Name of the phase. Phases not in PHASES are created when first recorded.
+        :type phase: String.
+        :param seconds: Duration, in seconds.
+        :type seconds: Number.
+        """
+        histogram = self.phases.get(phase)
+        if histogram is None:
+            histogram = self.phases[phase] = RollingHistogram(self.window)
+        histogram.add(seconds)
+
+    def count(self, counter, n=1):
+        """
+        Increases a counter.
+
+        :param counter: Name of the counter. Counters not in COUNTERS are created when first increased.
+        :type counter: String.
+        :param n: Amount to add. Default value is 1.
+        :type n: Number.
+        """
+        self.counters[counter] = self.counters.get(counter, 0) + n
+
+    def end_tick(self):
+        """
+        Counts a tick, and calls the exporter.
+        """
+        self.n_ticks += 1
+        if self.exporter is not None:
+            self.exporter(self)
+
+    def summary(self):
+        """
+        Returns the current state of the metrics.
+
+        :return: Number of ticks ('ticks'), totals of the counters ('counters') and a summary of the durations of each
+            phase, in seconds ('phases', see RollingHistogram.summary()).
+        :rtype: Dictionary.
+        """
+        return {'ticks': self.n_ticks, 'counters': dict(self.counters),
+                'phases': {name: histogram.summary() for name, histogram in self.phases.items()}}
+
+
+class MetricsExporter:
+    """
+    Class for writing metrics to a file periodically, as JSON lines or CSV rows.
+
+    Every row holds the wall-clock time, the number of ticks, the totals of the counters, and the summary of every
+    phase. CSV columns are fixed when the first row is written: a column per counter and per statistic of every phase
+    (e.g. 'physics.p99').
+
+    Attributes:
+        - path: Path of the file. String.
+        - format: 'jsonl' or 'csv'. String.
+        - interval: Minimum time (in seconds of wall-clock time) in between two rows. Number.
+    """
+
+    def __init__(self, path, format=None, interval=1.0):
+        """
+        Creates the file (overwriting it, if it exists).
+
+        :param path: Path of the file.
+        :type path: String.
+        :param format: 'jsonl' or 'csv'. Default value is 'csv' if `path` ends with '.csv', 'jsonl' otherwise.
+        :type format: String.
+        :param interval: Minimum time (in seconds) in between two rows. Default value is 1.
+        :type interval: Number.
+        """
+        if format is None:
+            format = 'csv' if path.endswith('.csv') else 'jsonl'
+        if format not in ('jsonl', 'csv'):
+            raise ValueError("Unknown metrics format '{}', expected 'jsonl' or 'csv'".format(format))
+
+        self.path = path
+        self.format = format
+        self.interval = interval
+        self.__file = open(path, 'w', newline='')
+        self.__csv_writer = None
+        self.__last_time = None
+
+    def __call__(self, metrics):
+        """
+        Writes the metrics, if at least `interval` seconds passed since the last row was written.
+
+        :param metrics: The metrics.
+        :type metrics: Metrics.
+        """
+        now = time.time()
+        if self.__last_time is None or now - self.__last_time >= self.interval:
+            self.write(metrics, now)
+
+    def write(self, metrics, timestamp=None):
+        """
+        Writes the metrics now.
+
+        :param metrics: The metrics.
+        :type metrics: Metrics.
+        :param timestamp: Wall-clock time written in the row. Default value is the current time.
+        :type timestamp: Number.
+        """
+        self.__last_time = time.time() if timestamp is None else timestamp
+        summary = metrics.summary()
+        summary['time'] = self.__last_time
+
+        if self.format == 'jsonl':
+            self.__file.write(json.dumps(summary) + '\n')
+        else:
+            row = {'time': summary['time'], 'ticks': summary['ticks']}
+            row.update(summary['counters'])
+            for phase, stats in summary['phases'].items():
+                for key, value in stats.items():
+                    row['{}.{}'.format(phase, key)] = value
+            if self.__csv_writer is None:
+                self.__csv_writer = csv.DictWriter(self.__file, list(row), extrasaction='ignore')
+                self.__csv_writer.writeheader()
+            self.__csv_writer.writerow(row)
+        self.__file.flush()
+
+    def close(self):
+        """
+        Closes the file.
+        """
+        self.__file.close()
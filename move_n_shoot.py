@@ -1,28 +1,263 @@
+import math
 import numpy as np
-import os
-import pygame
 import sys
-pygame.init()
+import time
+from collections import namedtuple
+
+from assets import get_asset_manager
+from bullet_pool import BulletPool
+from camera import Camera
+from collision import SpatialHash
+from collision import StaticGrid
+from collision import sweep_segment_box
+from input_pipeline import InputPipeline
+from metrics import Metrics
+
+# pygame is only imported (and initialized) when a game with video is created, see load_pygame()
+pygame = None
+
+# Names of all possible actions. Encoded actions are integers where bit `i` is set if action ACTION_NAMES[i] is taken
+ACTION_NAMES = ('up', 'down', 'left', 'right', 'shoot', 'ch_up', 'ch_down', 'ch_left', 'ch_right', 'ch_mouse')
+(ACTION_UP, ACTION_DOWN, ACTION_LEFT, ACTION_RIGHT, ACTION_SHOOT,
+ ACTION_CH_UP, ACTION_CH_DOWN, ACTION_CH_LEFT, ACTION_CH_RIGHT, ACTION_CH_MOUSE) = (1 << i for i in range(10))
+
+# Actions flipped at random by the AI players (see flip_random_actions()). They choose the crosshair actions themselves
+AI_FLIPPED_ACTIONS = ACTION_UP | ACTION_DOWN | ACTION_LEFT | ACTION_RIGHT | ACTION_SHOOT
+
+# Value of each bit, used to encode and decode arrays of actions
+_ACTION_BITS = 1 << np.arange(len(ACTION_NAMES), dtype=np.int64)
+
+# Minimum number of players for which Game.update_physics() uses a broadphase index to find collisions. With fewer
+# players, testing every pair directly is cheaper than maintaining the index
+BROADPHASE_MIN_PLAYERS = 12
+
+# Color of the obstacles, and side length of the cells of the grid that indexes them (see StaticGrid)
+OBSTACLE_COLOR = (96, 96, 96)
+OBSTACLE_CELL_SIZE = 100
+
+# A bullet hit, found by Game.update_physics(): indices of the shooter and of the player hit, and the time of impact
+# (in seconds since the start of the time step)
+BulletHit = namedtuple('BulletHit', ['shooter', 'target', 'time'])
+
+# Outcome of Game.step(): number of time steps run, change of every player's score, the bullet hits (with their time
+# since the start of the call), and whether it stopped because of a hit or the score limit
+StepResult = namedtuple('StepResult', ['ticks', 'score_deltas', 'hits', 'stopped'])
+
+# Number of values used by Game.snapshot() to save the state of numpy's global random number generator (Mersenne
+# Twister key, position in the key, and the cached Gaussian value)
+SNAPSHOT_RNG_SIZE = 627
+
+# Fields of each player's row in the arrays returned by Game.observe() (and in Game.snapshot()), in order
+OBSERVATION_FIELDS = ('position_x', 'position_y', 'velocity_x', 'velocity_y', 'acceleration_x', 'acceleration_y',
+                      'crosshair_x', 'crosshair_y', 'bullet_position_x', 'bullet_position_y', 'bullet_velocity_x',
+                      'bullet_velocity_y', 'bullet_was_shot', 'score')
+
+
+def load_pygame(display=True):
+    """
+    Imports pygame and initializes the subsystems used to draw the game (fonts and, if `display` is True, video), if
+    that was not done yet.
+
+    Headless games never call this function, so they can run without pygame being imported or even installed.
+
+    :param display: Whether to initialize the video subsystem, which is needed to open a window and read input events,
+        but not to draw to offscreen surfaces. Default value is True.
+    :type display: Boolean.
+    :return: The pygame module.
+    :rtype: Module.
+    """
+    global pygame
+    if pygame is None:
+        import pygame as pygame_module
+        pygame_module.font.init()
+        pygame = pygame_module
+    if display and not pygame.display.get_init():
+        pygame.display.init()
+    return pygame
+
+
+def get_channel_bytes(surface):
+    """
+    Returns where the color channels of a surface's pixels are, in its memory.
+
+    :param surface: The surface.
+    :type surface: Surface.
+    :return: Index of the byte holding the red, green and blue channels, within the bytes of a pixel.
+    :rtype: List with three numbers.
+    """
+    bytes_per_pixel = surface.get_bytesize()
+    channel_bytes = [shift // 8 for shift in surface.get_shifts()[:3]]
+    if sys.byteorder == 'big':
+        channel_bytes = [bytes_per_pixel - 1 - byte for byte in channel_bytes]
+    return channel_bytes
+
+
+def encode_actions(actions):
+    """
+    Encodes the actions of a player as an integer, where bit `i` is set if action ACTION_NAMES[i] is taken.
+
+    :param actions: The actions to encode. Either a dictionary like the ones returned by the action generators (missing
+        keys count as False), a sequence with one truth value per action in the order of ACTION_NAMES, or an integer
+        (which is returned as is).
+    :type actions: Dictionary, sequence or integer.
+    :return: The encoded actions.
+    :rtype: Integer.
+    """
+    if isinstance(actions, (int, np.integer)):
+        return int(actions)
+
+    code = 0
+    if isinstance(actions, dict):
+        for bit, name in enumerate(ACTION_NAMES):
+            if actions.get(name):
+                code |= 1 << bit
+    else:
+        for bit, value in enumerate(actions):
+            if value:
+                code |= 1 << bit
+    return code
+
+
+def decode_actions(code):
+    """
+    Decodes actions encoded by encode_actions() back into a dictionary of actions.
+
+    :param code: The encoded actions.
+    :type code: Integer.
+    :return: Dictionary with one key per action in ACTION_NAMES, and values True or False.
+    :rtype: Dictionary.
+    """
+    actions = {}
+    for bit, name in enumerate(ACTION_NAMES):
+        actions[name] = bool(code & (1 << bit))
+    return actions
+
+
+def encode_action_array(actions):
+    """
+    Encodes an array of actions, whose last axis has one truth value per action in the order of ACTION_NAMES.
+
+    :param actions: The actions to encode, e.g. with shape (n_players, n_actions).
+    :type actions: Array.
+    :return: The encoded actions, with the last axis removed.
+    :rtype: Integer array.
+    """
+    return (np.asarray(actions, dtype=bool) * _ACTION_BITS).sum(axis=-1)
+
+
+def decode_action_array(codes):
+    """
+    Decodes an array of encoded actions into an array of actions with one extra (last) axis, holding one value (0 or
+    1) per action in the order of ACTION_NAMES.
+
+    :param codes: The encoded actions, e.g. with shape (n_players,).
+    :type codes: Integer array.
+    :return: The decoded actions.
+    :rtype: Array of uint8.
+    """
+    return ((np.asarray(codes, dtype=np.int64)[..., None] & _ACTION_BITS) != 0).astype(np.uint8)
+
+
+def round_coordinate(x):
+    """
+    Rounds a coordinate to the nearest integer, with halves rounded away from zero. This is the rounding pygame applies
+    when the position of a Rect is set from floats.
+
+    :param x: The coordinate to round. Must be smaller than 2**52 in absolute value (Rect coordinates are much more
+        limited than that anyway).
+    :type x: Number.
+    :return: The rounded coordinate.
+    :rtype: Integer.
+    """
+    # For 0.5 <= |x| < 2**52, adding 0.5 is either exact or rounds within the same integer interval, so truncating the
+    # sum gives the correctly rounded result
+    if x >= 0.5:
+        return int(x + 0.5)
+    if x <= -0.5:
+        return -int(0.5 - x)
+    return 0
+
+
+class HeadlessRect:
+    """
+    Plain arithmetic stand-in for pygame's Rect, used by games without video. Only the attributes and methods needed by
+    the game's physics are implemented, and they behave exactly like their Rect counterparts. Unlike a Rect, a
+    HeadlessRect is not meant to be modified after it is created.
+
+    Attributes:
+        - left: x coordinate of the left side. Integer.
+        - top: y coordinate of the top side. Integer.
+        - right: x coordinate of the right side. Integer.
+        - bottom: y coordinate of the bottom side. Integer.
+        - width: Width of the rectangle. Integer.
+        - height: Height of the rectangle. Integer.
+    """
+    __slots__ = ('left', 'top', 'right', 'bottom', 'width', 'height')
+
+    def __init__(self, left, top, width, height):
+        self.left = left
+        self.top = top
+        self.right = left + width
+        self.bottom = top + height
+        self.width = width
+        self.height = height
+
+    @classmethod
+    def centered_at(cls, center, width, height):
+        """
+        Creates a rectangle with the given size, whose center is at (the rounded) `center`.
+
+        :param center: Position of the center of the rectangle.
+        :type center: Array with two elements.
+        :param width: Width of the rectangle.
+        :type width: Integer.
+        :param height: Height of the rectangle.
+        :type height: Integer.
+        :return: The new rectangle.
+        :rtype: HeadlessRect.
+        """
+        return cls(round_coordinate(center[0]) - width // 2, round_coordinate(center[1]) - height // 2, width, height)
+
+    @property
+    def center(self):
+        return self.left + self.width // 2, self.top + self.height // 2
+
+    def colliderect(self, other):
+        """
+        Tests whether this rectangle overlaps another one. Rectangles that only share an edge do not overlap.
+
+        :param other: The other rectangle.
+        :type other: HeadlessRect or Rect.
+        :return: Whether the two rectangles overlap.
+        :rtype: Boolean.
+        """
+        return self.left < other.right and self.top < other.bottom and other.left < self.right and \
+            other.top < self.bottom
 
 
 class Bullet:
+    __slots__ = ('position', 'velocity', 'size', 'img', 'was_shot')
 
-    def __init__(self, color=None):
+    def __init__(self, color=None, video_mode=True):
         if color is None:
             color = [255, 255, 255]
 
         self.position = [-100, -100]
         self.velocity = [0, 0]
+        self.size = 20
 
-        # Load the image and resize it
-        self.img = pygame.Surface((20, 20))
-        self.img.fill(color)
+        # Create the bullet's image (only needed to draw it)
+        if video_mode:
+            load_pygame(display=False)
+            self.img = get_asset_manager().get_square(color, self.size)
+        else:
+            self.img = None
 
         self.was_shot = False
 
     def reset_bullet(self):
-        self.position = [-100, -100]
-        self.velocity = [0, 0]
+        self.position[0] = self.position[1] = -100
+        self.velocity[0] = self.velocity[1] = 0
         self.was_shot = False
 
     def update(self, delta_t):
@@ -30,11 +265,16 @@ class Bullet:
             self.position[0] += self.velocity[0] * delta_t
             self.position[1] += self.velocity[1] * delta_t
 
-    def draw(self, scr):
+    def draw(self, scr, offset=(0, 0)):
         r = self.get_rect()
-        scr.blit(self.img, r)
+        r.move_ip(-offset[0], -offset[1])
+        if not r.colliderect(scr.get_rect()):
+            return None
+        return scr.blit(self.img, r)
 
     def get_rect(self):
+        if self.img is None:
+            return HeadlessRect.centered_at(self.position, self.size, self.size)
         r = self.img.get_rect()
         r.center = self.position
         return r
@@ -44,21 +284,37 @@ class Player:
     """
     Class for representing players in the game.
 
-    Before creating an instance of this class, the video mode has to be set (e.g. by creating a Game instance).
+    Players with video_mode=True create pygame surfaces to draw themselves. If the video mode has been set (e.g. by
+    creating a Game instance with a window), their images are converted to the screen's pixel format. Players without
+    video do not use pygame at all.
+
+    Players (and their bullets) have fixed attributes (__slots__), and update() changes the two-element lists of their
+    position, velocity, acceleration and crosshair in place, so that a time step allocates no new lists. So do
+    Game.reset_game() and Game.restore(): references to these lists therefore follow the player.
 
     Attributes:
         - MAX_SPEED: Maximum speed for the player. Constant number.
         - SHOOTING_SPEED: Speed of the player's bullets when shot. Constant number.
-        - img: Image of the player, used to draw it. Surface.
+        - video_mode: Whether or not this player is in a game with graphical display. Boolean.
+        - size: Length of the side of the player's square. Number.
+        - img: Image of the player, used to draw it. Shared with every player of the same color and size (see
+            AssetManager), so it must not be drawn on. Surface, or None if video_mode is False.
         - position: Position of the player. Array with two elements.
         - velocity: Velocity of the player. Array with two elements.
         - acceleration: Acceleration of the player. Array with two elements.
         - crosshair: Position of the player's crosshair. Array with two elements.
-        - crosshair_img: Image of the player's crosshair. Surface.
+        - crosshair_img: Image of the player's crosshair. Shared like `img`. Surface, or None if video_mode is False.
         - bullet: The bullet of the player. Bullet object.
         - score: The player's score. Number.
+        - team: The player's team. Bullets do not hit players of the same team. None means the player has no team.
     """
-    def __init__(self, position=None, sz=100, player_color=None, video_mode=True):
+    __slots__ = ('video_mode', 'size', 'img', 'position', 'velocity', 'acceleration', 'crosshair', 'crosshair_img',
+                 'bullet', 'score', 'team')
+
+    MAX_SPEED = 1500
+    SHOOTING_SPEED = 3000
+
+    def __init__(self, position=None, sz=100, player_color=None, video_mode=True, team=None):
         """
         Initialize a player instance.
 
@@ -70,11 +326,10 @@ class Player:
         :type player_color: Array with three values.
         :param video_mode: Whether or not this player is in a game with graphical display. Default value is True.
         :type video_mode: Boolean.
+        :param team: The player's team. Default value is None (no team, i.e. every other player is an opponent).
+        :type team: Hashable.
         """
 
-        self.MAX_SPEED = 1500
-        self.SHOOTING_SPEED = 3000
-
         # Default value for position
         if position is None:
             position = [0, 0]
@@ -83,45 +338,50 @@ class Player:
         if player_color is None:
             player_color = [255, 255, 255]
 
-        # Velocity and acceleration initializations
-        self.position = position
+        # Velocity and acceleration initializations (the player keeps its own copy of the position)
+        self.position = [position[0], position[1]]
         self.velocity = [0, 0]
         self.acceleration = [0, 0]
 
-        # Create player image
-        self.img = pygame.Surface((sz, sz))
-        self.img.fill(player_color)
+        self.video_mode = video_mode
+        self.size = sz
 
         # Crosshair initialization
         self.crosshair = [200, 200]
-        cur_dir = os.path.dirname(__file__)
-        relative_filename = 'crosshair.bmp'
-        filename = os.path.join(cur_dir, relative_filename)
+
+        # Create player and crosshair images (only needed to draw them)
         if video_mode:
-            temp = pygame.image.load(filename).convert()
+            load_pygame(display=False)
+            assets = get_asset_manager()
+            self.img = assets.get_square(player_color, sz)
+            self.crosshair_img = assets.get_crosshair(player_color)
         else:
-            temp = pygame.image.load(filename)
-        self.crosshair_img = pygame.transform.scale(temp, (70, 70))
-        self.crosshair_img.set_colorkey((0, 0, 0))
-
-        # Color the crosshair image
-        arr = pygame.surfarray.pixels3d(self.crosshair_img)
-        arr_r = arr[:, :, 0]
-        arr_g = arr[:, :, 1]
-        arr_b = arr[:, :, 2]
-        arr_r[arr_r == 255] = player_color[0]
-        arr_g[arr_g == 255] = player_color[1]
-        arr_b[arr_b == 255] = player_color[2]
+            self.img = None
+            self.crosshair_img = None
 
         # Bullet position initialization
-        self.bullet = Bullet(player_color)
+        self.bullet = Bullet(player_color, video_mode)
 
         # Points initialization
         self.score = 0
 
+        self.team = team
+
+    def is_opponent(self, other):
+        """
+        Returns whether another player is an opponent of this one, i.e. whether this player's bullets can hit it.
+
+        :param other: The other player.
+        :type other: Player.
+        :return: True if `other` is a different player, and the two players are not in the same team.
+        :rtype: Boolean.
+        """
+        return other is not self and (self.team is None or self.team != other.team)
+
     def get_rect(self):
         """
-        Return a newly-created Rect object, with it's `center` attribute at the same position as the player.
+        Return a newly-created Rect object (HeadlessRect, if video_mode is False), with it's `center` attribute at the
+        same position as the player.
 
         Note: Changing this returned Rect has no effect on the Player instance.
 
@@ -129,15 +389,18 @@ class Player:
         :rtype: Rect.
         """
 
+        if self.img is None:
+            return HeadlessRect.centered_at(self.position, self.size, self.size)
         r = self.img.get_rect()
         r.center = (self.position[0], self.position[1])
         return r
 
-    def update(self, actions, delta_t):
+    def update(self, actions, delta_t, mouse_position=None):
         """
         Update the state of the player, depending on which actions were taken in this time step.
 
-        The `actions` parameter is a dictionary containing the following keys:
+        The `actions` parameter is either encoded as an integer (see encode_actions()), or is a dictionary containing
+        the following keys:
             - 'up': Accelerates the player upwards (True or False).
             - 'down': Accelerates the player downwards (True or False).
             - 'left': Accelerates the player to the left (True or False).
@@ -149,16 +412,21 @@ class Player:
             - 'ch_mouse': Aligns the player's crosshair with the mouse (True or False).
             - 'shoot': Tries shooting the player's bullet (True or False).
         A key with value False means that the corresponding action will not be executed. If 'ch_mouse' is not False,
-        all the other 'ch_*' actions are ignored.
+        all the other 'ch_*' actions are ignored. Without a window (without video, or offscreen) there is no mouse, so
+        'ch_mouse' leaves the crosshair where it is, unless `mouse_position` is given.
 
         Player's move according to a simple discretized CA model. The action taken at time step 'i' influences directly
         the acceleration at time step 'i+1'.
 
-        :param actions: Dictionary of actions that the player chose to take in this time step
-        :type actions: Dictionary with keys of the type string
+        :param actions: Actions that the player chose to take in this time step
+        :type actions: Integer, dictionary with keys of the type string, or sequence (see encode_actions())
         :param delta_t: How much time passed since the last update
         :type delta_t: float
+        :param mouse_position: Position of the mouse during this time step, used by 'ch_mouse'. Default value is the
+            current position of the mouse, if the video mode has been set.
+        :type mouse_position: Tuple with two elements.
         """
+        code = encode_actions(actions)
 
         alpha = 20000
         k = 3000
@@ -172,17 +440,17 @@ class Player:
         self.velocity[1] += self.acceleration[1] * delta_t
 
         # Update acceleration
-        thrust = [actions['right'] - actions['left'],
-                  actions['down'] - actions['up']]
-        thrust_mag = (thrust[0] ** 2 + thrust[1] ** 2) ** 0.5
+        thrust_x = bool(code & ACTION_RIGHT) - bool(code & ACTION_LEFT)
+        thrust_y = bool(code & ACTION_DOWN) - bool(code & ACTION_UP)
+        thrust_mag = math.sqrt(thrust_x * thrust_x + thrust_y * thrust_y)
         if thrust_mag > 0:
-            self.acceleration[0] = alpha * thrust[0] / thrust_mag
-            self.acceleration[1] = alpha * thrust[1] / thrust_mag
+            self.acceleration[0] = alpha * thrust_x / thrust_mag
+            self.acceleration[1] = alpha * thrust_y / thrust_mag
         else:
-            self.acceleration = [0, 0]
+            self.acceleration[0] = self.acceleration[1] = 0
 
         # Limit maximum speed
-        speed = (self.velocity[0] ** 2 + self.velocity[1] ** 2) ** 0.5
+        speed = math.sqrt(self.velocity[0] * self.velocity[0] + self.velocity[1] * self.velocity[1])
         if speed > self.MAX_SPEED:
             limiting_factor = self.MAX_SPEED/speed
             self.velocity[0] *= limiting_factor
@@ -190,7 +458,7 @@ class Player:
 
         # Threshold the velocities to zero (this makes the player stop eventually, if no acceleration is given)
         if speed < 30:
-            self.velocity = [0, 0]
+            self.velocity[0] = self.velocity[1] = 0
 
         # Add friction-like component
         if speed > 0.1:
@@ -198,49 +466,70 @@ class Player:
             self.acceleration[1] -= self.velocity[1] / speed * k
 
         # Update crosshair position
-        if actions['ch_mouse']:
-            self.crosshair = pygame.mouse.get_pos()
+        if code & ACTION_CH_MOUSE:
+            if mouse_position is not None:
+                self.crosshair[0], self.crosshair[1] = mouse_position
+            elif self.video_mode and pygame.display.get_surface() is not None:
+                self.crosshair[0], self.crosshair[1] = pygame.mouse.get_pos()
         else:
             beta = 30
-            self.crosshair[0] += beta * (actions['ch_right'] - actions['ch_left'])
-            self.crosshair[1] += beta * (actions['ch_down'] - actions['ch_up'])
+            self.crosshair[0] += beta * (bool(code & ACTION_CH_RIGHT) - bool(code & ACTION_CH_LEFT))
+            self.crosshair[1] += beta * (bool(code & ACTION_CH_DOWN) - bool(code & ACTION_CH_UP))
 
         # Shoot, if player chose this action
-        if actions['shoot'] and not self.bullet.was_shot:
+        if code & ACTION_SHOOT and not self.bullet.was_shot:
 
             # Compute bullet's velocity direction
-            bullet_vel = [self.crosshair[0]-self.position[0], self.crosshair[1]-self.position[1]]
+            bullet_vel = self.bullet.velocity
+            bullet_vel[0] = self.crosshair[0] - self.position[0]
+            bullet_vel[1] = self.crosshair[1] - self.position[1]
 
             # Adjust bullet's velocity magnitude
-            bullet_speed = (bullet_vel[0] ** 2 + bullet_vel[1] ** 2) ** 0.5
+            bullet_speed = math.sqrt(bullet_vel[0] * bullet_vel[0] + bullet_vel[1] * bullet_vel[1])
             bullet_vel[0] *= self.SHOOTING_SPEED / bullet_speed
             bullet_vel[1] *= self.SHOOTING_SPEED / bullet_speed
 
             # Set the bullet's attributes
-            self.bullet.position = self.position[:]
-            self.bullet.velocity = bullet_vel
+            self.bullet.position[0] = self.position[0]
+            self.bullet.position[1] = self.position[1]
             self.bullet.was_shot = True
 
         self.bullet.update(delta_t)
 
-    def draw(self, scr):
+    def draw(self, scr, offset=(0, 0)):
         """
-        Draw the player, its crosshair, and its bullet in the Surface object provided as argument.
+        Draw the player, its crosshair, and its bullet in the Surface object provided as argument. Parts that fall
+        outside of `scr` are skipped.
 
         :param scr: Where the player and it's crosshair will be drawn.
         :type scr: Surface.
+        :param offset: World coordinates of the top left corner of `scr` (see Camera). Default value is (0, 0).
+        :type offset: Tuple with two integers.
+        :return: The areas of `scr` that were drawn on (the player's, the crosshair's and the bullet's, if visible).
+        :rtype: List of Rect.
         """
+        view = scr.get_rect()
+        drawn_rects = []
 
         # Draw the player
-        scr.blit(self.img, self.get_rect())
+        r_player = self.get_rect()
+        r_player.move_ip(-offset[0], -offset[1])
+        if r_player.colliderect(view):
+            drawn_rects.append(scr.blit(self.img, r_player))
 
         # Draw its crosshair
         r_crosshair = self.crosshair_img.get_rect()
         r_crosshair.center = self.crosshair
-        scr.blit(self.crosshair_img, r_crosshair)
+        r_crosshair.move_ip(-offset[0], -offset[1])
+        if r_crosshair.colliderect(view):
+            drawn_rects.append(scr.blit(self.crosshair_img, r_crosshair))
 
         # Draw its bullet
-        self.bullet.draw(scr)
+        r_bullet = self.bullet.draw(scr, offset)
+        if r_bullet is not None:
+            drawn_rects.append(r_bullet)
+
+        return drawn_rects
 
 
 class Game:
@@ -250,105 +539,302 @@ class Game:
     Attributes:
         - screen_width: Width of the screen used to draw the game. Number.
         - screen_height: Width of the screen used to draw the game. Number.
+        - world_width: Width of the world (the arena the players move in). Number.
+        - world_height: Height of the world. Number.
+        - obstacles: The static obstacles of the world, indexed in a grid. StaticGrid object, or None if there are no
+            obstacles.
+        - camera: Part of the world drawn on the screen, which may follow a player (see `camera.target`). Camera
+            object.
+        - offscreen: Whether the game is drawn to a surface in memory instead of a window. Boolean.
+        - incremental_render: Whether draw_frame() only redraws the areas of the screen that changed. Boolean.
+        - delta_t: Default duration of a physics time step, in seconds. Number.
+        - max_fps: Maximum frame-rate of draw_frame(). 0 or None for no limit. Number.
         - screen: The screen of the game, where it will be drawn. Surface object.
         - clock: Clock to hold the game's time information. Clock object.
         - key_pressed: Dictionary with one key for each recognized keyboard key the user can press. The values are
             either True or False, depending on whether that key was being pressed or not when the handle_events()
-            method was last called.
+            method was last called. Empty if video_mode is False.
+        - input: Timestamped key presses and mouse motion of the window, sliced into physics time steps by
+            get_human_player_action(). It filters pygame's event queue until it is closed (see InputPipeline.close()).
+            InputPipeline object, or None if video_mode is False or the game is offscreen.
+        - quit_requested: Whether the user asked to close the window (found by handle_events()). Boolean.
+        - max_players: Maximum number of players in the game, or None for no limit. Number.
         - players: Holds all the players present in the game. Array of Player objects.
+        - swept_bullets: Whether bullet hits are found along the whole path of the bullets during each time step, instead
+            of only at their final positions. Boolean.
+        - hits: Bullet hits found by the last call of update_physics(), in the order they were found. List of BulletHit.
+        - fire_interval: Minimum time (in seconds) between two shots of a player, or None if each player has a single
+            bullet (the classic mode). Number.
+        - bullet_lifetime: Time (in seconds) after which bullets disappear, or None if they only disappear when they
+            hit a player or leave the world. Number.
+        - bullets: The bullets in flight, if `fire_interval` is not None. BulletPool object, or None.
+        - metrics: Durations of the phases of the game, and counters of collisions, shots and hits. Only recorded if
+            `metrics.enabled` is True. Metrics object.
+        - capture: Recorder of every frame drawn by draw_frame(), which encodes and writes them in a thread of its own
+            (see capture.FrameCapture). None for no recording. FrameCapture object.
     """
 
-    def __init__(self, screen_sz=None, video_mode=True):
+    def __init__(self, screen_sz=None, video_mode=True, offscreen=False, incremental_render=True, delta_t=None,
+                 max_fps=60, max_players=2, swept_bullets=False, fire_interval=None, bullet_lifetime=None,
+                 max_bullets=256, metrics=False, world_sz=None, obstacles=None):
         """
         Initializes a game instance.
 
         :param screen_sz: Tuple that represents the width and height of the screen that will be created. Default value
             is (1600,800).
         :type screen_sz: Tuple with two elements.
-        :param video_mode: Whether or not to run the game's graphical display. Default value is True.
+        :param video_mode: Whether or not to run the game's graphical display. Default value is True. If False, pygame
+            is not imported.
         :type video_mode: Boolean.
+        :param offscreen: If True (and video_mode is True), the game is drawn to a surface in memory instead of a
+            window, so no display is needed, and drawing is not rate-limited. Use render_array() to read the frames.
+            Default value is False.
+        :type offscreen: Boolean.
+        :param incremental_render: If True, draw_frame() only redraws and updates the areas of the screen that changed
+            since the last frame, instead of the whole screen. Default value is True.
+        :type incremental_render: Boolean.
+        :param delta_t: Default duration of a physics time step (see update_physics()), in seconds. Default value is
+            1/120.
+        :type delta_t: Number.
+        :param max_fps: Maximum frame-rate of draw_frame(), in frames per second. 0 or None for no limit. Ignored if the
+            game is offscreen. Default value is 60.
+        :type max_fps: Number.
+        :param max_players: Maximum number of players in the game, or None for no limit. Default value is 2.
+        :type max_players: Number.
+        :param swept_bullets: If True, bullet hits are found along the whole path travelled by the bullets in each time
+            step (see update_physics()), so that fast bullets cannot go through players with large time steps. Default
+            value is False.
+        :type swept_bullets: Boolean.
+        :param fire_interval: If not None, players can have many bullets in flight, and shoot one every
+            `fire_interval` seconds while the 'shoot' action is taken (0 shoots on every time step). The bullets are
+            kept in a BulletPool, instead of in the players. Default value is None (each player has a single bullet,
+            and can only shoot again when it disappears).
+        :type fire_interval: Number.
+        :param bullet_lifetime: Time (in seconds) after which the bullets of the pool disappear. Default value is None
+            (no limit).
+        :type bullet_lifetime: Number.
+        :param max_bullets: Maximum number of bullets in flight in the pool, for all players together. Players cannot
+            shoot while the pool is full. Default value is 256.
+        :type max_bullets: Number.
+        :param metrics: Whether to record metrics (see the `metrics` attribute). They can also be enabled later, by
+            setting `metrics.enabled`. Default value is False.
+        :type metrics: Boolean.
+        :param world_sz: Width and height of the world. Players, crosshairs and bullets are kept in the world instead
+            of the screen, and the screen shows the part of it seen by the `camera`. Default value is `screen_sz`.
+        :type world_sz: Tuple with two elements.
+        :param obstacles: Static rectangular obstacles, as the left, top, width and height of each one. Players bounce
+            off them like off the walls, bullets are stopped by them, and the built-in AIs hold fire when one hides
+            their target (see has_line_of_sight()). The grid of another game (its `obstacles` attribute) can also be
+            given, to share it. Default value is None (no obstacles).
+        :type obstacles: Sequence of sequences with four integers, or StaticGrid.
         """
         if screen_sz is None:
             screen_sz = (1600, 800)
+        if delta_t is None:
+            slowdown_factor = 2
+            delta_t = 1/(60*slowdown_factor)
+
+        self.delta_t = delta_t
+        self.max_fps = max_fps
 
         self.screen_width = screen_sz[0]
         self.screen_height = screen_sz[1]
 
+        # World, and its obstacles. They are grown by half the size of a player in the grid, so that the cell of a
+        # player's or bullet's center holds every obstacle it may overlap
+        if world_sz is None:
+            world_sz = screen_sz
+        self.world_width = world_sz[0]
+        self.world_height = world_sz[1]
+        if isinstance(obstacles, StaticGrid) or obstacles is None:
+            self.obstacles = obstacles
+        else:
+            self.obstacles = StaticGrid(obstacles, OBSTACLE_CELL_SIZE, padding=50) if len(obstacles) > 0 else None
+        self.camera = Camera(screen_sz, world_sz)
+
         self.video_mode = video_mode
+        self.offscreen = video_mode and offscreen
+        self.key_pressed = {}
+        self.input = None
+        self.quit_requested = False
         if video_mode:
+            load_pygame(display=not self.offscreen)
 
             # Initialize the screen used to display the game's graphics
-            self.screen = pygame.display.set_mode(screen_sz)
+            if self.offscreen:
+                self.screen = pygame.Surface(screen_sz)
+            else:
+                self.screen = pygame.display.set_mode(screen_sz)
+
+            # Surfaces used by render_array() to resize and convert frames, by frame size
+            self.__scaled_surfaces = {}
+            self.__grayscale_surfaces = {}
 
-            # Initialize the clock used to limit frame-rate
+            # Areas drawn in the last frame (None until the first full frame is drawn), the camera offset they were
+            # drawn with, and the rendered score texts with the score they show, by player
+            self.incremental_render = incremental_render
+            self.__drawn_rects = None
+            self.__drawn_offset = (0, 0)
+            self.__score_surfaces = {}
+
+            # Initialize the clock used to limit frame-rate, and the time of the last frame (when waiting for the next
+            # frame is done by the input pipeline)
             self.clock = pygame.time.Clock()
+            self.__last_frame_time = 0.0
 
             # Initialize font used in the game
-            pygame.font.init()
             self.my_font = pygame.font.SysFont('Monospace', 40)
 
-        # Initialize dictionary for key presses and mouse clicks
-        self.key_pressed = {}
-        for key in [pygame.K_LEFT, pygame.K_RIGHT, pygame.K_DOWN, pygame.K_UP,
-                    pygame.K_w, pygame.K_a, pygame.K_s, pygame.K_d, pygame.K_SPACE, 'mouse_click']:
-            self.key_pressed[key] = False
+            # Initialize dictionary for key presses and mouse clicks, and the pipeline that reads them from the window
+            for key in [pygame.K_LEFT, pygame.K_RIGHT, pygame.K_DOWN, pygame.K_UP,
+                        pygame.K_w, pygame.K_a, pygame.K_s, pygame.K_d, pygame.K_SPACE, 'mouse_click']:
+                self.key_pressed[key] = False
+            if not self.offscreen:
+                self.input = InputPipeline(self.key_pressed)
 
-        # Initialize player's array
+        # Initialize player's array, and the index used to find collisions between many players
+        self.max_players = max_players
         self.players = []
+        self.__broadphase = SpatialHash(cell_size=100)
+
+        self.swept_bullets = swept_bullets
+        self.hits = []
+
+        # Bullet pool, and the time left before each player can shoot again
+        self.fire_interval = fire_interval
+        self.bullet_lifetime = bullet_lifetime
+        self.bullets = BulletPool(max_bullets) if fire_interval is not None else None
+        self.__fire_cooldowns = []
+
+        # Centers, sizes and teams of the players, as given to the bullet pool on every time step (see
+        # __get_pool_targets())
+        self.__pool_centers = np.zeros((0, 2))
+        self.__pool_sizes = np.zeros(0, dtype=np.int64)
+        self.__pool_opponents = np.zeros((0, 0), dtype=bool)
+        self.__pool_teams = []
 
-    def add_player(self, position=None, player_color=None):
+        self.metrics = Metrics(enabled=metrics)
+        self.capture = None
+
+        # Initialize the buffers returned by observe()
+        self.__allocate_observation_buffers()
+
+    def add_player(self, position=None, player_color=None, team=None):
         """
-        Adds a new player to the game. Maximum 2 players in the game.
+        Adds a new player to the game, unless the game already has `max_players` players.
 
         :param position: Initial position for the player being added to the game. Default value is [0,0].
         :type position: Array with two elements.
         :param player_color: RGB color of the player being added. Default value is [255, 255, 255]
         :type player_color: Array with three elements.
+        :param team: Team of the player being added. Default value is None (no team, free-for-all).
+        :type team: Hashable.
+        :return: The new player, or None if the game was full.
+        :rtype: Player.
         """
 
-        if len(self.players) < 2:
-            self.players.append(Player(position, player_color=player_color, video_mode=self.video_mode))
+        if self.max_players is not None and len(self.players) >= self.max_players:
+            return None
 
-    def handle_events(self):
+        player = Player(position, player_color=player_color, video_mode=self.video_mode, team=team)
+        self.players.append(player)
+        self.__fire_cooldowns.append(0.0)
+        self.__allocate_observation_buffers()
+        self.__pool_centers = np.zeros((len(self.players), 2))
+        self.__pool_sizes = np.zeros(len(self.players), dtype=np.int64)
+        self.__pool_teams = [None] * len(self.players)
+        self.__update_pool_opponents()
+        return player
+
+    def __allocate_observation_buffers(self):
         """
-        Handles all events from the game (quitting, updating key presses, mouse clicks, etc).
+        (Re)allocates the buffers returned by observe(), to match the current number of players.
         """
-        for event in pygame.event.get():
+        n_players = len(self.players)
+        self.__observation = np.zeros((n_players, len(OBSERVATION_FIELDS)), dtype=np.float32)
+        self.__ego_observation = np.zeros((n_players, n_players, len(OBSERVATION_FIELDS)), dtype=np.float32)
 
-            # Handle closing event
-            if event.type == pygame.QUIT:
-                sys.exit()
+        # Row order of each player's ego-centric observation: the player itself first, then all others
+        self.__ego_order = np.array([[i] + [j for j in range(n_players) if j != i] for i in range(n_players)],
+                                    dtype=np.intp).reshape(n_players, n_players)
+
+    def handle_events(self):
+        """
+        Handles all events from the game (quitting, updating key presses, mouse clicks, etc). Does nothing if video_mode
+        is False or if the game is offscreen, since there is no window to receive events.
 
-            # Handle key presses
-            if event.type == pygame.KEYDOWN:
-                if event.key in self.key_pressed:
-                    self.key_pressed[event.key] = True
+        Events are polled by the `input` pipeline, which timestamps key presses for get_human_player_action(). Closing
+        the window sets `quit_requested`: the caller decides when to stop.
+        """
+        if self.input is None:
+            return
+        start = time.perf_counter() if self.metrics.enabled else None
 
-            # Handle key releases
-            if event.type == pygame.KEYUP:
-                if event.key in self.key_pressed:
-                    self.key_pressed[event.key] = False
+        self.input.poll()
+        self.quit_requested = self.input.quit_requested
+        for key, held in zip(self.input.keys, self.input.held):
+            self.key_pressed[key] = held
 
-            # Handle mouse clicks
-            if event.type == pygame.MOUSEBUTTONDOWN and event.button == 1:
-                self.key_pressed['mouse_click'] = True
-            if event.type == pygame.MOUSEBUTTONUP and event.button == 1:
-                self.key_pressed['mouse_click'] = False
+        if start is not None:
+            self.metrics.add_time('handle_events', time.perf_counter() - start)
 
-    def update_physics(self, player_actions):
+    def update_physics(self, player_actions, delta_t=None):
         """
         Updates the game's current state, using all the player's actions and the game's physics.
 
         Every player will have the update() method called, to decide how to parse their actions.
 
         Physics:
-            - Crosshair position is limited to the screen.
-            - Player's position is limited to the screen.
-            - Partially elastic collision between players and the borders of the screen.
+            - Crosshair position is limited to the world.
+            - Player's position is limited to the world.
+            - Partially elastic collision between players and the borders of the world, and the obstacles. A player
+              that overlaps an obstacle is pushed out of it along the axis where the overlap is smallest.
             - Perfectly elastic collision between players.
+            - Bullets hit the opponents their rectangle overlaps at the end of the time step. With `swept_bullets`,
+              they hit the first opponent their rectangle overlaps at any moment during the time step (against the
+              opponent's rectangle at the end of the time step), and they are only removed at the walls afterwards.
+            - Bullets that overlap an obstacle at the end of the time step are removed without hitting anyone. With
+              `swept_bullets`, they are stopped by the first obstacle on their path, and only hit the opponents they
+              reach before it.
+            - With a `fire_interval`, the bullets of the pool are all moved after the players, and then tested against
+              every opponent, all at once.
+
+        The bullet hits are stored in the `hits` attribute. If metrics are enabled, the durations of the phases of the
+        update are recorded, and every call counts as a tick (see the `metrics` attribute).
+
+        :param player_actions: Actions of each player, in the order of the `players` attribute. Each player's actions
+            can be a dictionary, an encoded integer or a sequence of truth values (see encode_actions()). The actions
+            of all players can also be given as a single array, either of encoded integers with shape (n_players,) or
+            of truth values with shape (n_players, n_actions).
+        :type player_actions: List, or array.
+        :param delta_t: Duration of the time step, in seconds. Default value is the `delta_t` attribute.
+        :type delta_t: Number.
         """
-        slowdown_factor = 2
-        delta_t = 1/(60*slowdown_factor)
+        if delta_t is None:
+            delta_t = self.delta_t
+
+        metrics = self.metrics if self.metrics.enabled else None
+        if metrics is not None:
+            start = time.perf_counter()
+            update_time = 0.0
+            n_shots = 0
+
+        # Encode arrays of actions all at once, instead of row by row
+        if isinstance(player_actions, np.ndarray) and player_actions.ndim == 2:
+            player_actions = encode_action_array(player_actions).tolist()
+
+        self.hits.clear()
+
+        # With many players, collisions are found through a broadphase index. Since positions may have been changed
+        # since the last update, it is refreshed before being used
+        n_players = len(self.players)
+        broadphase = self.__broadphase if n_players >= BROADPHASE_MIN_PLAYERS else None
+        if broadphase is not None:
+            for i in range(n_players):
+                self.__update_broadphase(i)
+
+        # Position of the mouse in the time slice of this step (see get_human_player_action()), in the world
+        mouse_position = self.camera.to_world(self.input.mouse_position) if self.input is not None else None
 
         # For each player
         for i, player in enumerate(self.players):
@@ -356,48 +842,425 @@ class Game:
             # Decide actions for player
             actions = player_actions[i]
 
-            # Update player using chosen actions
-            player.update(actions, delta_t)
+            if metrics is not None:
+                update_start = time.perf_counter()
+                n_shots -= player.bullet.was_shot
+
+            # Update player using chosen actions. With a bullet pool, the player's own bullet is never shot
+            if self.bullets is not None:
+                actions = encode_actions(actions)
+                player.update(actions & ~ACTION_SHOOT, delta_t, mouse_position)
+                self.__fire_pooled_bullet(i, actions & ACTION_SHOOT, delta_t)
+            else:
+                player.update(actions, delta_t, mouse_position)
+
+            if metrics is not None:
+                update_time += time.perf_counter() - update_start
+                n_shots += player.bullet.was_shot
 
             # Limit crosshair position
             if player.crosshair[0] < 0:
                 player.crosshair[0] = 0
-            if player.crosshair[0] > self.screen_width:
-                player.crosshair[0] = self.screen_width
+            if player.crosshair[0] > self.world_width:
+                player.crosshair[0] = self.world_width
             if player.crosshair[1] < 0:
                 player.crosshair[1] = 0
-            if player.crosshair[1] > self.screen_height:
-                player.crosshair[1] = self.screen_height
-
-            # Check collisions with walls
-            r = player.get_rect()
-            if r.left < 0:
-                player.position[0] = r.width / 2
+            if player.crosshair[1] > self.world_height:
+                player.crosshair[1] = self.world_height
+
+            # Check collisions with walls (the bounds are the ones of the player's Rect, see get_rect())
+            half_size = player.size / 2
+            left = round_coordinate(player.position[0]) - player.size // 2
+            top = round_coordinate(player.position[1]) - player.size // 2
+            if left < 0:
+                player.position[0] = half_size
                 player.velocity[0] = -player.velocity[0]*0.8
-            if r.top < 0:
-                player.position[1] = r.height / 2
+            if top < 0:
+                player.position[1] = half_size
                 player.velocity[1] = -player.velocity[1]*0.8
-            if r.right > self.screen_width:
-                player.position[0] = self.screen_width - r.width / 2
+            if left + player.size > self.world_width:
+                player.position[0] = self.world_width - half_size
                 player.velocity[0] = -player.velocity[0]*0.8
-            if r.bottom > self.screen_height:
-                player.position[1] = self.screen_height - r.height / 2
+            if top + player.size > self.world_height:
+                player.position[1] = self.world_height - half_size
                 player.velocity[1] = -player.velocity[1]*0.8
 
+            # Check collisions with obstacles
+            if self.obstacles is not None:
+                self.__push_out_of_obstacles(player)
+
+            if broadphase is not None:
+                self.__update_broadphase(i)
+
+            if self.bullets is not None:
+                continue
+
             # Check bullet collision with walls
-            r = player.bullet.get_rect()
-            if (r.right < 0 or r.bottom < 0 or r.left > self.screen_width or r.top > self.screen_height) \
-                    and player.bullet.was_shot:
-                player.bullet.reset_bullet()
+            bullet = player.bullet
+            b_left = round_coordinate(bullet.position[0]) - bullet.size // 2
+            b_top = round_coordinate(bullet.position[1]) - bullet.size // 2
+            b_right = b_left + bullet.size
+            b_bottom = b_top + bullet.size
+            if self.swept_bullets:
+                # Only the opponents reached before the first obstacle on the bullet's path can be hit
+                obstacle_time = None
+                if bullet.was_shot and self.obstacles is not None:
+                    displacement = (bullet.velocity[0] * delta_t, bullet.velocity[1] * delta_t)
+                    obstacle_hit = self.obstacles.raycast((bullet.position[0] - displacement[0],
+                                                           bullet.position[1] - displacement[1]), displacement,
+                                                          bullet.size / 2)
+                    if obstacle_hit is not None:
+                        obstacle_time = obstacle_hit[1]
+                if bullet.was_shot and n_players > 1:
+                    self.__sweep_bullet(i, delta_t, broadphase, b_left, b_top, b_right, b_bottom, obstacle_time)
+                if (b_right < 0 or b_bottom < 0 or b_left > self.world_width or b_top > self.world_height) \
+                        and bullet.was_shot:
+                    bullet.reset_bullet()
+                if obstacle_time is not None and bullet.was_shot:
+                    bullet.reset_bullet()
+                continue
+            if (b_right < 0 or b_bottom < 0 or b_left > self.world_width or b_top > self.world_height) \
+                    and bullet.was_shot:
+                bullet.reset_bullet()
+
+            # Check bullet collision with obstacles. A bullet stopped by an obstacle hits no one
+            if self.obstacles is not None and bullet.was_shot and \
+                    self.obstacles.overlapping(b_left, b_top, b_right, b_bottom):
+                bullet.reset_bullet()
+                continue
+
+            # Check bullet collision with the other players (if there are any). The bullet hits at most one player:
+            # the first one, in the order of the `players` attribute
+            if n_players > 1:
+                if broadphase is None:
+                    candidates = range(n_players)
+                else:
+                    candidates = sorted(broadphase.query(b_left, b_top, b_right, b_bottom))
+                for j in candidates:
+                    other = self.players[j]
+                    if not player.is_opponent(other):
+                        continue
+                    o_left = round_coordinate(other.position[0]) - other.size // 2
+                    o_top = round_coordinate(other.position[1]) - other.size // 2
+                    if b_left < o_left + other.size and b_top < o_top + other.size and o_left < b_right and \
+                            o_top < b_bottom:
+                        player.score += 1
+                        bullet.reset_bullet()
+                        self.hits.append(BulletHit(i, j, delta_t))
+                        break
+
+        if self.bullets is not None:
+            self.__update_bullet_pool(delta_t)
+
+        if metrics is not None:
+            collisions_start = time.perf_counter()
+
+        # Parse collisions between players (if there are two or more players in the game). With the broadphase index,
+        # pairs are visited in the same order as without it: since resolving a collision moves both players, the
+        # candidates of a player are looked up again after each of its collisions
+        n_collisions = 0
+        if broadphase is not None:
+            for i in range(n_players):
+                n_collisions += self.__parse_broadphase_collisions(i)
+        else:
+            for i in range(n_players):
+                for j in range(i + 1, n_players):
+                    n_collisions += self.__parse_player_collision(self.players[i], self.players[j])
+
+        if metrics is not None:
+            end = time.perf_counter()
+            metrics.add_time('player_update', update_time)
+            metrics.add_time('checks', collisions_start - start - update_time)
+            metrics.add_time('player_collisions', end - collisions_start)
+            metrics.add_time('physics', end - start)
+            metrics.count('shots', n_shots)
+            metrics.count('hits', len(self.hits))
+            metrics.count('collisions', n_collisions)
+            metrics.end_tick()
+
+    def step(self, player_actions, repeat=1, stop_on_hit=True, max_score=None, delta_t=None):
+        """
+        Runs up to `repeat` time steps of update_physics(), all with the same actions (action repeat, or frame skip).
+
+        The actions are encoded once for all the time steps. The loop stops early after a time step with a bullet hit
+        (if `stop_on_hit` is True), or where a player reaches `max_score`, so that the caller can react to it (e.g.
+        reset the game) before the next call.
+
+        :param player_actions: Actions of each player, as in update_physics().
+        :type player_actions: List, or array.
+        :param repeat: Maximum number of time steps to run. Default value is 1.
+        :type repeat: Number.
+        :param stop_on_hit: Whether to stop after the first time step with a bullet hit. Default value is True.
+        :type stop_on_hit: Boolean.
+        :param max_score: Score that stops the loop once a player reaches it. Default value is None (no limit).
+        :type max_score: Number.
+        :param delta_t: Duration of each time step, in seconds. Default value is the `delta_t` attribute.
+        :type delta_t: Number.
+        :return: Number of time steps run, change of every player's score, every bullet hit (with its time since the
+            start of the call), and whether the loop stopped because of a hit or the score limit (even on its last time
+            step).
+        :rtype: StepResult.
+        """
+        if delta_t is None:
+            delta_t = self.delta_t
+        if isinstance(player_actions, np.ndarray) and player_actions.ndim == 2:
+            codes = encode_action_array(player_actions).tolist()
+        else:
+            codes = [encode_actions(actions) for actions in player_actions]
+
+        initial_scores = [player.score for player in self.players]
+        hits = []
+        ticks = 0
+        stopped = False
+        while ticks < repeat:
+            self.update_physics(codes, delta_t)
+            if self.hits:
+                hits.extend(BulletHit(hit.shooter, hit.target, ticks * delta_t + hit.time) for hit in self.hits)
+            ticks += 1
+            if (stop_on_hit and self.hits) or \
+                    (max_score is not None and any(player.score >= max_score for player in self.players)):
+                stopped = True
+                break
+
+        score_deltas = [player.score - score for player, score in zip(self.players, initial_scores)]
+        return StepResult(ticks, score_deltas, hits, stopped)
+
+    def has_line_of_sight(self, start, end, half_size=0):
+        """
+        Returns whether a square moving from a point to another would not hit any obstacle on the way (e.g. whether a
+        player can see, or shoot, another). Only the grid cells crossed by the segment are searched (see
+        StaticGrid.raycast()).
+
+        :param start: World coordinates of the first point.
+        :type start: Array with two elements.
+        :param end: World coordinates of the second point.
+        :type end: Array with two elements.
+        :param half_size: Half the side length of the square (e.g. of a bullet), at most half the size of a player.
+            Default value is 0 (a line).
+        :type half_size: Number.
+        :return: True if no obstacle is in the way. Always True without obstacles.
+        :rtype: Boolean.
+        """
+        if self.obstacles is None:
+            return True
+        return self.obstacles.raycast(start, (end[0] - start[0], end[1] - start[1]), half_size) is None
 
-            # Check bullet collision with the other player (if there is one)
-            if len(self.players) > 1 and r.colliderect(self.players[1-i].get_rect()):
-                player.score += 1
-                player.bullet.reset_bullet()
+    def __fire_pooled_bullet(self, i, shoot, delta_t):
+        """
+        Shoots a bullet of the pool from the i-th player towards its crosshair, if `shoot` is true and the player can
+        shoot again.
+        """
+        cooldown = self.__fire_cooldowns[i] - delta_t
+        player = self.players[i]
+        if shoot and cooldown <= 0:
+            vel_x = player.crosshair[0] - player.position[0]
+            vel_y = player.crosshair[1] - player.position[1]
+            bullet_speed = math.sqrt(vel_x * vel_x + vel_y * vel_y)
+            if bullet_speed > 0:
+                vel_x *= player.SHOOTING_SPEED / bullet_speed
+                vel_y *= player.SHOOTING_SPEED / bullet_speed
+                lifetime = self.bullet_lifetime if self.bullet_lifetime is not None else math.inf
+                if self.bullets.spawn(i, player.position, (vel_x, vel_y), lifetime) is not None:
+                    cooldown = self.fire_interval
+                    if self.metrics.enabled:
+                        self.metrics.count('shots')
+        self.__fire_cooldowns[i] = max(cooldown, 0.0)
+
+    def __update_bullet_pool(self, delta_t):
+        """
+        Moves the bullets of the pool, scores their hits, and removes the ones that hit a player or an obstacle, left
+        the world or are too old.
+        """
+        pool = self.bullets
+        pool.update(delta_t)
+
+        # Bullets stopped by an obstacle, and when (as a fraction of the time step)
+        blocked = self.__find_blocked_bullets(delta_t) if self.obstacles is not None and len(pool) > 0 else {}
+
+        if len(pool) > 0 and len(self.players) > 1:
+            centers, sizes, opponents = self.__get_pool_targets()
+            indices, targets, times = pool.find_hits(centers, sizes, opponents,
+                                                     delta_t if self.swept_bullets else None)
+            if blocked:
+                reached = np.array([hit_time < blocked.get(index, math.inf)
+                                    for index, hit_time in zip(indices.tolist(), times.tolist())], dtype=bool)
+                indices, targets, times = indices[reached], targets[reached], times[reached]
+            for k in range(len(indices)):
+                shooter = int(pool.owner[indices[k]])
+                self.players[shooter].score += 1
+                self.hits.append(BulletHit(shooter, int(targets[k]), float(times[k]) * delta_t))
+            pool.kill(indices)
+
+        if blocked:
+            pool.kill(np.array(list(blocked), dtype=np.intp))
+        if len(pool) > 0:
+            pool.cull(self.world_width, self.world_height)
+
+    def __get_pool_targets(self):
+        """
+        Returns the center and size of every player, and whether the bullets of each player can hit each other player
+        (see BulletPool.find_hits()), in arrays that are reused from one time step to the next.
+        """
+        centers = self.__pool_centers
+        sizes = self.__pool_sizes
+        teams_changed = False
+        for i in range(len(self.players)):
+            player = self.players[i]
+            centers[i, 0] = player.position[0]
+            centers[i, 1] = player.position[1]
+            sizes[i] = player.size
+            teams_changed = teams_changed or player.team != self.__pool_teams[i]
+        if teams_changed:
+            self.__update_pool_opponents()
+        return centers, sizes, self.__pool_opponents
+
+    def __update_pool_opponents(self):
+        """
+        Finds which players the bullets of each player can hit, for the current teams.
+        """
+        self.__pool_teams[:] = [player.team for player in self.players]
+        self.__pool_opponents = np.array([[player.is_opponent(other) for other in self.players]
+                                          for player in self.players], dtype=bool).reshape(len(self.players), -1)
+
+    def __find_blocked_bullets(self, delta_t):
+        """
+        Returns the bullets of the pool stopped by an obstacle in the last time step: those that overlap one at the end
+        of the time step (at time 1) or, with `swept_bullets`, whose path entered one. All bullets are tested at once
+        (see StaticGrid.raycast_many() and StaticGrid.overlaps_any()).
+
+        :return: Fraction of the time step when each bullet hit an obstacle, by slot.
+        :rtype: Dictionary.
+        """
+        pool = self.bullets
+        live = pool.live_indices()
+        if self.swept_bullets:
+            displacements = pool.velocity[live] * delta_t
+            _, times = self.obstacles.raycast_many(pool.position[live] - displacements, displacements, pool.size / 2)
+            blocked = np.isfinite(times)
+            return dict(zip(live[blocked].tolist(), times[blocked].tolist()))
+        blocked = self.obstacles.overlaps_any(*pool.get_rects(live))
+        return dict.fromkeys(live[blocked].tolist(), 1.0)
+
+    def __push_out_of_obstacles(self, player):
+        """
+        Moves a player out of the obstacles its rectangle overlaps, along the axis where the overlap is smallest, and
+        bounces it off them like off the walls.
+        """
+        half_size = player.size / 2
+        left = round_coordinate(player.position[0]) - player.size // 2
+        top = round_coordinate(player.position[1]) - player.size // 2
+        for k in self.obstacles.overlapping(left, top, left + player.size, top + player.size):
+            o_left, o_top, o_right, o_bottom = self.obstacles.get_bounds(k)
+
+            # An earlier obstacle may have already pushed the player out of this one
+            left = round_coordinate(player.position[0]) - player.size // 2
+            top = round_coordinate(player.position[1]) - player.size // 2
+            if not (o_left < left + player.size and o_top < top + player.size and left < o_right and top < o_bottom):
+                continue
+
+            overlap_left = left + player.size - o_left
+            overlap_right = o_right - left
+            overlap_up = top + player.size - o_top
+            overlap_down = o_bottom - top
+            smallest = min(overlap_left, overlap_right, overlap_up, overlap_down)
+            if smallest == overlap_left:
+                player.position[0] = o_left - half_size
+                if player.velocity[0] > 0:
+                    player.velocity[0] = -player.velocity[0]*0.8
+            elif smallest == overlap_right:
+                player.position[0] = o_right + half_size
+                if player.velocity[0] < 0:
+                    player.velocity[0] = -player.velocity[0]*0.8
+            elif smallest == overlap_up:
+                player.position[1] = o_top - half_size
+                if player.velocity[1] > 0:
+                    player.velocity[1] = -player.velocity[1]*0.8
+            else:
+                player.position[1] = o_bottom + half_size
+                if player.velocity[1] < 0:
+                    player.velocity[1] = -player.velocity[1]*0.8
+
+    def __sweep_bullet(self, i, delta_t, broadphase, b_left, b_top, b_right, b_bottom, max_time=None):
+        """
+        Checks whether the bullet of the i-th player hit an opponent at any moment during the last time step, given the
+        bounds of the bullet's rectangle at the end of the time step. The opponent hit first (the first one in the
+        order of the `players` attribute, in case of a tie) is scored. If `max_time` is given (the fraction of the time
+        step at which the bullet hit an obstacle), only opponents hit before it count.
+
+        The path of the bullet's center is tested against every opponent's rectangle grown by half the bullet's size
+        (see collision.sweep_segment_box()). A bullet that overlaps an opponent at the end of the time step always
+        hits it, like without swept bullets, even if its path only grazes the opponent's rounded rectangle.
+        """
+        player = self.players[i]
+        bullet = player.bullet
+        displacement = (bullet.velocity[0] * delta_t, bullet.velocity[1] * delta_t)
+        start = (bullet.position[0] - displacement[0], bullet.position[1] - displacement[1])
+
+        if broadphase is None:
+            candidates = range(len(self.players))
+        else:
+            # The area swept by the bullet's rectangle during the time step
+            s_left = round_coordinate(start[0]) - bullet.size // 2
+            s_top = round_coordinate(start[1]) - bullet.size // 2
+            candidates = sorted(broadphase.query(min(s_left, b_left), min(s_top, b_top),
+                                                 max(s_left + bullet.size, b_right), max(s_top + bullet.size, b_bottom)))
+
+        first_target = None
+        first_time = None
+        for j in candidates:
+            other = self.players[j]
+            if not player.is_opponent(other):
+                continue
+            half_size = (other.size + bullet.size) / 2
+            hit_time = sweep_segment_box(start, displacement,
+                                         (other.position[0] - half_size, other.position[1] - half_size),
+                                         (other.position[0] + half_size, other.position[1] + half_size))
+            if hit_time is None:
+                o_left = round_coordinate(other.position[0]) - other.size // 2
+                o_top = round_coordinate(other.position[1]) - other.size // 2
+                if b_left < o_left + other.size and b_top < o_top + other.size and o_left < b_right and \
+                        o_top < b_bottom:
+                    hit_time = 1.0
+            if hit_time is not None and (first_time is None or hit_time < first_time) and \
+                    (max_time is None or hit_time < max_time):
+                first_target, first_time = j, hit_time
+
+        if first_target is not None:
+            player.score += 1
+            bullet.reset_bullet()
+            self.hits.append(BulletHit(i, first_target, first_time * delta_t))
+
+    def __parse_broadphase_collisions(self, i):
+        """
+        Parses the collisions between the i-th player and every player after it, using the broadphase index. Returns
+        the number of collisions.
+        """
+        player = self.players[i]
+        first_candidate = i + 1
+        n_collisions = 0
+        while True:
+            left = round_coordinate(player.position[0]) - player.size // 2
+            top = round_coordinate(player.position[1]) - player.size // 2
+            candidates = sorted(j for j in self.__broadphase.query(left, top, left + player.size, top + player.size)
+                                if j >= first_candidate)
+            for j in candidates:
+                first_candidate = j + 1
+                if self.__parse_player_collision(player, self.players[j]):
+                    self.__update_broadphase(i)
+                    self.__update_broadphase(j)
+                    n_collisions += 1
+                    break
+            else:
+                return n_collisions
 
-        # Parse collision between players (if there are two players in the game)
-        if len(self.players) == 2:
-            self.__parse_player_collision(self.players[0], self.players[1])
+    def __update_broadphase(self, i):
+        """
+        Updates the bounds of the i-th player in the broadphase index.
+        """
+        player = self.players[i]
+        left = round_coordinate(player.position[0]) - player.size // 2
+        top = round_coordinate(player.position[1]) - player.size // 2
+        self.__broadphase.update(i, left, top, left + player.size, top + player.size)
 
     def __parse_player_collision(self, player1, player2):
         """
@@ -422,15 +1285,16 @@ class Game:
         :type player1: Player.
         :param player2: The second player involved in the collision.
         :type player2: Player.
+        :return: Whether the players were colliding.
+        :rtype: Boolean.
         """
 
         # Initializations
-        r1 = player1.get_rect()
-        r2 = player2.get_rect()
-        l = player1.get_rect().width
+        l = player1.size
 
-        # If the collision happened, parse it
-        if r1.colliderect(r2):
+        # If the collision happened (i.e. the players' Rects intersect, see get_rect()), parse it
+        if abs(round_coordinate(player1.position[0]) - round_coordinate(player2.position[0])) < l and \
+                abs(round_coordinate(player1.position[1]) - round_coordinate(player2.position[1])) < l:
 
             is_collision_x = is_collision_y = False
 
@@ -473,53 +1337,445 @@ class Game:
                     # Switch players' velocities in this direction
                     (player1.velocity[i], player2.velocity[i]) = (player2.velocity[i], player1.velocity[i])
 
+            return True
+
+        return False
+
     def draw_frame(self):
         """
-        Draws the current game state to the screen. Limited to max 60 fps.
+        Draws the current game state to the screen. Limited to max_fps frames per second, unless the game is offscreen.
+
+        With incremental_render, only the areas covered by objects in the last frame are cleared, and only those areas
+        and the ones covered by objects in this frame are pushed to the display. Every object is still drawn each
+        frame, so objects that overlap a cleared area are never left partially erased. The whole screen is drawn again
+        when the camera moves.
+
+        Only the part of the world seen by the camera is drawn (centered on the player it follows, if any): objects
+        outside of it are skipped, and the visible obstacles are found through their grid.
+
+        Every frame is also handed to the `capture` recorder, if there is one.
         """
         # If video_mode is False, do nothing
         if not self.video_mode:
             return
+        start = time.perf_counter() if self.metrics.enabled else None
+
+        camera = self.camera
+        if camera.target is not None:
+            camera.move_to(self.players[camera.target].position)
+        offset = camera.get_offset()
+
+        # Black background and obstacles (only where something was drawn in the last frame, if rendering incrementally)
+        full_frame = not self.incremental_render or self.__drawn_rects is None or offset != self.__drawn_offset
+        if full_frame:
+            self.screen.fill((0, 0, 0))
+            self.__draw_obstacles(self.screen.get_rect())
+        else:
+            for r in self.__drawn_rects:
+                self.screen.fill((0, 0, 0), r)
+                self.__draw_obstacles(r)
 
-        # Black background
-        self.screen.fill((0, 0, 0))
-
-        # Draw all players
+        # Draw all players, and the bullets of the pool (with the color of their owner's bullet)
+        drawn_rects = []
         for player in self.players:
-            player.draw(self.screen)
-
-        # Draw players' scores
-        text_before_score = ['P1: ', 'P2: ']
-        position_to_display = [(0, 0), (0, 40)]
+            drawn_rects.extend(player.draw(self.screen, offset))
+        if self.bullets is not None:
+            live = self.bullets.live_indices()
+            lefts, tops, rights, bottoms = self.bullets.get_rects(live)
+            visible = camera.is_visible(lefts, tops, rights, bottoms)
+            for owner, left, top in zip(self.bullets.owner[live[visible]].tolist(), lefts[visible].tolist(),
+                                        tops[visible].tolist()):
+                drawn_rects.append(self.screen.blit(self.players[owner].bullet.img,
+                                                    (int(left) - offset[0], int(top) - offset[1])))
+
+        # Draw players' scores (the texts are only rendered again when the scores change)
         for i in range(len(self.players)):
-            score_player = self.my_font.render(text_before_score[i] + str(self.players[i].score), False, (255, 255, 255))
-            self.screen.blit(score_player, position_to_display[i])
+            score, score_player = self.__score_surfaces.get(i, (None, None))
+            if score != self.players[i].score:
+                score = self.players[i].score
+                score_player = self.my_font.render('P{}: {}'.format(i + 1, score), False, (255, 255, 255))
+                self.__score_surfaces[i] = (score, score_player)
+            drawn_rects.append(self.screen.blit(score_player, (0, 40 * i)))
+
+        # Objects outside of the screen are not drawn, and do not need to be cleared or updated
+        drawn_rects = [r for r in drawn_rects if r.width > 0 and r.height > 0]
+
+        # Hand the frame to the recorder, which only copies it here
+        if self.capture is not None:
+            self.capture.add_frame(self.screen)
+
+        # Flip the display (or update only the areas that changed) and limit frame-rate. Offscreen frames are read
+        # with render_array() instead
+        if not self.offscreen:
+            if full_frame:
+                pygame.display.flip()
+            else:
+                pygame.display.update(self.__drawn_rects + drawn_rects)
+            if self.input is not None:
+                self.input.frame_presented()
+            if start is not None:
+                tick_start = time.perf_counter()
+                self.metrics.add_time('draw', tick_start - start)
+
+            # Keep polling the input while waiting for the next frame, so that key presses are timestamped to within a
+            # millisecond instead of a frame
+            if self.max_fps and self.input is not None:
+                self.input.poll_until(self.__last_frame_time + 1 / self.max_fps)
+                self.__last_frame_time = time.perf_counter()
+                self.clock.tick()
+            elif self.max_fps:
+                self.clock.tick(self.max_fps)
+            if start is not None:
+                self.metrics.add_time('clock_tick', time.perf_counter() - tick_start)
+        elif start is not None:
+            self.metrics.add_time('draw', time.perf_counter() - start)
+
+        self.__drawn_rects = drawn_rects
+        self.__drawn_offset = offset
+
+    def __draw_obstacles(self, area):
+        """
+        Draws the parts of the obstacles that fall in an area of the screen.
 
-        # Flip the display and limit frame-rate
-        pygame.display.flip()
-        self.clock.tick(60)
+        :param area: The area, in screen coordinates.
+        :type area: Rect.
+        """
+        if self.obstacles is None:
+            return
+        left, top = self.camera.to_world(area.topleft)
+        for k in self.obstacles.overlapping(left, top, left + area.width, top + area.height):
+            o_left, o_top, o_right, o_bottom = self.obstacles.get_bounds(k)
+            x, y = self.camera.to_screen((o_left, o_top))
+            self.screen.fill(OBSTACLE_COLOR, pygame.Rect(x, y, o_right - o_left, o_bottom - o_top).clip(area))
+
+    def render_array(self, size=None, grayscale=False, smooth=True, out=None):
+        """
+        Draws the current game state (see draw_frame()) and returns its pixels as an array.
+
+        Pixels are read through a view of the surface's memory, and copied once into the output array. Resizing and
+        grayscale conversion are done by pygame into surfaces that are created once per frame size and then reused, so
+        that rendering does not allocate memory when `out` is given.
+
+        :param size: Width and height of the returned frame. The screen is scaled to this size. Default value is the
+            size of the screen.
+        :type size: Tuple with two elements.
+        :param grayscale: Whether to return a single luminance channel instead of RGB. Default value is False.
+        :type grayscale: Boolean.
+        :param smooth: Whether to scale with smoothing (pygame.transform.smoothscale) instead of taking the nearest
+            pixel (pygame.transform.scale), which is more than ten times faster but can skip thin details. Default
+            value is True.
+        :type smooth: Boolean.
+        :param out: Array where the frame is written. Default value is a newly-allocated array.
+        :type out: Array of uint8 with shape (height, width, 3), or (height, width) if `grayscale` is True.
+        :return: The frame, with rows first like an image. The same object as `out`, if it was given.
+        :rtype: Array of uint8.
+        """
+        if not self.video_mode:
+            raise RuntimeError('render_array() needs a game with video_mode=True')
+
+        self.draw_frame()
+
+        frame = self.screen
+        if size is not None and tuple(size) != frame.get_size():
+            size = tuple(size)
+            if size not in self.__scaled_surfaces:
+                self.__scaled_surfaces[size] = pygame.Surface(size, 0, frame)
+            scale = pygame.transform.smoothscale if smooth else pygame.transform.scale
+            frame = scale(frame, size, self.__scaled_surfaces[size])
+
+        width, height = frame.get_size()
+        if grayscale:
+            if (width, height) not in self.__grayscale_surfaces:
+                self.__grayscale_surfaces[(width, height)] = pygame.Surface((width, height), 0, frame)
+            frame = pygame.transform.grayscale(frame, self.__grayscale_surfaces[(width, height)])
+
+        if out is None:
+            out = np.empty((height, width) if grayscale else (height, width, 3), dtype=np.uint8)
+
+        # View of the surface's memory as (rows, columns, bytes per pixel), and the byte holding each color channel
+        bytes_per_pixel = frame.get_bytesize()
+        pixels = np.asarray(frame.get_view('0')).reshape(height, frame.get_pitch())
+        pixels = pixels[:, :width * bytes_per_pixel].reshape(height, width, bytes_per_pixel)
+        channel_bytes = get_channel_bytes(frame)
+
+        # Copy channel by channel (all channels of a grayscale surface are equal, so one of them is enough). The view
+        # is released right after, since a surface cannot be drawn on while it is referenced
+        if grayscale:
+            np.copyto(out, pixels[:, :, channel_bytes[0]])
+        else:
+            for channel, byte in enumerate(channel_bytes):
+                np.copyto(out[:, :, channel], pixels[:, :, byte])
+        del pixels
+        return out
 
     def reset_game(self):
 
+        # Remove all bullets of the pool
+        if self.bullets is not None:
+            self.bullets.clear()
+            self.__fire_cooldowns = [0.0] * len(self.players)
+
         # For all players
         for player in self.players:
 
             # Reset score, bullet, velocity and acceleration
             player.score = 0
             player.bullet.reset_bullet()
-            player.velocity = [0, 0]
-            player.acceleration = [0, 0]
+            player.velocity[0] = player.velocity[1] = 0
+            player.acceleration[0] = player.acceleration[1] = 0
 
             # Randomizes position and crosshair position
-            player.position = [np.random.randint(0, self.screen_width), np.random.randint(0, self.screen_height)]
-            player.crosshair = [np.random.randint(0, self.screen_width), np.random.randint(0, self.screen_height)]
+            player.position[0] = np.random.randint(0, self.world_width)
+            player.position[1] = np.random.randint(0, self.world_height)
+            player.crosshair[0] = np.random.randint(0, self.world_width)
+            player.crosshair[1] = np.random.randint(0, self.world_height)
+
+            # Players are not placed inside obstacles (unless no free position is found after some tries)
+            if self.obstacles is not None:
+                for _ in range(100):
+                    left = player.position[0] - player.size // 2
+                    top = player.position[1] - player.size // 2
+                    if not self.obstacles.overlapping(left, top, left + player.size, top + player.size):
+                        break
+                    player.position[0] = np.random.randint(0, self.world_width)
+                    player.position[1] = np.random.randint(0, self.world_height)
+
+
+    def observe(self, ego=False):
+        """
+        Returns the current state of all players as a numeric array.
+
+        Each player is described by one row, whose columns are given by OBSERVATION_FIELDS:
+            - 0, 1: position.
+            - 2, 3: velocity.
+            - 4, 5: acceleration.
+            - 6, 7: crosshair position.
+            - 8, 9: bullet position.
+            - 10, 11: bullet velocity.
+            - 12: 1 if the bullet is in flight, 0 otherwise.
+            - 13: score.
+
+        With `ego` set to True, the state is given from the point of view of each player: element [i, j] is the j-th
+        row seen by player i, where row 0 is player i itself and the remaining rows are the other players (in their
+        original order). In those remaining rows, all positions (of players, crosshairs and bullets) are relative to
+        the position of player i. Row 0 keeps its absolute positions, so that the player knows where the walls are.
+
+        The returned array is preallocated: every call overwrites it in place and returns the same object, without
+        allocating memory. Copy it if the values are needed after the next call.
+
+        :param ego: Whether to return the ego-centric observations of every player. Default value is False.
+        :type ego: Boolean.
+        :return: The state of the game, with shape (n_players, n_fields), or (n_players, n_players, n_fields) if `ego`
+            is True.
+        :rtype: Array of float32.
+        """
+        obs = self.__observation
+        for i, player in enumerate(self.players):
+            row = obs[i]
+            row[0] = player.position[0]
+            row[1] = player.position[1]
+            row[2] = player.velocity[0]
+            row[3] = player.velocity[1]
+            row[4] = player.acceleration[0]
+            row[5] = player.acceleration[1]
+            row[6] = player.crosshair[0]
+            row[7] = player.crosshair[1]
+            row[8] = player.bullet.position[0]
+            row[9] = player.bullet.position[1]
+            row[10] = player.bullet.velocity[0]
+            row[11] = player.bullet.velocity[1]
+            row[12] = player.bullet.was_shot
+            row[13] = player.score
+
+        if not ego:
+            return obs
+
+        # Gather each player's rows, then make the positions of the other players relative to its own
+        ego_obs = self.__ego_observation
+        np.take(obs, self.__ego_order, axis=0, out=ego_obs, mode='clip')
+        for start in (0, 6, 8):
+            ego_obs[:, 1:, start:start + 2] -= ego_obs[:, :1, 0:2]
+        return ego_obs
+
+    def get_snapshot_size(self, rng=True):
+        """
+        Returns the number of values in the snapshots of this game (see snapshot()).
+
+        :param rng: Whether the snapshots include the state of the random number generator. Default value is True.
+        :type rng: Boolean.
+        :return: Number of values.
+        :rtype: Number.
+        """
+        size = len(self.players) * len(OBSERVATION_FIELDS)
+        if self.bullets is not None:
+            size += self.bullets.get_state_size() + len(self.players)
+        if rng:
+            size += SNAPSHOT_RNG_SIZE
+        return size
+
+    def snapshot(self, out=None, rng=True):
+        """
+        Saves the complete physics state of the game in a flat array, which restore() brings back.
+
+        The array holds, in order: the row of every player with the fields of OBSERVATION_FIELDS (in double precision),
+        the state of the bullet pool and the time left before each player can shoot again (if the game has a
+        `fire_interval`), and the state of numpy's global random number generator (if `rng` is True), which the
+        physics use to resolve some collisions. Saving the random number generator takes most of the time of a
+        snapshot, so leave it out when it is not needed (e.g. when exploring possible futures of a game).
+
+        :param out: Where to save the state. Default value is a newly-allocated array.
+        :type out: Array of float64 with get_snapshot_size(rng) elements.
+        :param rng: Whether to save the state of the random number generator. Default value is True.
+        :type rng: Boolean.
+        :return: The snapshot. The same object as `out`, if it was given.
+        :rtype: Array of float64.
+        """
+        if out is None:
+            out = np.empty(self.get_snapshot_size(rng))
 
+        n_fields = len(OBSERVATION_FIELDS)
+        for i, player in enumerate(self.players):
+            bullet = player.bullet
+            out[i * n_fields:(i + 1) * n_fields] = (
+                player.position[0], player.position[1], player.velocity[0], player.velocity[1],
+                player.acceleration[0], player.acceleration[1], player.crosshair[0], player.crosshair[1],
+                bullet.position[0], bullet.position[1], bullet.velocity[0], bullet.velocity[1], bullet.was_shot,
+                player.score)
+        k = len(self.players) * n_fields
+
+        if self.bullets is not None:
+            pool_size = self.bullets.get_state_size()
+            self.bullets.write_state(out[k:k + pool_size])
+            k += pool_size
+            out[k:k + len(self.players)] = self.__fire_cooldowns
+            k += len(self.players)
+
+        if rng:
+            _, key, pos, has_gauss, cached_gaussian = np.random.get_state()
+            out[k:k + 624] = key
+            out[k + 624:k + SNAPSHOT_RNG_SIZE] = (pos, has_gauss, cached_gaussian)
+
+        return out
+
+    def restore(self, snapshot):
+        """
+        Restores the physics state of the game from a snapshot (see snapshot()). The game must have the same players
+        and settings as the one where the snapshot was taken. The state of the random number generator is only
+        restored if the snapshot includes it.
+
+        :param snapshot: The snapshot.
+        :type snapshot: Array of float64.
+        """
+        n_fields = len(OBSERVATION_FIELDS)
+        k = len(self.players) * n_fields
+        for player, row in zip(self.players, snapshot[:k].reshape(-1, n_fields).tolist()):
+            player.position[:] = row[0:2]
+            player.velocity[:] = row[2:4]
+            player.acceleration[:] = row[4:6]
+            player.crosshair[:] = row[6:8]
+            player.bullet.position[:] = row[8:10]
+            player.bullet.velocity[:] = row[10:12]
+            player.bullet.was_shot = bool(row[12])
+            player.score = int(row[13])
+
+        if self.bullets is not None:
+            pool_size = self.bullets.get_state_size()
+            self.bullets.read_state(snapshot[k:k + pool_size])
+            k += pool_size
+            self.__fire_cooldowns = snapshot[k:k + len(self.players)].tolist()
+            k += len(self.players)
+
+        if len(snapshot) == k + SNAPSHOT_RNG_SIZE:
+            rng_state = snapshot[k + 624:k + SNAPSHOT_RNG_SIZE].tolist()
+            np.random.set_state(('MT19937', snapshot[k:k + 624].astype(np.uint32), int(rng_state[0]),
+                                 int(rng_state[1]), rng_state[2]))
 
     @staticmethod
     def get_names_possible_actions():
+        """
+        Returns the names of all possible actions. Their order is the bit order of encoded actions (see
+        encode_actions()), and the column order of arrays of actions.
 
-        return ['up', 'down', 'left', 'right',
-                'shoot', 'ch_up', 'ch_down', 'ch_left', 'ch_right', 'ch_mouse']
+        :return: Names of the actions.
+        :rtype: List of strings.
+        """
+
+        return list(ACTION_NAMES)
+
+
+class FrameStack:
+    """
+    Class for representing a stack of the most recent frames of a game, kept in a preallocated ring buffer.
+
+    Frames are rendered by Game.render_array() directly into the ring buffer, so pushing a frame does not copy or
+    allocate memory beyond the rendering itself.
+
+    Attributes:
+        - game: The game whose frames are stacked. Game object.
+        - size: Width and height of each frame. Tuple with two elements.
+        - grayscale: Whether frames have a single luminance channel. Boolean.
+        - smooth: Whether frames are scaled with smoothing. Boolean.
+        - frames: The ring buffer. Array of uint8 with shape (n_frames, height, width[, 3]).
+        - index: Position in the ring buffer of the most recent frame. Number.
+    """
+
+    def __init__(self, game, n_frames=4, size=None, grayscale=False, smooth=True):
+        """
+        Initializes a frame stack. Call reset() to fill it before the first push().
+
+        :param game: The game whose frames are stacked. Must have video_mode=True (typically with offscreen=True).
+        :type game: Game.
+        :param n_frames: Number of frames in the stack. Default value is 4.
+        :type n_frames: Number.
+        :param size: Width and height of each frame. Default value is the size of the game's screen.
+        :type size: Tuple with two elements.
+        :param grayscale: Whether to stack grayscale frames instead of RGB ones. Default value is False.
+        :type grayscale: Boolean.
+        :param smooth: Whether to scale frames with smoothing (see Game.render_array()). Default value is True.
+        :type smooth: Boolean.
+        """
+        if size is None:
+            size = (game.screen_width, game.screen_height)
+
+        self.game = game
+        self.size = tuple(size)
+        self.grayscale = grayscale
+        self.smooth = smooth
+
+        shape = (n_frames, self.size[1], self.size[0]) if grayscale else (n_frames, self.size[1], self.size[0], 3)
+        self.frames = np.zeros(shape, dtype=np.uint8)
+        self.index = 0
+        self.__order = np.empty(n_frames, dtype=np.intp)
+
+    def reset(self):
+        """
+        Fills the whole stack with the current frame of the game.
+        """
+        self.push()
+        self.frames[:] = self.frames[self.index]
+
+    def push(self):
+        """
+        Renders the current frame of the game into the stack, replacing the oldest one.
+
+        :return: The frame that was just rendered (a view into the ring buffer).
+        :rtype: Array of uint8.
+        """
+        self.index = (self.index + 1) % len(self.frames)
+        return self.game.render_array(self.size, self.grayscale, self.smooth, out=self.frames[self.index])
+
+    def get(self, out=None):
+        """
+        Returns the stacked frames, from the oldest to the most recent.
+
+        :param out: Array where the frames are written. Default value is a newly-allocated array.
+        :type out: Array with the same shape as the `frames` attribute.
+        :return: The stacked frames.
+        :rtype: Array of uint8.
+        """
+        n_frames = len(self.frames)
+        np.add(np.arange(n_frames), self.index + 1, out=self.__order)
+        return np.take(self.frames, self.__order, axis=0, out=out, mode='wrap')
 
 
 def get_human_player_action(game_instance):
@@ -527,6 +1783,10 @@ def get_human_player_action(game_instance):
     Returns the actions for a human player. The actions are determined by which of the bound keys were pressed, and
     the current mouse position.
 
+    Key presses are read from the game's input pipeline, for the time slice of the next physics step (see
+    InputPipeline.consume()): a key counts as pressed if it was held at any time in the slice, so presses shorter than
+    a frame are not lost. Call it once per physics step.
+
     Arrow keys: movement
     Mouse: crosshair movement
     Mouse left-click: shoot
@@ -539,16 +1799,79 @@ def get_human_player_action(game_instance):
     """
 
     action_names = ['up', 'down', 'left', 'right', 'shoot']
-    key_bindings = [pygame.K_UP, pygame.K_DOWN, pygame.K_LEFT, pygame.K_RIGHT, 'mouse_click']
     actions = {}
-    for action_name, key_binding in zip(action_names, key_bindings):
-        actions[action_name] = game_instance.key_pressed[key_binding]
+    if game_instance.video_mode:
+        key_bindings = [pygame.K_UP, pygame.K_DOWN, pygame.K_LEFT, pygame.K_RIGHT, 'mouse_click']
+        pipeline = game_instance.input
+        state = pipeline.consume() if pipeline is not None else None
+        for action_name, key_binding in zip(action_names, key_bindings):
+            if state is not None:
+                actions[action_name] = bool(state >> pipeline.keys.index(key_binding) & 1)
+            else:
+                actions[action_name] = game_instance.key_pressed[key_binding]
+    else:
+        # Without video there is no keyboard to read
+        for action_name in action_names:
+            actions[action_name] = False
 
     actions['ch_mouse'] = True
     return actions
 
 
-def create_random_player_action_generator(prob_action=0.05):
+def get_nearest_opponent(game_instance, player_index):
+    """
+    Returns the opponent closest to a player (see Player.is_opponent()). In a two-player game, this is always the
+    other player.
+
+    :param game_instance: The Game instance that the player belongs to.
+    :type game_instance: Game
+    :param player_index: The index of the player.
+    :type player_index: Number
+    :return: The nearest opponent, or the player itself if it has no opponents.
+    :rtype: Player
+    """
+    players = game_instance.players
+    player = players[player_index]
+    if len(players) == 2:
+        return players[1 - player_index]
+
+    nearest = player
+    nearest_distance = float('inf')
+    for other in players:
+        if player.is_opponent(other):
+            dx = other.position[0] - player.position[0]
+            dy = other.position[1] - player.position[1]
+            distance = dx*dx + dy*dy
+            if distance < nearest_distance:
+                nearest, nearest_distance = other, distance
+    return nearest
+
+
+def flip_random_actions(actions, n_bits, prob_action):
+    """
+    Flips each of the lowest bits of encoded actions with a given probability. This is how the random and AI players
+    choose their movement, and when to shoot.
+
+    :param actions: Encoded actions (see encode_actions()).
+    :type actions: Number.
+    :param n_bits: Number of bits that may be flipped, starting from the lowest one (see ACTION_NAMES).
+    :type n_bits: Number.
+    :param prob_action: Probability that each bit is flipped.
+    :type prob_action: Number.
+    :return: The new encoded actions.
+    :rtype: Number.
+    """
+    for bit in range(n_bits):
+
+        # With probability 'prob_action', do the opposite of what was done the last time
+        r = np.random.rand()
+        if r < prob_action:
+            actions ^= 1 << bit
+
+    return actions
+
+
+def create_random_player_action_generator(prob_action=0.05, encoded=False):
     """
     Creates an action generator for a random player.
 
@@ -556,6 +1879,8 @@ def create_random_player_action_generator(prob_action=0.05):
     of this function can be used in parallel (otherwise both would share the same `old_actions` attribute.
     :param prob_action: Probability that an action will take the opposite value it had the last time the
     get_random_player_action function was called.
+    :param encoded: Whether the generated actions are encoded as integers (see encode_actions()) instead of
+    dictionaries. Default value is False.
     :return: An instance of the get_random_player_action function.
     """
 
@@ -569,41 +1894,26 @@ def create_random_player_action_generator(prob_action=0.05):
         function is called.
 
         :return: Dictionary of actions that this player will take this turn. Keys are the actions, values are booleans
-            representing whether or not that action will be taken this turn.
-        :rtype: Dictionary
+            representing whether or not that action will be taken this turn. Encoded as an integer, if the generator
+            was created with encoded=True.
+        :rtype: Dictionary or integer
         """
 
-        action_names = ['up', 'down', 'left', 'right', 'shoot', 'ch_up', 'ch_down', 'ch_left', 'ch_right']
-
-        # Initialize old actions
-        if not hasattr(get_random_player_action, 'old_actions'):
-            get_random_player_action.old_actions = {}
-            for action in action_names:
-                get_random_player_action.old_actions[action] = False
-
-        # For each action
-        actions = {}
-        for action in action_names:
-
-            # With probability 'prob_action', do the opposite of what was done in the last call of this function
-            r = np.random.rand()
-            if r < prob_action:
-                actions[action] = not get_random_player_action.old_actions[action]
-            else:
-                actions[action] = get_random_player_action.old_actions[action]
-
-        # Don't use the mouse
-        actions['ch_mouse'] = False
+        # Flip each action (all but 'ch_mouse', since the mouse is not used)
+        actions = flip_random_actions(get_random_player_action.old_actions, len(ACTION_NAMES) - 1, prob_action)
 
         # Update the old actions
-        get_random_player_action.old_actions = actions.copy()
+        get_random_player_action.old_actions = actions
 
-        return actions
+        return actions if encoded else decode_actions(actions)
+
+    # Initialize old actions (encoded as an integer)
+    get_random_player_action.old_actions = 0
 
     return get_random_player_action
 
 
-def create_simple_ai_action_generator(prob_action=0.05):
+def create_simple_ai_action_generator(prob_action=0.05, encoded=False):
     """
     Creates an action generator for a simple AI player.
 
@@ -611,6 +1921,8 @@ def create_simple_ai_action_generator(prob_action=0.05):
     instances of this function can be used in parallel (otherwise both would share the same `old_actions` attribute.
     :param prob_action: Probability that an action will take the opposite value it had the last time the
     get_simple_ai_action function was called.
+    :param encoded: Whether the generated actions are encoded as integers (see encode_actions()) instead of
+    dictionaries. Default value is False.
     :return: An instance of the get_simple_ai_action function.
     """
     def get_simple_ai_action(player_index, game_instance):
@@ -625,47 +1937,44 @@ def create_simple_ai_action_generator(prob_action=0.05):
         :param game_instance: The Game instance that the player belongs to.
         :type game_instance: Game
         :return: Dictionary of actions that this player will take this turn. Keys are the actions, values are booleans
-            representing whether or not that action will be taken this turn.
-        :rtype: Dictionary
+            representing whether or not that action will be taken this turn. Encoded as an integer, if the generator
+            was created with encoded=True.
+        :rtype: Dictionary or integer
         """
-        action_names = ['up', 'down', 'left', 'right', 'shoot']
-
-        # Initialize old actions
-        if not hasattr(get_simple_ai_action, 'old_actions'):
-            get_simple_ai_action.old_actions = {}
-            for action in action_names:
-                get_simple_ai_action.old_actions[action] = False
-
-        # For each action
-        actions = {}
-        for action in action_names:
-
-            # With probability 'prob_action', do the opposite of what was done in the last call of this function
-            r = np.random.rand()
-            if r < prob_action:
-                actions[action] = not get_simple_ai_action.old_actions[action]
-            else:
-                actions[action] = get_simple_ai_action.old_actions[action]
 
-        # Don't use the mouse
-        actions['ch_mouse'] = False
+        # Flip each movement action and 'shoot'
+        actions = flip_random_actions(get_simple_ai_action.old_actions & AI_FLIPPED_ACTIONS, 5, prob_action)
 
-        # Make crosshair follow opponent
+        # Make crosshair follow opponent (the mouse is not used)
         i = player_index  # shorthand
-        actions['ch_left'] = game_instance.players[1-i].position[0] < game_instance.players[i].crosshair[0]
-        actions['ch_right'] = game_instance.players[1-i].position[0] > game_instance.players[i].crosshair[0]
-        actions['ch_up'] = game_instance.players[1-i].position[1] < game_instance.players[i].crosshair[1]
-        actions['ch_down'] = game_instance.players[1-i].position[1] > game_instance.players[i].crosshair[1]
+        player_position = game_instance.players[i].position
+        opponent_position = get_nearest_opponent(game_instance, i).position
+        crosshair = game_instance.players[i].crosshair
+        if opponent_position[0] < crosshair[0]:
+            actions |= ACTION_CH_LEFT
+        if opponent_position[0] > crosshair[0]:
+            actions |= ACTION_CH_RIGHT
+        if opponent_position[1] < crosshair[1]:
+            actions |= ACTION_CH_UP
+        if opponent_position[1] > crosshair[1]:
+            actions |= ACTION_CH_DOWN
 
         # Update the old actions
-        get_simple_ai_action.old_actions = actions.copy()
+        get_simple_ai_action.old_actions = actions
 
-        return actions
+        # Hold fire while an obstacle hides the opponent
+        if not game_instance.has_line_of_sight(player_position, opponent_position):
+            actions &= ~ACTION_SHOOT
+
+        return actions if encoded else decode_actions(actions)
+
+    # Initialize old actions (encoded as an integer)
+    get_simple_ai_action.old_actions = 0
 
     return get_simple_ai_action
 
 
-def create_not_so_simple_ai_action_generator(prob_action=0.05):
+def create_not_so_simple_ai_action_generator(prob_action=0.05, encoded=False):
     """
     Creates an action generator for a not so simple AI player.
 
@@ -673,6 +1982,8 @@ def create_not_so_simple_ai_action_generator(prob_action=0.05):
     instances of this function can be used in parallel (otherwise both would share the same `old_actions` attribute.
     :param prob_action: Probability that an action will take the opposite value it had the last time the
     get_not_so_simple_ai_action function was called.
+    :param encoded: Whether the generated actions are encoded as integers (see encode_actions()) instead of
+    dictionaries. Default value is False.
     :return: An instance of the get_simple_ai_action function.
     """
     def get_not_so_simple_ai_action(player_index, game_instance):
@@ -687,54 +1998,56 @@ def create_not_so_simple_ai_action_generator(prob_action=0.05):
          :param game_instance: The Game instance that the player belongs to.
          :type game_instance: Game
          :return: Dictionary of actions that this player will take this turn. Keys are the actions, values are booleans
-             representing whether or not that action will be taken this turn.
-         :rtype: Dictionary
+             representing whether or not that action will be taken this turn. Encoded as an integer, if the generator
+             was created with encoded=True.
+         :rtype: Dictionary or integer
          """
-        action_names = ['up', 'down', 'left', 'right', 'shoot']
-
-        # Initialize old actions
-        if not hasattr(get_not_so_simple_ai_action, 'old_actions'):
-            get_not_so_simple_ai_action.old_actions = {}
-            for action in action_names:
-                get_not_so_simple_ai_action.old_actions[action] = False
-
-        # For each action
-        actions = {}
-        for action in action_names:
-
-            # With probability 'prob_action', do the opposite of what was done in the last call of this function
-            r = np.random.rand()
-            if r < prob_action:
-                actions[action] = not get_not_so_simple_ai_action.old_actions[action]
-            else:
-                actions[action] = get_not_so_simple_ai_action.old_actions[action]
 
-        # Don't use the mouse
-        actions['ch_mouse'] = False
+        # Flip each movement action and 'shoot'
+        actions = flip_random_actions(get_not_so_simple_ai_action.old_actions & AI_FLIPPED_ACTIONS, 5, prob_action)
 
         # Predict position of impact
         i = player_index  # shorthand
+        opponent = get_nearest_opponent(game_instance, i)
         x1 = [game_instance.players[i].position[0], game_instance.players[i].position[1]]
-        x2 = [game_instance.players[1-i].position[0], game_instance.players[1-i].position[1]]
-        v2 = [game_instance.players[1-i].velocity[0], game_instance.players[1-i].velocity[1]]
+        x2 = [opponent.position[0], opponent.position[1]]
+        v2 = [opponent.velocity[0], opponent.velocity[1]]
 
         alphasq = 3000**2
 
         gamma = 4*(dot(v2, x2)-dot(v2, x1))**2-4*(abs2(v2)-alphasq) * \
                                                     (abs2(x1)+abs2(x2)-2*dot(x1, x2))
-        delta_t = (2*(dot(v2, x1)-dot(v2, x2)) - gamma**0.5) / (2*(abs2(v2)-alphasq))
+
+        # If the bullet can never reach the opponent (only possible if the opponent is at least as fast as a bullet),
+        # aim at its current position
+        if gamma < 0 or abs2(v2) == alphasq:
+            delta_t = 0
+        else:
+            delta_t = (2*(dot(v2, x1)-dot(v2, x2)) - math.sqrt(gamma)) / (2*(abs2(v2)-alphasq))
         position_to_aim = [x2[0]+v2[0]*delta_t, x2[1]+v2[1]*delta_t]
 
-        # Move crosshair towards predicted position of impact
-        actions['ch_left'] = position_to_aim[0] < game_instance.players[i].crosshair[0]
-        actions['ch_right'] = position_to_aim[0] > game_instance.players[i].crosshair[0]
-        actions['ch_up'] = position_to_aim[1] < game_instance.players[i].crosshair[1]
-        actions['ch_down'] = position_to_aim[1] > game_instance.players[i].crosshair[1]
+        # Move crosshair towards predicted position of impact (the mouse is not used)
+        crosshair = game_instance.players[i].crosshair
+        if position_to_aim[0] < crosshair[0]:
+            actions |= ACTION_CH_LEFT
+        if position_to_aim[0] > crosshair[0]:
+            actions |= ACTION_CH_RIGHT
+        if position_to_aim[1] < crosshair[1]:
+            actions |= ACTION_CH_UP
+        if position_to_aim[1] > crosshair[1]:
+            actions |= ACTION_CH_DOWN
 
         # Update the old actions
-        get_not_so_simple_ai_action.old_actions = actions.copy()
+        get_not_so_simple_ai_action.old_actions = actions
+
+        # Hold fire while an obstacle hides the opponent
+        if not game_instance.has_line_of_sight(x1, x2):
+            actions &= ~ACTION_SHOOT
+
+        return actions if encoded else decode_actions(actions)
 
-        return actions
+    # Initialize old actions (encoded as an integer)
+    get_not_so_simple_ai_action.old_actions = 0
 
     return get_not_so_simple_ai_action
 
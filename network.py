@@ -0,0 +1,758 @@
+"""
+Networked matches: an authoritative server that runs many games in one asyncio event loop, and clients that predict
+their own game locally.
+
+Usage:
+    python network.py serve [--host HOST] [--port PORT] [--tick-rate N] [--players N] [--max-matches N]
+    python network.py bots [--host HOST] [--port PORT] [--protocol {tcp,udp}] [--bots N] [--ticks N] [--ai NAME]
+
+Example (from Python, with bots playing against each other on localhost):
+    server = GameServer(port=5000)
+    await server.start()
+    clients = await asyncio.gather(*[run_bot('127.0.0.1', 5000) for _ in range(4)])
+    print(server.get_tick_report())
+
+The server steps every match at a fixed tick rate, with the last actions received from each of its players (players
+with no client take no action), and sends the state of the match to its clients every `snapshot_interval` ticks. It
+listens on the same port for TCP (messages prefixed with their length) and UDP (one message per datagram).
+
+Messages are packed with struct, in little-endian order, and start with their type:
+    - JOIN (client to server): the name of the match to join (UTF-8). Clients joining the same name play together,
+        the empty name joins any match with a free slot.
+    - WELCOME (server to client): the match and player index assigned to the client, and the settings of the game.
+    - REJECT (server to client): the reason why the client could not join (UTF-8).
+    - INPUT (client to server): sequence number and encoded actions (see encode_actions()). The server applies at most
+        one input of each client per tick, in order.
+    - SNAPSHOT (server to client): tick, sequence number of the last input of the client applied, last actions of
+        every player, and the snapshot of the game (see Game.snapshot(), without the random number generator).
+    - LEAVE (client to server): the client leaves its match.
+
+Clients step a local copy of their match with their own inputs as soon as they send them (prediction). When a snapshot
+arrives, they restore it and step again with the inputs the server did not apply yet (reconciliation), so their own
+player responds at once, and follows the server.
+"""
+import argparse
+import asyncio
+import collections
+import math
+import struct
+import time
+
+import numpy as np
+
+from metrics import RollingHistogram
+from move_n_shoot import Game
+from move_n_shoot import create_not_so_simple_ai_action_generator
+from move_n_shoot import create_random_player_action_generator
+from move_n_shoot import create_simple_ai_action_generator
+from move_n_shoot import encode_actions
+
+
+# Types of messages
+MSG_JOIN = 1
+MSG_WELCOME = 2
+MSG_REJECT = 3
+MSG_INPUT = 4
+MSG_SNAPSHOT = 5
+MSG_LEAVE = 6
+
+# Formats of the messages: type, match id, player index, number of players, screen width and height, delta_t, fire
+# interval and bullet lifetime (NaN if None), maximum number of bullets, swept bullets, tick rate and tick
+WELCOME_FORMAT = struct.Struct('<BIHHIIdddIBdI')
+# Type, sequence number and encoded actions
+INPUT_FORMAT = struct.Struct('<BIH')
+# Type, tick and sequence number of the last input applied, followed by the actions of every player (uint16) and the
+# snapshot (float64)
+SNAPSHOT_FORMAT = struct.Struct('<BII')
+# Prefix of every message sent over TCP: its length
+LENGTH_FORMAT = struct.Struct('<I')
+
+# Maximum number of inputs of a client waiting to be applied. Older inputs are dropped when more arrive
+MAX_QUEUED_INPUTS = 8
+
+# AI action generator factories available to the bots of the command line interface
+BOT_AIS = {'random': create_random_player_action_generator, 'simple': create_simple_ai_action_generator,
+           'not_so_simple': create_not_so_simple_ai_action_generator}
+
+
+class _Connection:
+    """
+    A client of the server, over TCP or UDP: how to send messages to it, its place in a match, and its inputs.
+    """
+
+    def __init__(self, send):
+        self.send = send
+        self.match = None
+        self.player_index = None
+        self.inputs = collections.deque(maxlen=MAX_QUEUED_INPUTS)
+        self.last_sequence = 0
+        self.last_seen = time.monotonic()
+
+
+class Match:
+    """
+    Class for representing a match hosted by the server: a headless game, and the clients playing it.
+
+    Attributes:
+        - match_id: Identifier of the match. Number.
+        - name: Name the clients joined the match with. String.
+        - game: The authoritative game. Game object.
+        - clients: Client playing every player, or None for free slots. List.
+        - actions: Last encoded actions of every player. List of numbers.
+        - tick: Number of time steps played. Number.
+        - max_score: Score that ends a round (the game is then reset), or None. Number.
+    """
+
+    def __init__(self, match_id, name, n_players, tick_rate, max_score=None, **game_settings):
+        """
+        Creates the game of the match, with all players at random positions.
+
+        :param match_id: Identifier of the match.
+        :type match_id: Number.
+        :param name: Name of the match.
+        :type name: String.
+        :param n_players: Number of players.
+        :type n_players: Number.
+        :param tick_rate: Number of time steps per second. Each step lasts 1/tick_rate seconds of game time.
+        :type tick_rate: Number.
+        :param max_score: Score that ends a round. Default value is None (rounds never end).
+        :type max_score: Number.
+        :param game_settings: Other arguments of the Game (e.g. fire_interval).
+        """
+        self.match_id = match_id
+        self.name = name
+        self.game = Game(video_mode=False, delta_t=1 / tick_rate, max_players=n_players, **game_settings)
+        for _ in range(n_players):
+            self.game.add_player()
+        self.game.reset_game()
+        self.clients = [None] * n_players
+        self.actions = [0] * n_players
+        self.tick = 0
+        self.max_score = max_score
+
+        # Buffer of the snapshot messages: header, actions and snapshot
+        self.__actions_format = struct.Struct('<{}H'.format(n_players))
+        self.__message = bytearray(SNAPSHOT_FORMAT.size + self.__actions_format.size +
+                                   8 * self.game.get_snapshot_size(rng=False))
+        self.__snapshot = np.frombuffer(self.__message, dtype='<f8',
+                                        offset=SNAPSHOT_FORMAT.size + self.__actions_format.size)
+
+    def add_client(self, client):
+        """
+        Assigns a free player to a client.
+
+        :return: Index of the player, or None if the match is full.
+        :rtype: Number.
+        """
+        for i, other in enumerate(self.clients):
+            if other is None:
+                self.clients[i] = client
+                self.actions[i] = 0
+                return i
+        return None
+
+    def remove_client(self, client):
+        """
+        Frees the player of a client. The player stays in the game, and takes no action.
+        """
+        for i, other in enumerate(self.clients):
+            if other is client:
+                self.clients[i] = None
+                self.actions[i] = 0
+
+    def n_clients(self):
+        """
+        Returns the number of clients in the match.
+        """
+        return sum(client is not None for client in self.clients)
+
+    def step(self):
+        """
+        Applies the next input of every client, and advances the game by a time step. Starts a new round if a player
+        reached `max_score`.
+        """
+        for i, client in enumerate(self.clients):
+            if client is not None and client.inputs:
+                client.last_sequence, self.actions[i] = client.inputs.popleft()
+
+        self.game.update_physics(self.actions)
+        self.tick += 1
+
+        if self.max_score is not None and any(player.score >= self.max_score for player in self.game.players):
+            self.game.reset_game()
+
+    def send_snapshots(self):
+        """
+        Sends the current state of the game to every client.
+        """
+        message = self.__message
+        self.__actions_format.pack_into(message, SNAPSHOT_FORMAT.size, *self.actions)
+        self.game.snapshot(out=self.__snapshot, rng=False)
+        for client in self.clients:
+            if client is not None:
+                SNAPSHOT_FORMAT.pack_into(message, 0, MSG_SNAPSHOT, self.tick, client.last_sequence)
+                client.send(message)
+
+
+class _ServerDatagramProtocol(asyncio.DatagramProtocol):
+    """
+    Receives the UDP datagrams of the server, and keeps a connection per client address.
+    """
+
+    def __init__(self, server):
+        self.server = server
+        self.transport = None
+        self.connections = {}
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, address):
+        connection = self.connections.get(address)
+        if connection is None:
+            connection = self.connections[address] = \
+                _Connection(lambda message: self.transport.sendto(message, address))
+        self.server._receive(connection, data)
+        if connection.match is None:
+            del self.connections[address]
+
+
+class GameServer:
+    """
+    Class for representing an authoritative server, which hosts many matches and steps all of them at a fixed tick
+    rate, in one asyncio event loop.
+
+    The time taken by every tick (stepping all matches and sending their snapshots) is recorded, and compared against
+    the time budget of a tick (1/tick_rate seconds) in get_tick_report().
+
+    Attributes:
+        - host: Address the server listens on. String.
+        - port: Port the server listens on (TCP and UDP). Number.
+        - tick_rate: Number of time steps per second. Number.
+        - n_players: Number of players in each match. Number.
+        - max_matches: Maximum number of matches hosted at once. Number.
+        - snapshot_interval: Number of ticks in between two snapshots sent to the clients. Number.
+        - client_timeout: Time (in seconds) after which UDP clients that sent nothing leave their match. Number.
+        - matches: Matches being played, by id. Dictionary of Match.
+        - tick_times: Time (in seconds) taken by the last ticks. RollingHistogram object.
+        - n_ticks: Number of ticks run. Number.
+        - n_overruns: Number of ticks that took longer than their time budget. Number.
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, tick_rate=120, n_players=2, max_matches=64, snapshot_interval=2,
+                 max_score=None, client_timeout=5.0, **game_settings):
+        """
+        Initializes a server. It does not listen or play until start() is called.
+
+        :param host: Address to listen on. Default value is '127.0.0.1' (localhost only).
+        :type host: String.
+        :param port: Port to listen on. Default value is 0 (any free port, see the `port` attribute once started).
+        :type port: Number.
+        :param tick_rate: Number of time steps per second. Default value is 120, like the Game.
+        :type tick_rate: Number.
+        :param n_players: Number of players in each match. Default value is 2.
+        :type n_players: Number.
+        :param max_matches: Maximum number of matches hosted at once. Default value is 64.
+        :type max_matches: Number.
+        :param snapshot_interval: Number of ticks in between two snapshots. Default value is 2.
+        :type snapshot_interval: Number.
+        :param max_score: Score that ends a round of a match. Default value is None (rounds never end).
+        :type max_score: Number.
+        :param client_timeout: Time (in seconds) after which UDP clients that sent nothing leave their match. Default
+            value is 5.
+        :type client_timeout: Number.
+        :param game_settings: Other arguments of the games (e.g. fire_interval). With UDP, the snapshots of games with
+            a bullet pool must fit in a datagram, so keep max_bullets below 1000. Obstacles and worlds larger than the
+            screen are not supported, since clients would not know about them.
+        """
+        settings_game = Game(video_mode=False, **game_settings)
+        world_sz = (settings_game.world_width, settings_game.world_height)
+        if settings_game.obstacles is not None or world_sz != (settings_game.screen_width, settings_game.screen_height):
+            raise ValueError('Games with obstacles or a world larger than the screen cannot be served')
+
+        self.host = host
+        self.port = port
+        self.tick_rate = tick_rate
+        self.n_players = n_players
+        self.max_matches = max_matches
+        self.snapshot_interval = snapshot_interval
+        self.max_score = max_score
+        self.client_timeout = client_timeout
+        self.game_settings = game_settings
+        self.matches = {}
+        self.tick_times = RollingHistogram()
+        self.n_ticks = 0
+        self.n_overruns = 0
+
+        self.__next_match_id = 0
+        self.__tcp_server = None
+        self.__udp_protocol = None
+        self.__tick_task = None
+
+    async def start(self):
+        """
+        Starts listening for clients (TCP and UDP), and playing.
+        """
+        loop = asyncio.get_running_loop()
+        self.__tcp_server = await asyncio.start_server(self.__handle_tcp_client, self.host, self.port)
+        self.port = self.__tcp_server.sockets[0].getsockname()[1]
+        _, self.__udp_protocol = await loop.create_datagram_endpoint(lambda: _ServerDatagramProtocol(self),
+                                                                     local_addr=(self.host, self.port))
+        self.__tick_task = asyncio.ensure_future(self.__run_ticks())
+
+    async def serve_forever(self):
+        """
+        Starts the server, if it was not started, and plays until it is closed.
+        """
+        if self.__tick_task is None:
+            await self.start()
+        try:
+            await self.__tick_task
+        except asyncio.CancelledError:
+            pass
+
+    async def close(self):
+        """
+        Stops playing, and closes all connections.
+        """
+        if self.__tick_task is not None:
+            self.__tick_task.cancel()
+        if self.__udp_protocol is not None:
+            self.__udp_protocol.transport.close()
+        if self.__tcp_server is not None:
+            self.__tcp_server.close()
+            await self.__tcp_server.wait_closed()
+
+    def tick(self):
+        """
+        Steps every match with clients by a time step, and sends snapshots when it is time to.
+        """
+        self.n_ticks += 1
+        send_snapshots = self.n_ticks % self.snapshot_interval == 0
+        for match in list(self.matches.values()):
+            match.step()
+            if send_snapshots:
+                match.send_snapshots()
+
+        # Remove the UDP clients that went silent
+        if self.__udp_protocol is not None and self.n_ticks % self.tick_rate == 0:
+            now = time.monotonic()
+            for address, connection in list(self.__udp_protocol.connections.items()):
+                if now - connection.last_seen > self.client_timeout:
+                    self.__leave(connection)
+                    del self.__udp_protocol.connections[address]
+
+    def get_tick_report(self):
+        """
+        Returns how long ticks take, compared to their time budget.
+
+        :return: Time budget of a tick ('budget', in seconds), summary of the time taken by the last ticks
+            ('tick_time', see RollingHistogram.summary()), mean fraction of the budget used ('utilization'), number of
+            ticks run ('ticks') and of ticks over budget ('overruns'), and the number of matches and clients.
+        :rtype: Dictionary.
+        """
+        budget = 1 / self.tick_rate
+        tick_time = self.tick_times.summary()
+        return {'budget': budget, 'tick_time': tick_time,
+                'utilization': None if tick_time['mean'] is None else tick_time['mean'] / budget,
+                'ticks': self.n_ticks, 'overruns': self.n_overruns, 'matches': len(self.matches),
+                'clients': sum(match.n_clients() for match in self.matches.values())}
+
+    async def __run_ticks(self):
+        """
+        Runs ticks at the tick rate. If the server falls behind by more than a few ticks, the late ticks are skipped
+        instead of being run in a burst.
+        """
+        loop = asyncio.get_running_loop()
+        period = 1 / self.tick_rate
+        next_tick = loop.time()
+        while True:
+            start = time.perf_counter()
+            self.tick()
+            elapsed = time.perf_counter() - start
+            self.tick_times.add(elapsed)
+            if elapsed > period:
+                self.n_overruns += 1
+
+            next_tick += period
+            delay = next_tick - loop.time()
+            if delay < -4 * period:
+                next_tick = loop.time()
+            await asyncio.sleep(max(delay, 0))
+
+    async def __handle_tcp_client(self, reader, writer):
+        """
+        Receives the messages of a TCP client, until it disconnects.
+        """
+        connection = _Connection(lambda message: writer.write(LENGTH_FORMAT.pack(len(message)) + message))
+        try:
+            while True:
+                length, = LENGTH_FORMAT.unpack(await reader.readexactly(LENGTH_FORMAT.size))
+                self._receive(connection, await reader.readexactly(length))
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self.__leave(connection)
+            writer.close()
+
+    def _receive(self, connection, message):
+        """
+        Handles a message of a client.
+        """
+        connection.last_seen = time.monotonic()
+        if not message:
+            return
+        message_type = message[0]
+        if message_type == MSG_INPUT and connection.match is not None:
+            _, sequence, actions = INPUT_FORMAT.unpack(message)
+            connection.inputs.append((sequence, actions))
+        elif message_type == MSG_JOIN and connection.match is None:
+            self.__join(connection, bytes(message[1:]).decode('utf-8', 'replace'))
+        elif message_type == MSG_LEAVE:
+            self.__leave(connection)
+
+    def __join(self, connection, name):
+        """
+        Adds a client to a match with a free player and the given name, or to a new one.
+        """
+        for match in self.matches.values():
+            if match.name == name:
+                player_index = match.add_client(connection)
+                if player_index is not None:
+                    break
+        else:
+            if len(self.matches) >= self.max_matches:
+                connection.send(bytes([MSG_REJECT]) + b'The server is full')
+                return
+            match = Match(self.__next_match_id, name, self.n_players, self.tick_rate, self.max_score,
+                          **self.game_settings)
+            self.matches[match.match_id] = match
+            self.__next_match_id += 1
+            player_index = match.add_client(connection)
+
+        connection.match = match
+        connection.player_index = player_index
+        game = match.game
+        connection.send(WELCOME_FORMAT.pack(
+            MSG_WELCOME, match.match_id, player_index, len(game.players), game.screen_width, game.screen_height,
+            game.delta_t, _none_to_nan(game.fire_interval), _none_to_nan(game.bullet_lifetime),
+            game.bullets.capacity if game.bullets is not None else 0, game.swept_bullets, self.tick_rate, match.tick))
+
+    def __leave(self, connection):
+        """
+        Removes a client from its match, and removes the match if it has no clients left.
+        """
+        match = connection.match
+        if match is None:
+            return
+        match.remove_client(connection)
+        connection.match = None
+        if match.n_clients() == 0:
+            del self.matches[match.match_id]
+
+
+def _none_to_nan(value):
+    return math.nan if value is None else value
+
+
+def _nan_to_none(value):
+    return None if math.isnan(value) else value
+
+
+class _ClientDatagramProtocol(asyncio.DatagramProtocol):
+    """
+    Receives the UDP datagrams of a client.
+    """
+
+    def __init__(self, receive):
+        self.receive = receive
+
+    def datagram_received(self, data, address):
+        self.receive(data)
+
+
+class GameClient:
+    """
+    Class for representing a client of a GameServer, which plays a player of a match.
+
+    The client keeps a local copy of the match (the `game` attribute), which it steps with its own actions as soon as
+    they are sent, and with the last actions the server received from the other players. Every snapshot received
+    replaces the local state, and the actions the server did not apply yet are applied again on top of it. The
+    distance between the predicted position of the player and its position after each snapshot is recorded in
+    `prediction_errors`.
+
+    Create clients with connect().
+
+    Attributes:
+        - match_id: Identifier of the match. Number.
+        - player_index: Index of the player of the client. Number.
+        - tick_rate: Number of time steps per second of the server. Number.
+        - game: Local copy of the match, with the predicted state. Game object.
+        - tick: Tick of the last snapshot received. Number.
+        - pending: Sequence number and encoded actions of every input not applied by the server yet. Deque of tuples.
+        - prediction_errors: Distance between the predicted position of the player and its position after every
+            snapshot. RollingHistogram object.
+        - n_snapshots: Number of snapshots received. Number.
+        - closed: Whether the connection was closed. Boolean.
+    """
+
+    def __init__(self, welcome, send, close):
+        """
+        Initializes a client that joined a match. Use connect() instead.
+        """
+        (_, self.match_id, self.player_index, n_players, screen_width, screen_height, delta_t, fire_interval,
+         bullet_lifetime, max_bullets, swept_bullets, self.tick_rate, self.tick) = WELCOME_FORMAT.unpack(welcome)
+
+        self.game = Game((screen_width, screen_height), video_mode=False, delta_t=delta_t, max_players=n_players,
+                         swept_bullets=bool(swept_bullets), fire_interval=_nan_to_none(fire_interval),
+                         bullet_lifetime=_nan_to_none(bullet_lifetime), max_bullets=max_bullets or 256)
+        for _ in range(n_players):
+            self.game.add_player()
+        self.pending = collections.deque()
+        self.prediction_errors = RollingHistogram()
+        self.n_snapshots = 0
+        self.closed = False
+
+        self.__send = send
+        self.__close = close
+        self.__sequence = 0
+        self.__actions = [0] * n_players
+        self.__actions_format = struct.Struct('<{}H'.format(n_players))
+
+    @classmethod
+    async def connect(cls, host, port, match='', protocol='tcp', timeout=5.0):
+        """
+        Connects to a server, and joins a match.
+
+        :param host: Address of the server.
+        :type host: String.
+        :param port: Port of the server.
+        :type port: Number.
+        :param match: Name of the match to join. Default value is '' (any match with a free player).
+        :type match: String.
+        :param protocol: 'tcp' or 'udp'. Default value is 'tcp'.
+        :type protocol: String.
+        :param timeout: Time (in seconds) to wait for the server to accept the client. Default value is 5.
+        :type timeout: Number.
+        :return: The client.
+        :rtype: GameClient.
+        """
+        loop = asyncio.get_running_loop()
+        welcome = loop.create_future()
+        client = None
+
+        def receive(message):
+            if client is not None:
+                client.__receive(message)
+            elif not welcome.done() and message[0] in (MSG_WELCOME, MSG_REJECT):
+                welcome.set_result(bytes(message))
+
+        join = bytes([MSG_JOIN]) + match.encode('utf-8')
+        if protocol == 'tcp':
+            reader, writer = await asyncio.open_connection(host, port)
+
+            def send(message):
+                writer.write(LENGTH_FORMAT.pack(len(message)) + message)
+
+            async def read_messages():
+                try:
+                    while True:
+                        length, = LENGTH_FORMAT.unpack(await reader.readexactly(LENGTH_FORMAT.size))
+                        receive(await reader.readexactly(length))
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    if client is not None:
+                        client.closed = True
+
+            reader_task = asyncio.ensure_future(read_messages())
+
+            def close():
+                reader_task.cancel()
+                writer.close()
+
+            send(join)
+        elif protocol == 'udp':
+            transport, _ = await loop.create_datagram_endpoint(lambda: _ClientDatagramProtocol(receive),
+                                                               remote_addr=(host, port))
+            send = transport.sendto
+            close = transport.close
+
+            # Datagrams may be lost, so ask to join until the server answers
+            async def send_joins():
+                while True:
+                    send(join)
+                    await asyncio.sleep(0.25)
+
+            join_task = asyncio.ensure_future(send_joins())
+            welcome.add_done_callback(lambda _: join_task.cancel())
+        else:
+            raise ValueError("Unknown protocol '{}', expected 'tcp' or 'udp'".format(protocol))
+
+        try:
+            message = await asyncio.wait_for(welcome, timeout)
+        except asyncio.TimeoutError:
+            close()
+            raise ConnectionError('The server did not answer')
+        if message[0] == MSG_REJECT:
+            close()
+            raise ConnectionError(message[1:].decode('utf-8', 'replace'))
+
+        client = cls(message, send, close)
+        return client
+
+    def send_actions(self, actions):
+        """
+        Sends the actions of the player to the server, and steps the local copy of the match with them.
+
+        :param actions: The actions, in any form accepted by encode_actions().
+        :type actions: Dictionary, sequence or integer.
+        :return: Sequence number of the input.
+        :rtype: Number.
+        """
+        actions = encode_actions(actions)
+        self.__sequence += 1
+        self.__send(INPUT_FORMAT.pack(MSG_INPUT, self.__sequence, actions))
+        self.pending.append((self.__sequence, actions))
+        self.__predict(actions)
+        return self.__sequence
+
+    def close(self):
+        """
+        Leaves the match, and closes the connection.
+        """
+        if not self.closed:
+            self.__send(bytes([MSG_LEAVE]))
+            self.__close()
+            self.closed = True
+
+    def __predict(self, actions):
+        """
+        Steps the local copy of the match with the actions of the player.
+        """
+        self.__actions[self.player_index] = actions
+        self.game.update_physics(self.__actions)
+
+    def __receive(self, message):
+        """
+        Handles a message of the server.
+        """
+        if message[0] != MSG_SNAPSHOT:
+            return
+        _, tick, last_sequence = SNAPSHOT_FORMAT.unpack_from(message)
+
+        # Datagrams may arrive out of order
+        if tick <= self.tick:
+            return
+        self.tick = tick
+        self.n_snapshots += 1
+
+        # Restore the state of the server, and apply the inputs it did not apply yet
+        actions_size = self.__actions_format.size
+        self.__actions = list(self.__actions_format.unpack_from(message, SNAPSHOT_FORMAT.size))
+        player = self.game.players[self.player_index]
+        predicted = player.position[:]
+        self.game.restore(np.frombuffer(message, dtype='<f8', offset=SNAPSHOT_FORMAT.size + actions_size))
+        while self.pending and self.pending[0][0] <= last_sequence:
+            self.pending.popleft()
+        for _, actions in self.pending:
+            self.__predict(actions)
+        self.prediction_errors.add(math.hypot(player.position[0] - predicted[0], player.position[1] - predicted[1]))
+
+
+async def run_bot(host, port, factory=create_simple_ai_action_generator, match='', protocol='tcp', n_ticks=600):
+    """
+    Connects a client played by an AI action generator to a server, and plays for some time.
+
+    :param host: Address of the server.
+    :type host: String.
+    :param port: Port of the server.
+    :type port: Number.
+    :param factory: Action generator factory (a callable that returns an action generator when called without
+        arguments). Default value is create_simple_ai_action_generator.
+    :type factory: Callable.
+    :param match: Name of the match to join. Default value is '' (any match with a free player).
+    :type match: String.
+    :param protocol: 'tcp' or 'udp'. Default value is 'tcp'.
+    :type protocol: String.
+    :param n_ticks: Number of inputs to send, at the tick rate of the server. Default value is 600.
+    :type n_ticks: Number.
+    :return: The client, closed.
+    :rtype: GameClient.
+    """
+    client = await GameClient.connect(host, port, match, protocol)
+    generator = factory()
+    loop = asyncio.get_running_loop()
+    period = 1 / client.tick_rate
+    next_tick = loop.time()
+    try:
+        for _ in range(n_ticks):
+            if client.closed:
+                break
+            client.send_actions(generator(client.player_index, client.game))
+            next_tick += period
+            await asyncio.sleep(max(next_tick - loop.time(), 0))
+    finally:
+        client.close()
+    return client
+
+
+async def serve(args):
+    """
+    Runs a server, and prints its tick report every few seconds.
+    """
+    server = GameServer(args.host, args.port, args.tick_rate, args.players, args.max_matches)
+    await server.start()
+    print('Listening on {}:{} (TCP and UDP)'.format(server.host, server.port))
+    try:
+        while True:
+            await asyncio.sleep(args.report_interval)
+            report = server.get_tick_report()
+            print('{} matches, {} clients, tick p50 {:.3f} ms, p99 {:.3f} ms (budget {:.3f} ms), {} overruns'.format(
+                report['matches'], report['clients'], 1e3 * (report['tick_time']['p50'] or 0),
+                1e3 * (report['tick_time']['p99'] or 0), 1e3 * report['budget'], report['overruns']))
+    finally:
+        await server.close()
+
+
+async def run_bots(args):
+    """
+    Runs bots against a server, and prints how well their predictions did.
+    """
+    clients = await asyncio.gather(*[run_bot(args.host, args.port, BOT_AIS[args.ai], args.match, args.protocol,
+                                             args.ticks) for _ in range(args.bots)])
+    for client in clients:
+        errors = client.prediction_errors.summary()
+        print('Match {} player {}: {} snapshots, scores {}, prediction error mean {:.2f} p99 {:.2f}'.format(
+            client.match_id, client.player_index, client.n_snapshots, [p.score for p in client.game.players],
+            errors['mean'] or 0, errors['p99'] or 0))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    serve_parser = subparsers.add_parser('serve', help='Run a server')
+    serve_parser.add_argument('--host', default='127.0.0.1')
+    serve_parser.add_argument('--port', type=int, default=5000)
+    serve_parser.add_argument('--tick-rate', type=int, default=120)
+    serve_parser.add_argument('--players', type=int, default=2, help='Players in each match')
+    serve_parser.add_argument('--max-matches', type=int, default=64)
+    serve_parser.add_argument('--report-interval', type=float, default=5.0, help='Seconds in between reports')
+
+    bots_parser = subparsers.add_parser('bots', help='Play against a server with AI clients')
+    bots_parser.add_argument('--host', default='127.0.0.1')
+    bots_parser.add_argument('--port', type=int, default=5000)
+    bots_parser.add_argument('--protocol', choices=('tcp', 'udp'), default='tcp')
+    bots_parser.add_argument('--bots', type=int, default=2, help='Number of clients')
+    bots_parser.add_argument('--ticks', type=int, default=600, help='Inputs sent by each client')
+    bots_parser.add_argument('--ai', choices=sorted(BOT_AIS), default='simple')
+    bots_parser.add_argument('--match', default='', help='Name of the match to join')
+
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args) if args.command == 'serve' else run_bots(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,201 @@
+"""
+Forward simulation of games, and an AI that plans by simulating the outcome of its possible actions.
+
+Example:
+    get_lookahead_ai_action = create_lookahead_ai_action_generator()
+    game.update_physics([get_human_player_action(game), get_lookahead_ai_action(1, game)])
+
+Simulations run on a separate headless copy of the game (see create_simulation_game()), which is brought to the state
+of the live game with Game.snapshot() and Game.restore(), so the live game, its players and its surfaces are never
+touched or copied.
+"""
+import numpy as np
+
+from move_n_shoot import ACTION_CH_DOWN
+from move_n_shoot import ACTION_CH_LEFT
+from move_n_shoot import ACTION_CH_RIGHT
+from move_n_shoot import ACTION_CH_UP
+from move_n_shoot import ACTION_DOWN
+from move_n_shoot import ACTION_LEFT
+from move_n_shoot import ACTION_RIGHT
+from move_n_shoot import ACTION_SHOOT
+from move_n_shoot import ACTION_UP
+from move_n_shoot import Game
+from move_n_shoot import decode_actions
+from move_n_shoot import get_nearest_opponent
+
+
+def create_simulation_game(game):
+    """
+    Creates a headless game with the same settings and players as another one, and in the same state.
+
+    :param game: The game to copy.
+    :type game: Game.
+    :return: The new game.
+    :rtype: Game.
+    """
+    simulation = Game(screen_sz=(game.screen_width, game.screen_height), video_mode=False, delta_t=game.delta_t,
+                      max_players=None, swept_bullets=game.swept_bullets, fire_interval=game.fire_interval,
+                      bullet_lifetime=game.bullet_lifetime,
+                      max_bullets=game.bullets.capacity if game.bullets is not None else 256,
+                      world_sz=(game.world_width, game.world_height), obstacles=game.obstacles)
+    for player in game.players:
+        simulation.add_player(team=player.team)
+    simulation.restore(game.snapshot(rng=False))
+    return simulation
+
+
+def simulate_ahead(game, action_sequences, evaluate=None, simulation=None):
+    """
+    Simulates several possible futures of a game, without changing it.
+
+    Every action sequence is played from the current state of the game, on a headless copy of it. Numpy's global
+    random number generator (used by the physics) is restored when all simulations are done, so simulating does not
+    change the outcome of the live game either.
+
+    :param game: The game to simulate.
+    :type game: Game.
+    :param action_sequences: Action sequences to simulate. Each sequence holds the actions of all players for every
+        time step, in any of the forms accepted by Game.update_physics() (e.g. an array of encoded actions with shape
+        (n_steps, n_players)).
+    :type action_sequences: Iterable.
+    :param evaluate: Called with the simulated game at the end of each sequence. Its return values are returned.
+        Default value is a function that returns the score of every player.
+    :type evaluate: Callable.
+    :param simulation: Headless copy of the game to simulate on (see create_simulation_game()). Reusing it between
+        calls saves the cost of creating it. Default value is a new copy.
+    :type simulation: Game.
+    :return: The value returned by `evaluate` for each action sequence.
+    :rtype: List.
+    """
+    if evaluate is None:
+        evaluate = get_scores
+    if simulation is None:
+        simulation = create_simulation_game(game)
+
+    rng_state = np.random.get_state()
+    snapshot = game.snapshot(rng=False)
+    results = []
+    try:
+        for actions in action_sequences:
+            simulation.restore(snapshot)
+            for step_actions in actions:
+                simulation.update_physics(step_actions)
+            results.append(evaluate(simulation))
+    finally:
+        np.random.set_state(rng_state)
+    return results
+
+
+def get_scores(game):
+    """
+    Returns the score of every player of a game.
+
+    :param game: The game.
+    :type game: Game.
+    :return: Scores.
+    :rtype: List.
+    """
+    return [player.score for player in game.players]
+
+
+# Movement actions considered by the lookahead AI: standing still, and the 8 directions
+_MOVEMENTS = (0, ACTION_UP, ACTION_DOWN, ACTION_LEFT, ACTION_RIGHT, ACTION_UP | ACTION_LEFT, ACTION_UP | ACTION_RIGHT,
+              ACTION_DOWN | ACTION_LEFT, ACTION_DOWN | ACTION_RIGHT)
+
+
+def create_lookahead_ai_action_generator(horizon=48, replan_interval=8, encoded=False):
+    """
+    Creates an action generator for a lookahead AI player.
+
+    It's necessary to have this layer of abstraction above the get_lookahead_ai_action function, so that two instances
+    of this function can be used in parallel (otherwise both would share the same plan and simulation).
+    :param horizon: Number of time steps simulated for each candidate action. Default value is 48 (0.4 seconds).
+    :param replan_interval: Number of time steps in between two plans. The chosen action is kept in between. Default
+    value is 8.
+    :param encoded: Whether the generated actions are encoded as integers (see encode_actions()) instead of
+    dictionaries. Default value is False.
+    :return: An instance of the get_lookahead_ai_action function.
+    """
+
+    def get_lookahead_ai_action(player_index, game_instance):
+        """
+        Returns the actions for a lookahead AI player.
+
+        Every `replan_interval` time steps, the AI simulates `horizon` time steps ahead (see simulate_ahead()) for
+        each of its candidate actions (standing still or moving in one of 8 directions, shooting or not), assuming that
+        the other players take no action, and picks the action whose future is best: the one where it gains the most
+        points relative to its opponents and, among those, the one where it ends farthest from the opponents' bullets.
+        The crosshair always follows the nearest opponent, like in the get_simple_ai_action implementation.
+
+        :param player_index: The index of the player that this AI will play.
+        :type player_index: Number
+        :param game_instance: The Game instance that the player belongs to.
+        :type game_instance: Game
+        :return: Dictionary of actions that this player will take this turn. Keys are the actions, values are booleans
+            representing whether or not that action will be taken this turn. Encoded as an integer, if the generator
+            was created with encoded=True.
+        :rtype: Dictionary or integer
+        """
+        i = player_index  # shorthand
+
+        # Make crosshair follow opponent (the mouse is not used)
+        opponent_position = get_nearest_opponent(game_instance, i).position
+        crosshair = game_instance.players[i].crosshair
+        aim = 0
+        if opponent_position[0] < crosshair[0]:
+            aim |= ACTION_CH_LEFT
+        if opponent_position[0] > crosshair[0]:
+            aim |= ACTION_CH_RIGHT
+        if opponent_position[1] < crosshair[1]:
+            aim |= ACTION_CH_UP
+        if opponent_position[1] > crosshair[1]:
+            aim |= ACTION_CH_DOWN
+
+        # Plan again when it is time to
+        if get_lookahead_ai_action.steps_to_replan <= 0:
+            simulation = get_lookahead_ai_action.simulation
+            if simulation is None or len(simulation.players) != len(game_instance.players):
+                simulation = get_lookahead_ai_action.simulation = create_simulation_game(game_instance)
+
+            candidates = [movement | shoot for shoot in (0, ACTION_SHOOT) for movement in _MOVEMENTS]
+            sequences = []
+            for candidate in candidates:
+                step_actions = [0] * len(game_instance.players)
+                step_actions[i] = candidate | aim
+                sequences.append([step_actions] * horizon)
+
+            values = simulate_ahead(game_instance, sequences, lambda game: _evaluate(game, i), simulation)
+            get_lookahead_ai_action.plan = candidates[max(range(len(candidates)), key=lambda k: values[k])]
+            get_lookahead_ai_action.steps_to_replan = replan_interval
+
+        get_lookahead_ai_action.steps_to_replan -= 1
+        actions = get_lookahead_ai_action.plan | aim
+
+        return actions if encoded else decode_actions(actions)
+
+    # Initialize the plan (encoded as an integer), and the game used to simulate
+    get_lookahead_ai_action.plan = 0
+    get_lookahead_ai_action.steps_to_replan = 0
+    get_lookahead_ai_action.simulation = None
+
+    return get_lookahead_ai_action
+
+
+def _evaluate(game, player_index):
+    """
+    Values the state of a simulated game for a player: its score minus the best score of its opponents, and then the
+    distance to the nearest bullet of an opponent (which is better when larger).
+    """
+    player = game.players[player_index]
+    opponents = [other for other in game.players if player.is_opponent(other)]
+    margin = player.score - max([other.score for other in opponents], default=0)
+
+    bullets = [other.bullet.position for other in opponents if other.bullet.was_shot]
+    if game.bullets is not None:
+        live = game.bullets.live_indices()
+        is_opponent = np.array([player.is_opponent(other) for other in game.players])
+        bullets.extend(game.bullets.position[live[is_opponent[game.bullets.owner[live]]]].tolist())
+    distance = min([(x - player.position[0]) ** 2 + (y - player.position[1]) ** 2 for x, y in bullets],
+                   default=float('inf'))
+    return margin, distance
@@ -0,0 +1,507 @@
+"""
+Deterministic recording and playback of headless matches.
+
+Usage:
+    python replay.py info FILE
+    python replay.py verify FILE [--start TICK] [--end TICK]
+    python replay.py play FILE [--start TICK] [--speed S]
+    python replay.py render FILE [--output VIDEO] [--start TICK] [--speed S]
+
+Example (from Python):
+    with ReplayRecorder('match.mnsr', game, seed=0) as recorder:
+        while max(player.score for player in game.players) < 3:
+            recorder.step([generator(i, game) for i, generator in enumerate(generators)])
+
+    player = ReplayPlayer(Replay('match.mnsr'))
+    player.seek(100000)
+    player.play(speed=4)
+
+File format (little-endian): a header (see HEADER_FORMAT), the team of each player (int32, -1 for no team), and then a
+sequence of chunks of the same size. Every chunk starts with a keyframe, which holds the complete game state (and the
+state of numpy's global random number generator) before its first tick, followed by `keyframe_interval` tick records.
+A tick record holds the encoded actions of every player (see move_n_shoot.encode_actions()) and a CRC32 hash of the
+game state after the tick. Since all records have the same width, the file is read through a memory map, and any tick
+is found without reading the ones before it. The last chunk is padded with empty records.
+
+Only the actions are needed to re-simulate a match: the keyframes let playback start from any tick by simulating at
+most `keyframe_interval` ticks, and the hashes catch any divergence from the recorded match.
+
+Limitations: games with a bullet pool (see Game's `fire_interval`), obstacles or a world larger than the screen cannot
+be recorded, and the 'ch_mouse' action, which reads the live mouse, is cleared from the actions before they are recorded
+and played (so while recording, the crosshair does not follow the mouse, as in headless games).
+"""
+import argparse
+import struct
+import zlib
+
+import numpy as np
+
+from capture import FrameCapture
+from move_n_shoot import ACTION_CH_MOUSE
+from move_n_shoot import Game
+from move_n_shoot import OBSERVATION_FIELDS
+from move_n_shoot import encode_action_array
+from move_n_shoot import encode_actions
+
+
+# Magic string, format version, number of players, keyframe interval, number of ticks, seed (-1 if unknown), duration
+# of a time step, screen width, screen height and whether bullets are swept
+HEADER_FORMAT = '<4sHHIQqdIIB'
+HEADER_MAGIC = b'MNSR'
+HEADER_VERSION = 1
+
+# Columns of the game state stored in keyframes and hashed on every tick. Same fields as in Game.observe(), but in
+# double precision
+STATE_FIELDS = OBSERVATION_FIELDS
+
+
+def get_record_dtype(n_players):
+    """
+    Returns the numpy dtype of a tick record.
+
+    :param n_players: Number of players in the game.
+    :type n_players: Number.
+    :return: Dtype with fields 'actions' (encoded actions of every player) and 'hash' (hash of the state after the
+        tick).
+    :rtype: Numpy dtype.
+    """
+    return np.dtype([('actions', '<u2', (n_players,)), ('hash', '<u4')])
+
+
+def get_keyframe_dtype(n_players):
+    """
+    Returns the numpy dtype of a keyframe.
+
+    :param n_players: Number of players in the game.
+    :type n_players: Number.
+    :return: Dtype with fields 'tick' (index of the next tick), 'state' (game state, see get_state()), and 'rng_key',
+        'rng_pos', 'rng_has_gauss', 'rng_gauss' (state of numpy's global Mersenne Twister generator).
+    :rtype: Numpy dtype.
+    """
+    return np.dtype([('tick', '<u8'), ('state', '<f8', (n_players, len(STATE_FIELDS))), ('rng_key', '<u4', (624,)),
+                     ('rng_pos', '<i8'), ('rng_has_gauss', '<i8'), ('rng_gauss', '<f8')])
+
+
+def get_chunk_dtype(n_players, keyframe_interval):
+    """
+    Returns the numpy dtype of a chunk: a keyframe followed by `keyframe_interval` tick records.
+    """
+    return np.dtype([('keyframe', get_keyframe_dtype(n_players)),
+                     ('records', get_record_dtype(n_players), (keyframe_interval,))])
+
+
+def get_state(game, out):
+    """
+    Writes the state of every player of a game to an array, with the columns given by STATE_FIELDS (this is the
+    snapshot of the game without the random number generator, see Game.snapshot()).
+
+    :param game: The game.
+    :type game: Game.
+    :param out: Where to write the state.
+    :type out: Array of float64 with shape (n_players, len(STATE_FIELDS)).
+    :return: `out`.
+    :rtype: Array.
+    """
+    game.snapshot(out.reshape(-1), rng=False)
+    return out
+
+
+def set_state(game, state):
+    """
+    Sets the state of every player of a game from an array written by get_state().
+
+    :param game: The game.
+    :type game: Game.
+    :param state: The state.
+    :type state: Array with shape (n_players, len(STATE_FIELDS)).
+    """
+    game.restore(np.ravel(state))
+
+
+class ReplayDivergenceError(Exception):
+    """
+    Raised when a re-simulated tick does not lead to the state recorded in the replay.
+
+    Attributes:
+        - tick: Index of the first tick whose state differs. Number.
+    """
+
+    def __init__(self, tick):
+        super().__init__('The simulation diverged from the replay at tick {}'.format(tick))
+        self.tick = tick
+
+
+class ReplayRecorder:
+    """
+    Class for recording a match to a replay file, while playing it.
+
+    Every call to step() runs one time step of the game (with Game.update_physics()) and records it. Records are
+    buffered a chunk at a time, so recording costs one write per `keyframe_interval` ticks.
+
+    Attributes:
+        - game: The game being recorded. Game object.
+        - path: Path of the replay file. String.
+        - seed: Seed given to numpy's global random number generator when the recording started, or None. Number.
+        - keyframe_interval: Number of ticks in between keyframes. Number.
+        - n_ticks: Number of ticks recorded so far. Number.
+    """
+
+    def __init__(self, path, game, seed=None, keyframe_interval=1024):
+        """
+        Creates a replay file, and starts recording a game from its current state.
+
+        :param path: Path of the replay file. An existing file is overwritten.
+        :type path: String.
+        :param game: The game to record. Players cannot be added to it while recording.
+        :type game: Game.
+        :param seed: If not None, numpy's global random number generator (used by the game's physics) is seeded with
+            it before recording, and the seed is saved in the header. Default value is None.
+        :type seed: Number.
+        :param keyframe_interval: Number of ticks in between keyframes. Shorter intervals make seeking faster, but the
+            file bigger. Default value is 1024.
+        :type keyframe_interval: Number.
+        """
+        if game.bullets is not None:
+            raise ValueError('Games with a bullet pool cannot be recorded')
+        world_sz = (game.world_width, game.world_height)
+        if game.obstacles is not None or world_sz != (game.screen_width, game.screen_height):
+            raise ValueError('Games with obstacles or a world larger than the screen cannot be recorded')
+        if not all(player.team is None or (isinstance(player.team, int) and player.team >= 0)
+                   for player in game.players):
+            raise ValueError('Only games where all teams are non-negative integers (or None) can be recorded')
+
+        if seed is not None:
+            np.random.seed(seed)
+
+        self.game = game
+        self.path = path
+        self.seed = seed
+        self.keyframe_interval = keyframe_interval
+        self.n_ticks = 0
+
+        n_players = len(game.players)
+        self.__chunk = np.zeros((), dtype=get_chunk_dtype(n_players, keyframe_interval))
+        self.__state = np.zeros((n_players, len(STATE_FIELDS)))
+
+        self.__file = open(path, 'wb')
+        self.__write_header()
+        teams = [-1 if player.team is None else player.team for player in game.players]
+        self.__file.write(np.array(teams, dtype='<i4').tobytes())
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def step(self, player_actions):
+        """
+        Runs and records one time step of the game. The 'ch_mouse' action is cleared first, since it depends on the live
+        mouse.
+
+        :param player_actions: Actions of each player, in any of the forms accepted by Game.update_physics().
+        :type player_actions: List, or array.
+        """
+        tick_in_chunk = self.n_ticks % self.keyframe_interval
+        if tick_in_chunk == 0:
+            self.__write_keyframe()
+
+        if isinstance(player_actions, np.ndarray) and player_actions.ndim == 2:
+            codes = [code & ~ACTION_CH_MOUSE for code in encode_action_array(player_actions).tolist()]
+        else:
+            codes = [encode_actions(actions) & ~ACTION_CH_MOUSE for actions in player_actions]
+
+        self.game.update_physics(codes)
+
+        record = self.__chunk['records'][tick_in_chunk]
+        record['actions'] = codes
+        record['hash'] = zlib.crc32(get_state(self.game, self.__state))
+        self.n_ticks += 1
+
+        if tick_in_chunk == self.keyframe_interval - 1:
+            self.__flush_chunk()
+
+    def close(self):
+        """
+        Writes the ticks that are still buffered (padding the last chunk), and closes the file.
+        """
+        if self.__file.closed:
+            return
+        n_buffered = self.n_ticks % self.keyframe_interval
+        if n_buffered > 0:
+            self.__chunk['records'][n_buffered:] = 0
+            self.__flush_chunk()
+        self.__file.close()
+
+    def __write_header(self):
+        """
+        Writes the header at the start of the file (again, to update the number of ticks).
+        """
+        game = self.game
+        header = struct.pack(HEADER_FORMAT, HEADER_MAGIC, HEADER_VERSION, len(game.players), self.keyframe_interval,
+                             self.n_ticks, -1 if self.seed is None else self.seed, game.delta_t, game.screen_width,
+                             game.screen_height, game.swept_bullets)
+        self.__file.seek(0)
+        self.__file.write(header)
+
+    def __write_keyframe(self):
+        """
+        Saves the current state of the game and of the random number generator to the keyframe of the current chunk.
+        """
+        keyframe = self.__chunk['keyframe']
+        keyframe['tick'] = self.n_ticks
+        get_state(self.game, keyframe['state'])
+        _, keyframe['rng_key'], keyframe['rng_pos'], keyframe['rng_has_gauss'], keyframe['rng_gauss'] = \
+            np.random.get_state()
+
+    def __flush_chunk(self):
+        """
+        Appends the current chunk to the file, and updates the number of ticks in the header, so that the file is
+        readable even if the recording is never closed.
+        """
+        self.__file.seek(0, 2)
+        self.__file.write(self.__chunk.tobytes())
+        self.__write_header()
+        self.__file.flush()
+
+
+class Replay:
+    """
+    Class for reading a replay file. The file is memory-mapped, so it is never loaded into memory as a whole.
+
+    Attributes:
+        - path: Path of the replay file. String.
+        - n_players: Number of players in the game. Number.
+        - n_ticks: Number of recorded ticks. Number.
+        - keyframe_interval: Number of ticks in between keyframes. Number.
+        - seed: Seed of numpy's global random number generator when the recording started, or None. Number.
+        - delta_t: Duration of a time step, in seconds. Number.
+        - screen_sz: Width and height of the game's screen. Tuple with two elements.
+        - swept_bullets: Whether the game was created with swept_bullets. Boolean.
+        - teams: Team of each player (None for no team). List.
+        - chunks: Memory map of all chunks of the file. Structured array (see get_chunk_dtype()).
+    """
+
+    def __init__(self, path):
+        """
+        Opens a replay file.
+
+        :param path: Path of the replay file.
+        :type path: String.
+        """
+        self.path = path
+        header_size = struct.calcsize(HEADER_FORMAT)
+        with open(path, 'rb') as f:
+            header = f.read(header_size)
+            (magic, version, self.n_players, self.keyframe_interval, self.n_ticks, seed, self.delta_t, width, height,
+             swept_bullets) = struct.unpack(HEADER_FORMAT, header)
+            if magic != HEADER_MAGIC or version != HEADER_VERSION:
+                raise ValueError('{} is not a replay file of a supported version'.format(path))
+            teams = np.frombuffer(f.read(4 * self.n_players), dtype='<i4').tolist()
+
+        self.seed = None if seed == -1 else seed
+        self.screen_sz = (width, height)
+        self.swept_bullets = bool(swept_bullets)
+        self.teams = [None if team == -1 else team for team in teams]
+
+        n_chunks = -(-self.n_ticks // self.keyframe_interval)
+        chunk_dtype = get_chunk_dtype(self.n_players, self.keyframe_interval)
+        if n_chunks == 0:
+            self.chunks = np.zeros(0, dtype=chunk_dtype)
+        else:
+            self.chunks = np.memmap(path, dtype=chunk_dtype, mode='r', offset=header_size + 4 * self.n_players,
+                                    shape=(n_chunks,))
+
+    def __len__(self):
+        return self.n_ticks
+
+    def get_record(self, tick):
+        """
+        Returns the record of a tick.
+
+        :param tick: Index of the tick.
+        :type tick: Number.
+        :return: Record with fields 'actions' and 'hash' (see get_record_dtype()).
+        :rtype: Numpy structured scalar.
+        """
+        if not 0 <= tick < self.n_ticks:
+            raise IndexError('Tick {} is not in the replay, which has {} ticks'.format(tick, self.n_ticks))
+        return self.chunks[tick // self.keyframe_interval]['records'][tick % self.keyframe_interval]
+
+    def get_keyframe(self, tick):
+        """
+        Returns the last keyframe at or before a tick.
+
+        :param tick: Index of the tick.
+        :type tick: Number.
+        :return: Keyframe with the state of the game before tick number keyframe['tick'] (see get_keyframe_dtype()).
+        :rtype: Numpy structured scalar.
+        """
+        chunk = min(max(tick, 0) // self.keyframe_interval, len(self.chunks) - 1)
+        return self.chunks[chunk]['keyframe']
+
+    def make_game(self, video_mode=False, player_colors=None, **kwargs):
+        """
+        Creates a game with the same settings and players as the recorded one, in the state before the first tick.
+
+        :param video_mode: Whether the game has graphical display. Default value is False.
+        :type video_mode: Boolean.
+        :param player_colors: Color of each player. Default value is None (default colors).
+        :type player_colors: List.
+        :param kwargs: Other arguments for the Game constructor (e.g. offscreen or max_fps).
+        :return: The new game.
+        :rtype: Game.
+        """
+        game = Game(screen_sz=self.screen_sz, video_mode=video_mode, delta_t=self.delta_t,
+                    swept_bullets=self.swept_bullets, max_players=self.n_players, **kwargs)
+        for i, team in enumerate(self.teams):
+            game.add_player(player_color=None if player_colors is None else player_colors[i], team=team)
+        if self.n_ticks > 0:
+            restore_keyframe(game, self.get_keyframe(0))
+        return game
+
+
+def restore_keyframe(game, keyframe):
+    """
+    Sets the state of a game, and of numpy's global random number generator, to the ones saved in a keyframe.
+
+    :param game: The game.
+    :type game: Game.
+    :param keyframe: The keyframe.
+    :type keyframe: Numpy structured scalar (see get_keyframe_dtype()).
+    """
+    set_state(game, keyframe['state'])
+    np.random.set_state(('MT19937', np.array(keyframe['rng_key'], dtype=np.uint32), int(keyframe['rng_pos']),
+                         int(keyframe['rng_has_gauss']), float(keyframe['rng_gauss'])))
+
+
+class ReplayPlayer:
+    """
+    Class for re-simulating a recorded match, with random access to any tick.
+
+    Attributes:
+        - replay: The replay being played. Replay object.
+        - game: The game where the match is re-simulated. Game object.
+        - tick: Index of the next tick to simulate. Number.
+        - verify: Whether the state after every tick is checked against the recorded hash. Boolean.
+    """
+
+    def __init__(self, replay, game=None, verify=True):
+        """
+        Prepares the playback of a replay, from its first tick.
+
+        :param replay: The replay to play.
+        :type replay: Replay.
+        :param game: The game where the match is re-simulated. It must have the same settings and players as the
+            recorded game. Default value is a new headless game (see Replay.make_game()).
+        :type game: Game.
+        :param verify: Whether to check the state after every tick against the recorded hash. Default value is True.
+        :type verify: Boolean.
+        """
+        self.replay = replay
+        self.game = game if game is not None else replay.make_game()
+        self.verify = verify
+        self.tick = 0
+        self.__state = np.zeros((replay.n_players, len(STATE_FIELDS)))
+        if replay.n_ticks > 0:
+            restore_keyframe(self.game, replay.get_keyframe(0))
+
+    def step(self):
+        """
+        Simulates the next tick. The 'ch_mouse' action is cleared from the recorded actions, as when recording.
+
+        :return: False if the replay was already over, True otherwise.
+        :rtype: Boolean.
+        """
+        if self.tick >= self.replay.n_ticks:
+            return False
+
+        record = self.replay.get_record(self.tick)
+        self.game.update_physics([code & ~ACTION_CH_MOUSE for code in record['actions'].tolist()])
+        if self.verify and zlib.crc32(get_state(self.game, self.__state)) != int(record['hash']):
+            raise ReplayDivergenceError(self.tick)
+        self.tick += 1
+        return True
+
+    def seek(self, tick):
+        """
+        Moves to a tick, by restoring the last keyframe before it and simulating the ticks in between.
+
+        :param tick: Index of the next tick to simulate. Use the number of ticks of the replay to go to the end.
+        :type tick: Number.
+        """
+        tick = min(max(tick, 0), self.replay.n_ticks)
+        if not self.tick <= tick < self.tick + self.replay.keyframe_interval:
+            keyframe = self.replay.get_keyframe(tick)
+            restore_keyframe(self.game, keyframe)
+            self.tick = int(keyframe['tick'])
+        while self.tick < tick:
+            self.step()
+
+    def play(self, speed=1.0, end=None):
+        """
+        Plays the replay until `end`, or until the user closes the window. If the game has video, a frame is drawn (at
+        most at the game's max_fps) after every `speed` times the number of ticks that fit in a frame, so the match is
+        shown `speed` times faster than real time. Headless games are simulated as fast as possible.
+
+        :param speed: Playback speed, relative to real time. Default value is 1.
+        :type speed: Number.
+        :param end: Index of the tick where playback stops. Default value is the end of the replay.
+        :type end: Number.
+        """
+        end = self.replay.n_ticks if end is None else min(end, self.replay.n_ticks)
+        if not self.game.video_mode:
+            while self.tick < end:
+                self.step()
+            return
+
+        ticks_per_frame = max(1, round(speed / (self.game.max_fps * self.game.delta_t))) if self.game.max_fps else 1
+        while self.tick < end:
+            self.game.handle_events()
+            if self.game.quit_requested:
+                return
+            for _ in range(min(ticks_per_frame, end - self.tick)):
+                self.step()
+            self.game.draw_frame()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Inspect, verify, watch or render a replay file.')
+    parser.add_argument('command', choices=['info', 'verify', 'play', 'render'])
+    parser.add_argument('path', help='replay file')
+    parser.add_argument('--start', type=int, default=0, help='first tick')
+    parser.add_argument('--end', type=int, default=None, help='last tick (default: end of the replay)')
+    parser.add_argument('--speed', type=float, default=1.0, help='playback speed, relative to real time')
+    parser.add_argument('--output', default='replay.y4m',
+                        help='video (.y4m or raw RGB24) or pattern of PNG files written by render')
+    args = parser.parse_args()
+
+    replay = Replay(args.path)
+    if args.command == 'info':
+        print('{} players, {} ticks ({:.1f} s of game time), keyframe every {} ticks, seed {}'.format(
+            replay.n_players, replay.n_ticks, replay.n_ticks * replay.delta_t, replay.keyframe_interval, replay.seed))
+    elif args.command == 'verify':
+        player = ReplayPlayer(replay)
+        player.seek(args.start)
+        player.play(end=args.end)
+        print('OK: ticks {} to {} match the recorded states'.format(args.start, player.tick))
+    elif args.command == 'play':
+        player = ReplayPlayer(replay, replay.make_game(video_mode=True))
+        player.seek(args.start)
+        player.play(speed=args.speed, end=args.end)
+    else:
+        # Frames are drawn offscreen as fast as they are written, so none is dropped
+        game = replay.make_game(video_mode=True, offscreen=True)
+        player = ReplayPlayer(replay, game)
+        player.seek(args.start)
+        game.capture = FrameCapture(args.output, fps=game.max_fps, policy='wait')
+        try:
+            player.play(speed=args.speed, end=args.end)
+        finally:
+            game.capture.close()
+        print('Wrote {} frames of ticks {} to {} to {}'.format(game.capture.n_written, args.start, player.tick,
+                                                               game.capture.output))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,319 @@
+"""
+Compact binary serialization of the state of a game, with quantized values and delta encoding.
+
+Example:
+    encoder = StateEncoder(server_game)
+    decoder = StateDecoder(client_game)
+    message = encoder.encode(tick)           # On every tick
+    tick = decoder.apply(message)            # On the other side, restores the state into client_game
+    encoder.acknowledge(tick)                # Once the other side confirms it received the tick
+
+The state is the one saved by Game.snapshot() without the random number generator. Every value is quantized to an
+integer (see get_quantization_scales(), e.g. positions to 1/16 of a pixel) and, if the receiver acknowledged an earlier
+state, only the difference against it is sent: a bit mask of the values that changed, and the change of each of them
+in the smallest of 1, 2 or 4 bytes that holds it. A tick of a two-player game takes a few dozen bytes, where its
+pickled players take several hundred.
+
+Messages start with a header (HEADER_FORMAT, little-endian): format version, tick, tick of the baseline (NO_BASELINE
+for full states), and the number of changes stored in 1, 2 and 4 bytes. Then come the bit mask of the changed values,
+a bit mask of the changes that take more than 1 byte, a bit mask of those (among them) that take 4 bytes, and the
+changes of each size in order.
+"""
+import struct
+
+import numpy as np
+
+from move_n_shoot import OBSERVATION_FIELDS
+
+
+# Version of the format, stored in every message
+FORMAT_VERSION = 1
+
+# Header of every message: version, tick, baseline tick, and the number of changes stored in 1, 2 and 4 bytes
+HEADER_FORMAT = struct.Struct('<BIIIII')
+
+# Baseline tick of messages that hold the full state
+NO_BASELINE = 0xFFFFFFFF
+
+# Quantized value of infinity (e.g. the lifetime of bullets that never expire)
+QUANTIZED_INFINITY = np.iinfo(np.int32).max
+
+# Number of quantization steps per unit of every field of the players (see OBSERVATION_FIELDS), and of the bullet pool
+PLAYER_FIELD_SCALES = {'position': 16, 'velocity': 16, 'acceleration': 16, 'crosshair': 16, 'bullet_position': 16,
+                       'bullet_velocity': 16, 'bullet_was_shot': 1, 'score': 1}
+POOL_FIELD_SCALES = (('position', 2, 16), ('velocity', 2, 16), ('age', 1, 1000), ('lifetime', 1, 1000),
+                     ('owner', 1, 1), ('alive', 1, 1))
+COOLDOWN_SCALE = 1000
+
+
+def get_quantization_scales(game):
+    """
+    Returns the number of quantization steps per unit of every value of the state of a game. Positions and velocities
+    are stored in 1/16 of a pixel (per second), times in milliseconds, and flags, scores and owners as they are.
+
+    :param game: The game.
+    :type game: Game.
+    :return: Scale of every value of Game.snapshot(rng=False).
+    :rtype: Array of float64.
+    """
+    player_scales = [PLAYER_FIELD_SCALES[field.rsplit('_', 1)[0] if field.endswith(('_x', '_y')) else field]
+                     for field in OBSERVATION_FIELDS]
+    scales = player_scales * len(game.players)
+    if game.bullets is not None:
+        for _, n_columns, scale in POOL_FIELD_SCALES:
+            scales += [scale] * (n_columns * game.bullets.capacity)
+        scales += [COOLDOWN_SCALE] * len(game.players)
+    return np.array(scales, dtype=float)
+
+
+class _StateHistory:
+    """
+    The last quantized states sent or received, by tick, in a ring buffer.
+    """
+
+    def __init__(self, size, n_values):
+        self.states = np.zeros((size, n_values), dtype=np.int32)
+        self.ticks = np.full(size, -1, dtype=np.int64)
+
+    def get(self, tick):
+        slot = tick % len(self.ticks)
+        return self.states[slot] if self.ticks[slot] == tick else None
+
+    def add(self, tick):
+        slot = tick % len(self.ticks)
+        self.ticks[slot] = tick
+        return self.states[slot]
+
+
+class StateEncoder:
+    """
+    Class for encoding the state of a game on every tick, against the last state acknowledged by the receiver.
+
+    The encoder keeps the last `history` states it encoded. A state is encoded against the acknowledged one if it is
+    still in the history, and in full otherwise (e.g. before the first acknowledgement). All buffers are allocated
+    once, so encoding only allocates a few small temporary arrays.
+
+    Attributes:
+        - game: The game whose state is encoded. Game object.
+        - scales: Number of quantization steps per unit of every value (see get_quantization_scales()). Array.
+        - baseline_tick: Last tick acknowledged by the receiver, or None. Number.
+    """
+
+    def __init__(self, game, history=64):
+        """
+        Initializes an encoder. The game must keep the same players and settings while it is used.
+
+        :param game: The game whose state is encoded.
+        :type game: Game.
+        :param history: Number of encoded states kept as possible baselines. Default value is 64.
+        :type history: Number.
+        """
+        self.game = game
+        self.scales = get_quantization_scales(game)
+        self.baseline_tick = None
+
+        n = len(self.scales)
+        self.__history = _StateHistory(history, n)
+        self.__values = np.empty(n)
+        self.__delta = np.empty(n, dtype=np.int32)
+        self.__buffer = bytearray(HEADER_FORMAT.size + 3 * ((n + 7) // 8) + 4 * n)
+
+    def acknowledge(self, tick):
+        """
+        Sets the state of a tick as the baseline of the next messages. Older acknowledgements are ignored.
+
+        :param tick: A tick whose message the receiver decoded.
+        :type tick: Number.
+        """
+        if self.baseline_tick is None or tick > self.baseline_tick:
+            self.baseline_tick = tick
+
+    def encode(self, tick):
+        """
+        Encodes the current state of the game.
+
+        :param tick: Tick of the state. Must increase from one call to the next.
+        :type tick: Number.
+        :return: The message. It is only valid until the next call.
+        :rtype: Memoryview of bytes.
+        """
+        quantized = self.__history.add(tick)
+        self.game.snapshot(out=self.__values, rng=False)
+        quantize(self.__values, self.scales, out=quantized)
+
+        baseline = None if self.baseline_tick is None else self.__history.get(self.baseline_tick)
+        if baseline is None or self.baseline_tick >= tick:
+            np.copyto(self.__delta, quantized)
+            baseline_tick = NO_BASELINE
+        else:
+            np.subtract(quantized, baseline, out=self.__delta)
+            baseline_tick = self.baseline_tick
+        return _write_delta(self.__buffer, tick, baseline_tick, self.__delta)
+
+
+class StateDecoder:
+    """
+    Class for decoding the messages of a StateEncoder into a game.
+
+    Attributes:
+        - game: The game whose state is decoded. Game object.
+        - scales: Number of quantization steps per unit of every value (see get_quantization_scales()). Array.
+        - tick: Tick of the last message decoded, or None. Number.
+        - snapshot: State decoded from the last message (see Game.snapshot()). Array of float64.
+    """
+
+    def __init__(self, game, history=64):
+        """
+        Initializes a decoder. The game must have the same players and settings as the one of the encoder.
+
+        :param game: The game whose state is decoded.
+        :type game: Game.
+        :param history: Number of decoded states kept as possible baselines. Must be at least the number of messages
+            the encoder may send before it gets an acknowledgement. Default value is 64.
+        :type history: Number.
+        """
+        self.game = game
+        self.scales = get_quantization_scales(game)
+        self.tick = None
+        self.snapshot = np.zeros(len(self.scales))
+
+        self.__history = _StateHistory(history, len(self.scales))
+
+    def decode(self, message):
+        """
+        Decodes a message into the `snapshot` attribute, without changing the game.
+
+        :param message: The message.
+        :type message: Bytes-like object.
+        :return: Tick of the state.
+        :rtype: Number.
+        """
+        version, tick, baseline_tick, n_small, n_medium, n_large = HEADER_FORMAT.unpack_from(message)
+        if version != FORMAT_VERSION:
+            raise ValueError('Unsupported state format version {}'.format(version))
+        if baseline_tick == NO_BASELINE:
+            baseline = None
+        else:
+            baseline = self.__history.get(baseline_tick)
+            if baseline is None:
+                raise ValueError('The baseline of tick {} is no longer known'.format(baseline_tick))
+
+        quantized = self.__history.add(tick)
+        delta = _read_delta(message, len(self.scales), n_small, n_medium, n_large)
+        if baseline is None:
+            quantized[:] = delta
+        else:
+            np.add(baseline, delta, out=quantized)
+        dequantize(quantized, self.scales, out=self.snapshot)
+        self.tick = tick
+        return tick
+
+    def apply(self, message):
+        """
+        Decodes a message, and restores its state into the game (see Game.restore()).
+
+        :param message: The message.
+        :type message: Bytes-like object.
+        :return: Tick of the state.
+        :rtype: Number.
+        """
+        tick = self.decode(message)
+        self.game.restore(self.snapshot)
+        return tick
+
+
+def quantize(values, scales, out=None):
+    """
+    Quantizes values to integers, rounding to the nearest step. Infinite values become +-QUANTIZED_INFINITY.
+
+    :param values: The values.
+    :type values: Array of float64.
+    :param scales: Number of steps per unit of every value.
+    :type scales: Array of float64.
+    :param out: Where to write the quantized values. Default value is a new array.
+    :type out: Array of int32.
+    :return: The quantized values.
+    :rtype: Array of int32.
+    """
+    if out is None:
+        out = np.empty(len(values), dtype=np.int32)
+    scaled = np.multiply(values, scales)
+    np.rint(scaled, out=scaled)
+    np.clip(scaled, -QUANTIZED_INFINITY, QUANTIZED_INFINITY, out=scaled)
+    out[:] = scaled
+    return out
+
+
+def dequantize(quantized, scales, out=None):
+    """
+    Converts quantized values back (see quantize()).
+
+    :param quantized: The quantized values.
+    :type quantized: Array of int32.
+    :param scales: Number of steps per unit of every value.
+    :type scales: Array of float64.
+    :param out: Where to write the values. Default value is a new array.
+    :type out: Array of float64.
+    :return: The values.
+    :rtype: Array of float64.
+    """
+    out = np.divide(quantized, scales, out=out)
+    out[quantized == QUANTIZED_INFINITY] = np.inf
+    out[quantized == -QUANTIZED_INFINITY] = -np.inf
+    return out
+
+
+def _write_delta(buffer, tick, baseline_tick, delta):
+    """
+    Writes a message with the given changes to a buffer, and returns the part of the buffer it takes.
+    """
+    changed = delta != 0
+    changes = delta[changed]
+    medium = (changes < -128) | (changes > 127)
+    large = (changes < -32768) | (changes > 32767)
+    small_changes = changes[~medium].astype('<i1')
+    medium_changes = changes[medium & ~large].astype('<i2')
+    large_changes = changes[large].astype('<i4')
+
+    HEADER_FORMAT.pack_into(buffer, 0, FORMAT_VERSION, tick, baseline_tick, len(small_changes), len(medium_changes),
+                            len(large_changes))
+    k = HEADER_FORMAT.size
+    for part in (np.packbits(changed), np.packbits(medium), np.packbits(large[medium]), small_changes, medium_changes,
+                 large_changes):
+        n_bytes = part.nbytes
+        buffer[k:k + n_bytes] = part.tobytes()
+        k += n_bytes
+    return memoryview(buffer)[:k]
+
+
+def _read_delta(message, n_values, n_small, n_medium, n_large):
+    """
+    Reads the changes of every value from a message written by _write_delta().
+    """
+    n_changes = n_small + n_medium + n_large
+    k = HEADER_FORMAT.size
+    parts = []
+    for dtype, count in ((np.uint8, (n_values + 7) // 8), (np.uint8, (n_changes + 7) // 8),
+                         (np.uint8, (n_medium + n_large + 7) // 8), ('<i1', n_small), ('<i2', n_medium),
+                         ('<i4', n_large)):
+        part = np.frombuffer(message, dtype=dtype, count=count, offset=k)
+        k += part.nbytes
+        parts.append(part)
+    changed_bits, medium_bits, large_bits, small_changes, medium_changes, large_changes = parts
+    if k != len(message):
+        raise ValueError('Corrupt state message: expected {} bytes, got {}'.format(k, len(message)))
+
+    changed = np.unpackbits(changed_bits, count=n_values).astype(bool)
+    medium = np.unpackbits(medium_bits, count=n_changes).astype(bool)
+    large = np.unpackbits(large_bits, count=n_medium + n_large).astype(bool)
+
+    changes = np.empty(n_changes, dtype=np.int32)
+    changes[~medium] = small_changes
+    not_small = np.empty(n_medium + n_large, dtype=np.int32)
+    not_small[~large] = medium_changes
+    not_small[large] = large_changes
+    changes[medium] = not_small
+
+    delta = np.zeros(n_values, dtype=np.int32)
+    delta[changed] = changes
+    return delta
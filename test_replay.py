@@ -0,0 +1,45 @@
+"""
+Checks that recorded matches are played back and rendered exactly as they were recorded.
+"""
+import numpy as np
+
+from capture import FrameCapture
+from move_n_shoot import ACTION_CH_MOUSE
+from move_n_shoot import ACTION_CH_UP
+from move_n_shoot import Game
+from move_n_shoot import create_not_so_simple_ai_action_generator
+from replay import Replay
+from replay import ReplayPlayer
+from replay import ReplayRecorder
+
+
+def test_record_and_render_with_ch_mouse(tmp_path):
+    n_ticks = 300
+    game = Game(video_mode=False)
+    game.add_player([100, 100])
+    game.add_player([1500, 700])
+    generators = [create_not_so_simple_ai_action_generator(encoded=True) for _ in range(2)]
+
+    # The first player asks for the mouse on every other tick, which must be recorded and played as a no-op
+    with ReplayRecorder(str(tmp_path / 'match.mnsr'), game, seed=0, keyframe_interval=64) as recorder:
+        for tick in range(n_ticks):
+            actions = [generator(i, game) for i, generator in enumerate(generators)]
+            if tick % 2 == 0:
+                actions[0] |= ACTION_CH_MOUSE | ACTION_CH_UP
+            recorder.step(actions)
+    replay = Replay(str(tmp_path / 'match.mnsr'))
+    assert len(replay) == n_ticks
+    assert not np.any(replay.chunks['records']['actions'] & ACTION_CH_MOUSE)
+
+    # Render offscreen (as 'replay.py render' does), checking the state after every tick against the recorded hashes
+    render_game = replay.make_game(video_mode=True, offscreen=True)
+    player = ReplayPlayer(replay, render_game)
+    render_game.capture = FrameCapture(str(tmp_path / 'match.y4m'), fps=render_game.max_fps, policy='wait')
+    try:
+        player.play(speed=1.0)
+    finally:
+        render_game.capture.close()
+    assert player.tick == n_ticks
+    assert render_game.capture.error is None
+    assert render_game.capture.n_written > 0
+    assert np.array_equal(render_game.snapshot(), game.snapshot())
@@ -0,0 +1,41 @@
+"""
+Checks that a VecGame steps exactly like the same number of headless Game instances.
+"""
+import numpy as np
+
+from move_n_shoot import Game
+from vec_game import VecGame
+
+
+def test_matches_game_with_every_action():
+    n_games = 50
+    n_steps = 1000
+    rng = np.random.RandomState(0)
+    names = Game.get_names_possible_actions()
+
+    games = []
+    vec_game = VecGame(n_games)
+    for g in range(n_games):
+        game = Game(video_mode=False)
+        for i in range(2):
+            game.add_player([rng.randint(0, 1600), rng.randint(0, 800)])
+            vec_game.position[g, i] = game.players[i].position
+            vec_game.crosshair[g, i] = game.players[i].crosshair
+        games.append(game)
+
+    # Every action (including 'ch_mouse') is flipped at random, so that they are held for a few steps
+    actions = np.zeros((n_games, 2, len(names)), dtype=bool)
+    for _ in range(n_steps):
+        actions ^= rng.rand(*actions.shape) < 0.05
+        vec_game.update_physics(actions)
+        for g, game in enumerate(games):
+            game.update_physics([dict(zip(names, actions[g, i].tolist())) for i in range(2)])
+
+    for g, game in enumerate(games):
+        for i, player in enumerate(game.players):
+            assert np.array_equal(vec_game.position[g, i], player.position)
+            assert np.array_equal(vec_game.velocity[g, i], player.velocity)
+            assert np.array_equal(vec_game.acceleration[g, i], player.acceleration)
+            assert np.array_equal(vec_game.crosshair[g, i], player.crosshair)
+            assert np.array_equal(vec_game.bullet_position[g, i], player.bullet.position)
+            assert vec_game.score[g, i] == player.score
@@ -0,0 +1,247 @@
+"""
+Round-robin tournaments between action generators, played in parallel on a process pool.
+
+Usage:
+    python tournament.py [--matches N] [--max-score N] [--processes N] [--seed N]
+
+Example (from Python):
+    tournament = Tournament({'simple': create_simple_ai_action_generator,
+                             'not_so_simple': create_not_so_simple_ai_action_generator})
+    for result in tournament.play():
+        print(result)
+    print(tournament.win_rates())
+
+Every entry of the tournament is an action generator factory: a callable that, when called without arguments, returns
+an action generator with the signature `generator(player_index, game_instance)`. Factories are sent to the worker
+processes, so they have to be picklable (module-level functions or functools.partial objects, not lambdas).
+"""
+import argparse
+import itertools
+import multiprocessing
+import statistics
+from collections import namedtuple
+
+import numpy as np
+
+from move_n_shoot import Game
+from move_n_shoot import create_random_player_action_generator
+from move_n_shoot import create_simple_ai_action_generator
+from move_n_shoot import create_not_so_simple_ai_action_generator
+
+
+# Result of a single match. `pairing` holds the names of the two entries, in the order of their players in the game
+MatchResult = namedtuple('MatchResult', ['pairing', 'match_index', 'scores', 'n_ticks'])
+
+# Statistics of all matches of a pairing, from the point of view of its first entry
+PairingStats = namedtuple('PairingStats', ['n_matches', 'wins', 'losses', 'draws', 'win_rate', 'ci_low', 'ci_high'])
+
+
+def play_match(factory_1, factory_2, max_score=3, max_ticks=14400, seed=None):
+    """
+    Plays a headless match between two action generators, until one of the players reaches `max_score`.
+
+    :param factory_1: Action generator factory for the first player.
+    :type factory_1: Callable.
+    :param factory_2: Action generator factory for the second player.
+    :type factory_2: Callable.
+    :param max_score: Score that wins the match. Default value is 3.
+    :type max_score: Number.
+    :param max_ticks: Maximum length of the match, in physics time steps. If no player reaches `max_score` before
+        that (or both reach it on the same time step), the match is a draw. Default value is 14400 (two minutes of game
+        time).
+    :type max_ticks: Number.
+    :param seed: Seed for numpy's global random number generator, used by the game and the built-in AIs. Default value
+        is None (do not seed).
+    :type seed: Number.
+    :return: Final scores of both players, and the number of time steps played.
+    :rtype: Tuple with a list of two numbers, and a number.
+    """
+    if seed is not None:
+        np.random.seed(seed)
+
+    game = Game(video_mode=False)
+    game.add_player()
+    game.add_player()
+    game.reset_game()
+    generators = [factory_1(), factory_2()]
+
+    n_ticks = 0
+    while n_ticks < max_ticks and max(player.score for player in game.players) < max_score:
+        game.update_physics([generator(i, game) for i, generator in enumerate(generators)])
+        n_ticks += 1
+
+    return [player.score for player in game.players], n_ticks
+
+
+def _play_match_task(task):
+    """
+    Runs one match of a tournament, in a worker process.
+    """
+    pairing, match_index, factories, max_score, max_ticks, seed = task
+    scores, n_ticks = play_match(factories[0], factories[1], max_score, max_ticks, seed)
+    return MatchResult(pairing, match_index, scores, n_ticks)
+
+
+def wilson_interval(successes, n, confidence=0.95):
+    """
+    Computes the Wilson score confidence interval of a binomial proportion.
+
+    :param successes: Number of successes. Can be fractional (e.g. draws counted as half a win).
+    :type successes: Number.
+    :param n: Number of trials.
+    :type n: Number.
+    :param confidence: Confidence level of the interval. Default value is 0.95.
+    :type confidence: Number.
+    :return: Lower and upper bounds of the interval. (0, 1) if there were no trials.
+    :rtype: Tuple with two numbers.
+    """
+    if n == 0:
+        return 0.0, 1.0
+
+    z = statistics.NormalDist().inv_cdf((1 + confidence) / 2)
+    p = successes / n
+    center = (p + z ** 2 / (2 * n)) / (1 + z ** 2 / n)
+    half_width = z / (1 + z ** 2 / n) * (p * (1 - p) / n + z ** 2 / (4 * n ** 2)) ** 0.5
+    return max(0.0, center - half_width), min(1.0, center + half_width)
+
+
+class Tournament:
+    """
+    Class for representing a round-robin tournament between action generators.
+
+    Every pair of entries plays `n_matches` matches. The entries swap player slots every other match, so that no entry
+    benefits from always being the first (or second) player to update.
+
+    Attributes:
+        - factories: Action generator factory of each entry, by name. Dictionary.
+        - max_score: Score that wins a match. Number.
+        - n_matches: Number of matches played by each pair of entries. Number.
+        - max_ticks: Maximum length of a match in time steps, after which it is a draw. Number.
+        - processes: Number of worker processes. Number.
+        - seed: Seed from which the seed of every match is derived. Number.
+        - results: Results of all matches played so far. List of MatchResult.
+    """
+
+    def __init__(self, factories, max_score=3, n_matches=20, max_ticks=14400, processes=None, seed=0):
+        """
+        Initializes a tournament.
+
+        :param factories: Action generator factory of each entry, by name. At least two entries are needed.
+        :type factories: Dictionary.
+        :param max_score: Score that wins a match. Default value is 3.
+        :type max_score: Number.
+        :param n_matches: Number of matches played by each pair of entries. Default value is 20.
+        :type n_matches: Number.
+        :param max_ticks: Maximum length of a match in time steps, after which it is a draw. Default value is 14400.
+        :type max_ticks: Number.
+        :param processes: Number of worker processes. Default value is the number of CPUs. With 1, matches are played
+            in the current process.
+        :type processes: Number.
+        :param seed: Seed from which the seed of every match is derived. Default value is 0.
+        :type seed: Number.
+        """
+        if len(factories) < 2:
+            raise ValueError('A tournament needs at least two entries, got {}'.format(len(factories)))
+
+        self.factories = dict(factories)
+        self.max_score = max_score
+        self.n_matches = n_matches
+        self.max_ticks = max_ticks
+        self.processes = processes if processes is not None else multiprocessing.cpu_count()
+        self.seed = seed
+        self.results = []
+
+    def _tasks(self):
+        """
+        Yields the arguments of every match of the tournament.
+        """
+        for pairing_index, (name_1, name_2) in enumerate(itertools.combinations(self.factories, 2)):
+            for match_index in range(self.n_matches):
+                pairing = (name_1, name_2) if match_index % 2 == 0 else (name_2, name_1)
+                factories = (self.factories[pairing[0]], self.factories[pairing[1]])
+                seed = int(np.random.SeedSequence((self.seed, pairing_index, match_index)).generate_state(1)[0])
+                yield pairing, match_index, factories, self.max_score, self.max_ticks, seed
+
+    def play(self):
+        """
+        Plays all matches of the tournament, yielding their results as soon as each match finishes (so not
+        necessarily in order). Results are also appended to the `results` attribute.
+
+        :return: Generator of the results of every match.
+        :rtype: Generator of MatchResult.
+        """
+        if self.processes == 1:
+            for task in self._tasks():
+                result = _play_match_task(task)
+                self.results.append(result)
+                yield result
+            return
+
+        with multiprocessing.Pool(self.processes) as pool:
+            for result in pool.imap_unordered(_play_match_task, self._tasks()):
+                self.results.append(result)
+                yield result
+
+    def win_rates(self, confidence=0.95):
+        """
+        Computes the statistics of every pairing, from the results of the matches played so far.
+
+        Matches where both players reach `max_score` on the same time step are draws. The win rate counts draws as half
+        a win, and its confidence interval is the Wilson score interval.
+
+        :param confidence: Confidence level of the intervals. Default value is 0.95.
+        :type confidence: Number.
+        :return: Statistics of each pairing, keyed by the names of its two entries (in the order the entries were
+            given). Statistics are from the point of view of the first entry.
+        :rtype: Dictionary with values of the type PairingStats.
+        """
+        counts = {pairing: [0, 0, 0] for pairing in itertools.combinations(self.factories, 2)}
+        for result in self.results:
+            swapped = result.pairing not in counts
+            scores = result.scores[::-1] if swapped else result.scores
+            pairing = result.pairing[::-1] if swapped else result.pairing
+            if scores[0] >= self.max_score and scores[1] >= self.max_score:
+                counts[pairing][2] += 1
+            elif scores[0] >= self.max_score:
+                counts[pairing][0] += 1
+            elif scores[1] >= self.max_score:
+                counts[pairing][1] += 1
+            else:
+                counts[pairing][2] += 1
+
+        stats = {}
+        for pairing, (wins, losses, draws) in counts.items():
+            n = wins + losses + draws
+            win_rate = (wins + draws / 2) / n if n > 0 else float('nan')
+            ci_low, ci_high = wilson_interval(wins + draws / 2, n, confidence)
+            stats[pairing] = PairingStats(n, wins, losses, draws, win_rate, ci_low, ci_high)
+        return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Round-robin tournament between the built-in AIs.')
+    parser.add_argument('--matches', type=int, default=20, help='matches per pairing')
+    parser.add_argument('--max-score', type=int, default=3, help='score that wins a match')
+    parser.add_argument('--processes', type=int, default=None, help='worker processes (default: number of CPUs)')
+    parser.add_argument('--seed', type=int, default=0, help='tournament seed')
+    args = parser.parse_args()
+
+    tournament = Tournament({'random': create_random_player_action_generator,
+                             'simple': create_simple_ai_action_generator,
+                             'not_so_simple': create_not_so_simple_ai_action_generator},
+                            max_score=args.max_score, n_matches=args.matches, processes=args.processes,
+                            seed=args.seed)
+
+    for result in tournament.play():
+        print('{} vs {} (match {}): {}-{} in {} ticks'.format(result.pairing[0], result.pairing[1],
+                                                               result.match_index, result.scores[0],
+                                                               result.scores[1], result.n_ticks))
+
+    print()
+    for (name_1, name_2), stats in tournament.win_rates().items():
+        print('{} vs {}: {}W {}L {}D, win rate {:.2f} [{:.2f}, {:.2f}]'.format(
+            name_1, name_2, stats.wins, stats.losses, stats.draws, stats.win_rate, stats.ci_low, stats.ci_high))
+
+
+if __name__ == '__main__':
+    main()
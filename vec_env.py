@@ -0,0 +1,339 @@
+"""
+Vectorized environment for reinforcement learning, whose games are spread across worker processes.
+
+Example:
+    env = SubprocVecEnv(n_workers=4, games_per_worker=16, opponents=[None, create_simple_ai_action_generator])
+    observations = env.reset(seed=0)
+    for _ in range(1000):
+        observations, rewards, dones, infos = env.step(choose_actions(observations))
+    env.close()
+
+Every worker process steps its own games. Observations, actions, rewards and done flags are exchanged through arrays in
+shared memory (multiprocessing.shared_memory), so the only messages sent between processes are one-byte commands and
+their acknowledgements. The arrays returned by reset() and step() are views of the shared memory, overwritten by the
+next call: copy them to keep them.
+"""
+import multiprocessing
+import struct
+import traceback
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from move_n_shoot import Game
+from move_n_shoot import OBSERVATION_FIELDS
+
+
+# Commands sent to the workers
+_STEP = b'S'
+_RESET = b'R'
+_CLOSE = b'C'
+
+# Argument of the reset command: seed of the worker, or -1 to keep its random number generator as it is
+_SEED_FORMAT = struct.Struct('<q')
+
+
+class _SharedArrays:
+    """
+    Numpy arrays backed by shared memory blocks, created by the main process and attached to by the workers.
+    """
+
+    def __init__(self, specs, names=None):
+        self.blocks = {}
+        self.arrays = {}
+        for name, (shape, dtype) in specs.items():
+            n_bytes = max(int(np.prod(shape)) * np.dtype(dtype).itemsize, 1)
+            if names is None:
+                block = shared_memory.SharedMemory(create=True, size=n_bytes)
+            else:
+                block = shared_memory.SharedMemory(names[name])
+            self.blocks[name] = block
+            self.arrays[name] = np.ndarray(shape, dtype=dtype, buffer=block.buf)
+
+    def get_names(self):
+        return {name: block.name for name, block in self.blocks.items()}
+
+    def close(self, unlink=False):
+        self.arrays.clear()
+        for block in self.blocks.values():
+            block.close()
+            if unlink:
+                block.unlink()
+
+
+def _worker(connection, specs, names, first_env, n_envs, n_players, max_score, max_ticks, ego, opponents,
+            game_settings):
+    """
+    Main loop of a worker process: steps or resets its games whenever the main process asks to.
+    """
+    shared = _SharedArrays(specs, names)
+    envs = slice(first_env, first_env + n_envs)
+    observations, final_observations, actions, rewards, dones, ticks = (
+        shared.arrays[name][envs] for name in ('observations', 'final_observations', 'actions', 'rewards', 'dones',
+                                               'ticks'))
+
+    games = []
+    scores = np.zeros(n_players, dtype=np.int64)
+
+    def reset(k):
+        games[k].reset_game()
+        ticks[k] = 0
+        observations[k] = games[k].observe(ego)
+
+    try:
+        for _ in range(n_envs):
+            game = Game(video_mode=False, max_players=n_players, **game_settings)
+            for _ in range(n_players):
+                game.add_player()
+            games.append(game)
+        generators = [[factory() if factory is not None else None for factory in opponents] for _ in range(n_envs)]
+
+        while True:
+            command = connection.recv_bytes()
+            if command[:1] == _STEP:
+                for k, game in enumerate(games):
+                    step_actions = actions[k].tolist()
+                    for i, generator in enumerate(generators[k]):
+                        if generator is not None:
+                            step_actions[i] = generator(i, game)
+                    for i, player in enumerate(game.players):
+                        scores[i] = player.score
+                    game.update_physics(step_actions)
+                    ticks[k] += 1
+
+                    new_scores = [player.score for player in game.players]
+                    rewards[k] = new_scores
+                    rewards[k] -= scores
+                    done = ((max_score is not None and max(new_scores) >= max_score) or
+                            (max_ticks is not None and ticks[k] >= max_ticks))
+                    dones[k] = done
+                    if done:
+                        final_observations[k] = game.observe(ego)
+                        reset(k)
+                    else:
+                        observations[k] = game.observe(ego)
+            elif command[:1] == _RESET:
+                seed, = _SEED_FORMAT.unpack_from(command, 1)
+                if seed >= 0:
+                    np.random.seed(seed)
+                for k in range(n_envs):
+                    reset(k)
+                dones[:] = False
+                rewards[:] = 0
+            elif command[:1] == _CLOSE:
+                break
+            connection.send_bytes(b'')
+    except Exception:
+        connection.send_bytes(b'E' + traceback.format_exc().encode('utf-8'))
+    finally:
+        del observations, final_observations, actions, rewards, dones, ticks
+        shared.close()
+        connection.close()
+
+
+class SubprocVecEnv:
+    """
+    Class for representing many headless games stepped together by worker processes, with a Gym-style interface.
+
+    Every game (environment) has `n_players` players, whose actions are chosen by the caller, except those played by a
+    built-in AI (see `opponents`). The observation of a game is Game.observe(ego), the reward of every player is the
+    change of its score in the step, and a game is done when a player reaches `max_score` or after `max_ticks` steps.
+    Done games are reset at once: their observation is then the first one of the new match, and the last one of the
+    finished match is in the 'final_observation' array of the infos.
+
+    Games are split evenly across the workers, and each worker seeds numpy's global random number generator (used by
+    the physics and by the built-in AIs) with `seed + worker_index` when reset() is given a seed.
+
+    Attributes:
+        - n_envs: Total number of games. Number.
+        - n_workers: Number of worker processes. Number.
+        - n_players: Number of players in each game. Number.
+        - observations: Observation of every game. Array with shape (n_envs, n_players, len(OBSERVATION_FIELDS)).
+        - final_observations: Last observation of the last finished match of every game. Array with the same shape as
+            `observations`.
+        - actions: Encoded actions of every player, for the next step. Integer array with shape (n_envs, n_players).
+        - rewards: Reward of every player in the last step. Array with shape (n_envs, n_players).
+        - dones: Whether every game finished a match in the last step. Boolean array with shape (n_envs,).
+        - ticks: Number of steps played in the current match of every game. Integer array with shape (n_envs,).
+    """
+
+    def __init__(self, n_workers=2, games_per_worker=8, n_players=2, max_score=3, max_ticks=None, ego=False,
+                 opponents=None, start_method=None, **game_settings):
+        """
+        Starts the worker processes, and creates their games. Call reset() before the first step.
+
+        :param n_workers: Number of worker processes. Default value is 2.
+        :type n_workers: Number.
+        :param games_per_worker: Number of games of each worker. Default value is 8.
+        :type games_per_worker: Number.
+        :param n_players: Number of players in each game. Default value is 2.
+        :type n_players: Number.
+        :param max_score: Score that ends a match. Default value is 3. None for no limit.
+        :type max_score: Number.
+        :param max_ticks: Maximum number of steps of a match. Default value is None (no limit).
+        :type max_ticks: Number.
+        :param ego: Whether observations are given from the point of view of each player (see Game.observe()).
+            Default value is False.
+        :type ego: Boolean.
+        :param opponents: Action generator factory of every player (see Tournament), or None for the players whose
+            actions are given to step(). Factories are sent to the workers, so they have to be picklable. Default value
+            is None (all players are played by the caller).
+        :type opponents: List.
+        :param start_method: Start method of the worker processes (see multiprocessing). Default value is the default
+            of the platform.
+        :type start_method: String.
+        :param game_settings: Other arguments of the games (e.g. fire_interval).
+        """
+        self.n_workers = n_workers
+        self.n_envs = n_workers * games_per_worker
+        self.n_players = n_players
+        self.__waiting = False
+        self.__closed = False
+
+        obs_shape = (self.n_envs, n_players, len(OBSERVATION_FIELDS))
+        specs = {'observations': (obs_shape, np.float64), 'final_observations': (obs_shape, np.float64),
+                 'actions': ((self.n_envs, n_players), np.int64), 'rewards': ((self.n_envs, n_players), np.float64),
+                 'dones': ((self.n_envs,), np.bool_), 'ticks': ((self.n_envs,), np.int64)}
+        self.__shared = _SharedArrays(specs)
+        for name, array in self.__shared.arrays.items():
+            array.fill(0)
+            setattr(self, name, array)
+
+        if opponents is None:
+            opponents = [None] * n_players
+        context = multiprocessing.get_context(start_method)
+        self.__connections = []
+        self.__processes = []
+        for w in range(n_workers):
+            connection, worker_connection = context.Pipe()
+            process = context.Process(target=_worker, daemon=True,
+                                      args=(worker_connection, specs, self.__shared.get_names(), w * games_per_worker,
+                                            games_per_worker, n_players, max_score, max_ticks, ego, list(opponents),
+                                            game_settings))
+            process.start()
+            worker_connection.close()
+            self.__connections.append(connection)
+            self.__processes.append(process)
+
+    def reset(self, seed=None):
+        """
+        Starts a new match in every game.
+
+        :param seed: Seed of the workers' random number generators (worker `i` uses `seed + i`). Default value is None
+            (do not seed).
+        :type seed: Number.
+        :return: Observation of every game.
+        :rtype: Array with shape (n_envs, n_players, len(OBSERVATION_FIELDS)).
+        """
+        self.reset_async(seed)
+        return self.reset_wait()
+
+    def reset_async(self, seed=None):
+        """
+        Asks the workers to start a new match in every game, without waiting for them (see reset()).
+        """
+        for w, connection in enumerate(self.__connections):
+            self.__send(connection, _RESET + _SEED_FORMAT.pack(-1 if seed is None else seed + w))
+        self.__waiting = True
+
+    def reset_wait(self):
+        """
+        Waits for the workers to finish a reset_async() call.
+
+        :return: Observation of every game.
+        :rtype: Array.
+        """
+        self.__wait()
+        return self.observations
+
+    def step(self, actions):
+        """
+        Steps every game by a time step. Games that finish a match are reset.
+
+        :param actions: Encoded actions of every player of every game (see encode_actions()). The actions of the
+            players played by a built-in AI are ignored.
+        :type actions: Integer array with shape (n_envs, n_players).
+        :return: Observation of every game, reward of every player, whether every game finished a match, and a
+            dictionary with the last observation of every finished match ('final_observation') and the number of steps
+            played in the current match of every game ('ticks', 0 for the games that were just reset).
+        :rtype: Tuple with three arrays and a dictionary.
+        """
+        self.step_async(actions)
+        return self.step_wait()
+
+    def step_async(self, actions):
+        """
+        Asks the workers to step every game with some actions, without waiting for them (see step()).
+        """
+        self.actions[:] = actions
+        for connection in self.__connections:
+            self.__send(connection, _STEP)
+        self.__waiting = True
+
+    def step_wait(self):
+        """
+        Waits for the workers to finish a step_async() call.
+
+        :return: See step().
+        :rtype: Tuple with three arrays and a dictionary.
+        """
+        self.__wait()
+        return self.observations, self.rewards, self.dones, {'final_observation': self.final_observations,
+                                                             'ticks': self.ticks}
+
+    def close(self):
+        """
+        Stops the workers, and frees the shared memory.
+        """
+        if self.__closed:
+            return
+        self.__closed = True
+        if self.__waiting:
+            try:
+                self.__wait()
+            except RuntimeError:
+                pass
+        for connection, process in zip(self.__connections, self.__processes):
+            try:
+                connection.send_bytes(_CLOSE)
+            except (BrokenPipeError, OSError):
+                pass
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+            connection.close()
+        for name in self.__shared.arrays:
+            delattr(self, name)
+        self.__shared.close(unlink=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __send(self, connection, command):
+        """
+        Sends a command to a worker.
+        """
+        if self.__closed:
+            raise RuntimeError('The environment is closed')
+        if self.__waiting:
+            raise RuntimeError('Wait for the last asynchronous call before sending another one')
+        connection.send_bytes(command)
+
+    def __wait(self):
+        """
+        Waits for every worker to acknowledge the last command, and raises the first error reported by a worker.
+        """
+        errors = []
+        for connection in self.__connections:
+            try:
+                reply = connection.recv_bytes()
+            except (EOFError, OSError):
+                reply = b'EWorker process died'
+            if reply:
+                errors.append(reply[1:].decode('utf-8', 'replace'))
+        self.__waiting = False
+        if errors:
+            raise RuntimeError('Worker failed:\n' + errors[0])
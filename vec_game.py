@@ -0,0 +1,333 @@
+import numpy as np
+from collision import round_half_away
+from collision import sweep_segments_boxes
+from move_n_shoot import Game
+from move_n_shoot import decode_action_array
+
+
+class VecGame:
+    """
+    Class for representing many headless move n' shoot games, all advanced together with vectorized operations.
+
+    The state of every game is kept as a structure of arrays, where the first axis indexes the game and the second axis
+    indexes the player. Stepping a VecGame produces exactly the same states as stepping the same number of scalar Game
+    instances (with video_mode=False) with the same actions.
+
+    Attributes:
+        - n_games: Number of games being simulated. Number.
+        - n_players: Number of players in each game (1 or 2). Number.
+        - screen_width: Width of the arena of each game. Number.
+        - screen_height: Height of the arena of each game. Number.
+        - position: Position of every player. Array with shape (n_games, n_players, 2).
+        - velocity: Velocity of every player. Array with shape (n_games, n_players, 2).
+        - acceleration: Acceleration of every player. Array with shape (n_games, n_players, 2).
+        - crosshair: Position of every player's crosshair. Array with shape (n_games, n_players, 2).
+        - bullet_position: Position of every player's bullet. Array with shape (n_games, n_players, 2).
+        - bullet_velocity: Velocity of every player's bullet. Array with shape (n_games, n_players, 2).
+        - bullet_was_shot: Whether each player's bullet is in flight. Boolean array with shape (n_games, n_players).
+        - score: Every player's score. Integer array with shape (n_games, n_players).
+        - hit_time: Time of impact (in seconds since the start of the time step) of each player's bullet in the last
+            time step, or NaN if it did not hit. Array with shape (n_games, n_players).
+        - swept_bullets: Whether bullet hits are found along the whole path of the bullets, like in a Game created
+            with swept_bullets=True. Boolean.
+        - delta_t: Default duration of a physics time step, in seconds. Number.
+        - rng: Random number generator used to break ties between colliding players and to reset games.
+    """
+
+    MAX_SPEED = 1500
+    SHOOTING_SPEED = 3000
+    PLAYER_SIZE = 100
+    BULLET_SIZE = 20
+
+    def __init__(self, n_games, screen_sz=None, n_players=2, rng=None, delta_t=None, swept_bullets=False):
+        """
+        Initializes a batch of games. All players start at [0,0], with their crosshair at [200,200], like a newly-added
+        Player in the scalar Game.
+
+        :param n_games: Number of games to simulate.
+        :type n_games: Number.
+        :param screen_sz: Tuple that represents the width and height of the arena. Default value is (1600,800).
+        :type screen_sz: Tuple with two elements.
+        :param n_players: Number of players in each game, either 1 or 2. Default value is 2.
+        :type n_players: Number.
+        :param rng: Random number generator. Default value is the numpy.random module, which is what the scalar Game
+            uses.
+        :type rng: RandomState or module.
+        :param delta_t: Default duration of a physics time step, in seconds. Default value is 1/120, like in the Game.
+        :type delta_t: Number.
+        :param swept_bullets: Whether bullet hits are found along the whole path of the bullets (see
+            Game.update_physics()). Default value is False.
+        :type swept_bullets: Boolean.
+        """
+        if screen_sz is None:
+            screen_sz = (1600, 800)
+        if delta_t is None:
+            slowdown_factor = 2
+            delta_t = 1/(60*slowdown_factor)
+        if n_players not in (1, 2):
+            raise ValueError('VecGame supports 1 or 2 players per game, got {}'.format(n_players))
+
+        self.n_games = n_games
+        self.n_players = n_players
+        self.screen_width = screen_sz[0]
+        self.screen_height = screen_sz[1]
+        self.rng = np.random if rng is None else rng
+        self.delta_t = delta_t
+        self.swept_bullets = swept_bullets
+
+        shape = (n_games, n_players, 2)
+        self.position = np.zeros(shape)
+        self.velocity = np.zeros(shape)
+        self.acceleration = np.zeros(shape)
+        self.crosshair = np.full(shape, 200.0)
+        self.bullet_position = np.full(shape, -100.0)
+        self.bullet_velocity = np.zeros(shape)
+        self.bullet_was_shot = np.zeros(shape[:2], dtype=bool)
+        self.score = np.zeros(shape[:2], dtype=np.int64)
+        self.hit_time = np.full(shape[:2], np.nan)
+
+        # Column of each action in the last axis of the actions array
+        names = Game.get_names_possible_actions()
+        self._action_index = {name: names.index(name) for name in names}
+
+    @classmethod
+    def from_game(cls, game, n_games):
+        """
+        Creates a VecGame where every game is a copy of the current state of a scalar Game.
+
+        :param game: The game to copy. Must have 1 or 2 players, and no obstacles.
+        :type game: Game.
+        :param n_games: Number of copies.
+        :type n_games: Number.
+        :return: The new batch of games.
+        :rtype: VecGame.
+        """
+        if game.obstacles is not None:
+            raise ValueError('VecGame does not support obstacles')
+        vec_game = cls(n_games, (game.world_width, game.world_height), n_players=len(game.players),
+                       delta_t=game.delta_t)
+        for i, player in enumerate(game.players):
+            vec_game.position[:, i] = player.position
+            vec_game.velocity[:, i] = player.velocity
+            vec_game.acceleration[:, i] = player.acceleration
+            vec_game.crosshair[:, i] = player.crosshair
+            vec_game.bullet_position[:, i] = player.bullet.position
+            vec_game.bullet_velocity[:, i] = player.bullet.velocity
+            vec_game.bullet_was_shot[:, i] = player.bullet.was_shot
+            vec_game.score[:, i] = player.score
+        return vec_game
+
+    def reset_game(self, games=None):
+        """
+        Resets games like Game.reset_game does: scores, bullets, velocities and accelerations are zeroed, and positions
+        and crosshairs are drawn uniformly at random within the arena.
+
+        :param games: Which games to reset. Default value is all of them.
+        :type games: Boolean array with shape (n_games,), or array of indices.
+        """
+        if games is None:
+            games = np.arange(self.n_games)
+        n = len(np.arange(self.n_games)[games])
+        shape = (n, self.n_players)
+
+        self.score[games] = 0
+        self.bullet_position[games] = -100.0
+        self.bullet_velocity[games] = 0
+        self.bullet_was_shot[games] = False
+        self.velocity[games] = 0
+        self.acceleration[games] = 0
+        self.position[games] = np.stack([self.rng.randint(0, self.screen_width, shape),
+                                         self.rng.randint(0, self.screen_height, shape)], axis=-1)
+        self.crosshair[games] = np.stack([self.rng.randint(0, self.screen_width, shape),
+                                          self.rng.randint(0, self.screen_height, shape)], axis=-1)
+
+    def update_physics(self, actions, delta_t=None):
+        """
+        Advances every game by one time step, using the same physics as Game.update_physics.
+
+        Since there is no mouse in a headless game, the 'ch_mouse' action leaves the crosshair where it is, and the other
+        'ch_*' actions of that player are ignored, as in the Game.
+
+        :param actions: Actions taken by every player in every game. Either encoded as integers (see
+            move_n_shoot.encode_actions()), with shape (n_games, n_players), or as truth values with shape (n_games,
+            n_players, n_actions), where the last axis follows the order of Game.get_names_possible_actions().
+        :type actions: Array.
+        :param delta_t: Duration of the time step, in seconds. Default value is the `delta_t` attribute.
+        :type delta_t: Number.
+        """
+        if delta_t is None:
+            delta_t = self.delta_t
+
+        actions = np.asarray(actions)
+        if actions.ndim == 2:
+            actions = decode_action_array(actions)
+        actions = actions.astype(np.int64)
+        self.hit_time.fill(np.nan)
+
+        for i in range(self.n_players):
+            self._update_player(i, actions[:, i], delta_t)
+
+            # Limit crosshair position
+            ch = self.crosshair[:, i]
+            np.clip(ch[:, 0], 0, self.screen_width, out=ch[:, 0])
+            np.clip(ch[:, 1], 0, self.screen_height, out=ch[:, 1])
+
+            # Check collisions with walls. The rectangle is computed once, before any correction, as in the Game
+            pos = self.position[:, i]
+            vel = self.velocity[:, i]
+            half = self.PLAYER_SIZE // 2
+            left, top = (round_half_away(pos) - half).T
+            right = left + self.PLAYER_SIZE
+            bottom = top + self.PLAYER_SIZE
+            for hit_wall, axis, new_position in ((left < 0, 0, self.PLAYER_SIZE / 2),
+                                                 (top < 0, 1, self.PLAYER_SIZE / 2),
+                                                 (right > self.screen_width, 0,
+                                                  self.screen_width - self.PLAYER_SIZE / 2),
+                                                 (bottom > self.screen_height, 1,
+                                                  self.screen_height - self.PLAYER_SIZE / 2)):
+                pos[hit_wall, axis] = new_position
+                vel[hit_wall, axis] = -vel[hit_wall, axis]*0.8
+
+            # Check bullet collision with walls
+            b_left, b_top = (round_half_away(self.bullet_position[:, i]) - self.BULLET_SIZE // 2).T
+            b_right = b_left + self.BULLET_SIZE
+            b_bottom = b_top + self.BULLET_SIZE
+            out_of_screen = (b_right < 0) | (b_bottom < 0) | (b_left > self.screen_width) | \
+                            (b_top > self.screen_height)
+            if not self.swept_bullets:
+                self._reset_bullets(i, out_of_screen & self.bullet_was_shot[:, i])
+
+            # Check bullet collision with the other player (if there is one)
+            if self.n_players > 1:
+                o_left, o_top = (round_half_away(self.position[:, 1-i]) - half).T
+                hit = (b_left < o_left + self.PLAYER_SIZE) & (b_top < o_top + self.PLAYER_SIZE) & \
+                      (b_right > o_left) & (b_bottom > o_top)
+                time = np.ones(self.n_games)
+
+                # With swept bullets, a bullet also hits if its path crossed the other player, and the bullets that
+                # did not are only removed at the walls afterwards (see Game.__sweep_bullet)
+                if self.swept_bullets:
+                    displacement = self.bullet_velocity[:, i] * delta_t
+                    start = self.bullet_position[:, i] - displacement
+                    grown_half = (self.PLAYER_SIZE + self.BULLET_SIZE) / 2
+                    other = self.position[:, 1-i]
+                    swept_time = sweep_segments_boxes(start, displacement, other - grown_half, other + grown_half)
+                    time = np.where(np.isinf(swept_time) & hit, 1.0, swept_time)
+                    hit = self.bullet_was_shot[:, i] & np.isfinite(time)
+
+                self.score[hit, i] += 1
+                self.hit_time[hit, i] = time[hit] * delta_t
+                self._reset_bullets(i, hit)
+
+            if self.swept_bullets:
+                self._reset_bullets(i, out_of_screen & self.bullet_was_shot[:, i])
+
+        # Parse collision between players (if there are two players in the game)
+        if self.n_players == 2:
+            self._parse_player_collision()
+
+    def _update_player(self, i, actions, delta_t):
+        """
+        Vectorized counterpart of Player.update, for player `i` of every game.
+        """
+        alpha = 20000
+        k = 3000
+        idx = self._action_index
+        pos = self.position[:, i]
+        vel = self.velocity[:, i]
+        acc = self.acceleration[:, i]
+
+        # Update position and velocity (CA model)
+        pos += vel * delta_t + acc * (delta_t ** 2) / 2
+        vel += acc * delta_t
+
+        # Update acceleration
+        thrust = np.stack([actions[:, idx['right']] - actions[:, idx['left']],
+                           actions[:, idx['down']] - actions[:, idx['up']]], axis=-1)
+        thrust_mag = np.sqrt(thrust[:, 0] * thrust[:, 0] + thrust[:, 1] * thrust[:, 1])
+        has_thrust = thrust_mag > 0
+        acc[:] = 0
+        acc[has_thrust] = alpha * thrust[has_thrust] / thrust_mag[has_thrust, None]
+
+        # Limit maximum speed
+        speed = np.sqrt(vel[:, 0] * vel[:, 0] + vel[:, 1] * vel[:, 1])
+        too_fast = speed > self.MAX_SPEED
+        vel[too_fast] *= (self.MAX_SPEED / speed[too_fast])[:, None]
+
+        # Threshold the velocities to zero
+        vel[speed < 30] = 0
+
+        # Add friction-like component
+        moving = speed > 0.1
+        acc[moving] -= vel[moving] / speed[moving, None] * k
+
+        # Update crosshair position ('ch_mouse' overrides the other 'ch_*' actions, and has no mouse to follow)
+        beta = 30 * (actions[:, idx['ch_mouse']] == 0)
+        ch = self.crosshair[:, i]
+        ch[:, 0] += beta * (actions[:, idx['ch_right']] - actions[:, idx['ch_left']])
+        ch[:, 1] += beta * (actions[:, idx['ch_down']] - actions[:, idx['ch_up']])
+
+        # Shoot, if player chose this action
+        shoots = (actions[:, idx['shoot']] != 0) & ~self.bullet_was_shot[:, i]
+        if shoots.any():
+            bullet_vel = ch[shoots] - pos[shoots]
+            bullet_speed = np.sqrt(bullet_vel[:, 0] * bullet_vel[:, 0] + bullet_vel[:, 1] * bullet_vel[:, 1])
+            bullet_vel *= (self.SHOOTING_SPEED / bullet_speed)[:, None]
+            self.bullet_position[shoots, i] = pos[shoots]
+            self.bullet_velocity[shoots, i] = bullet_vel
+            self.bullet_was_shot[shoots, i] = True
+
+        # Update bullet
+        shot = self.bullet_was_shot[:, i]
+        self.bullet_position[shot, i] += self.bullet_velocity[shot, i] * delta_t
+
+    def _reset_bullets(self, i, games):
+        """
+        Vectorized counterpart of Bullet.reset_bullet, for the bullet of player `i` in the selected games.
+        """
+        self.bullet_position[games, i] = -100.0
+        self.bullet_velocity[games, i] = 0
+        self.bullet_was_shot[games, i] = False
+
+    def _parse_player_collision(self):
+        """
+        Vectorized counterpart of Game.__parse_player_collision, applied to the two players of every game.
+        """
+        l = self.PLAYER_SIZE
+        r1 = round_half_away(self.position[:, 0]) - l // 2
+        r2 = round_half_away(self.position[:, 1]) - l // 2
+        colliding = np.all((r1 < r2 + l) & (r2 < r1 + l), axis=1)
+        if not colliding.any():
+            return
+
+        pos = self.position[colliding]
+        vel = self.velocity[colliding]
+
+        # Use the players' position to determine the length of the intersection between them in x and y
+        delta = l - np.abs(pos[:, 0] - pos[:, 1])
+
+        # Use the players' velocities to determine how long ago would a collision have happened in each direction
+        v = np.abs(vel[:, 0] - vel[:, 1])
+
+        # If both players had zero velocity, resolve by randomly separating them
+        stopped = (v[:, 0] == 0) & (v[:, 1] == 0)
+        if stopped.any():
+            v[stopped] = self.rng.rand(np.count_nonzero(stopped), 2)
+
+        # Compute the time for each collision direction
+        with np.errstate(divide='ignore'):
+            delta_t = np.where(v > 0, delta / np.where(v > 0, v, 1), np.inf)
+
+        # The collision likely happened in the direction with the smallest delta_t (or both, if they are equal)
+        is_collision = np.stack([~(delta_t[:, 1] < delta_t[:, 0]), ~(delta_t[:, 0] < delta_t[:, 1])], axis=-1)
+
+        # Change players' positions to where they were right before impact
+        pos -= vel * delta_t.min(axis=1)[:, None, None]
+
+        # Switch players' velocities in the direction of the collision
+        for axis in range(2):
+            swap = is_collision[:, axis]
+            vel[swap, :, axis] = vel[swap, ::-1, axis]
+
+        self.position[colliding] = pos
+        self.velocity[colliding] = vel